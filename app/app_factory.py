@@ -11,6 +11,7 @@ from .cache import cache
 from .models.config import config
 from .models import db
 from .models.auth import OAuth
+from .models.utils import install_query_counter
 from sqlalchemy_file.storage import StorageManager
 from libcloud.storage.drivers.local import LocalStorageDriver
 from .auth import discord_blueprint, twitch_blueprint, twitch_blueprint_bot
@@ -94,6 +95,8 @@ def create_app(overrides: dict | None = None):
             "app.main.update_channels_last_active": {"queue": "priority-queue"},
             "app.main.task_transcribe_audio": {"queue": "gpu-queue"},
             "app.main.task_transcribe_file": {"queue": "gpu-queue"},
+            "app.main.task_transcribe_batch": {"queue": "gpu-queue"},
+            "app.main.task_transcribe_chunk": {"queue": "gpu-queue"},
             "app.task_download_twitch_clip": {"queue": "celery"},
         },
     )
@@ -133,6 +136,7 @@ def create_app(overrides: dict | None = None):
 
     cache.init_app(app)
     db.init_app(app)
+    install_query_counter()
     login_manager.init_app(app)
     csrf.init_app(app)
     cors.init_app(app, resources={
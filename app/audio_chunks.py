@@ -0,0 +1,152 @@
+"""
+Splitting long audio into chunks that can be transcribed on several workers at once.
+
+Chunks are cut in the middle of a silence close to every TRANSCRIPTION_CHUNK_SECONDS, so no
+sentence is cut in half. Each chunk is transcribed on its own with timestamps starting at 0,
+stitch_chunk_results moves them back to their place in the full audio.
+
+A worker downloads the full audio once, into CHUNK_SOURCE_DIRECTORY, and cuts every chunk it
+gets of that video from the local copy.
+"""
+import os
+import re
+import subprocess
+import tempfile
+import time
+from app.logger import logger
+from app.models.config import config
+
+# How far from the target length a chunk boundary may move to land in a silence
+CHUNK_SEARCH_SECONDS = 120
+# Quietest and shortest pause that counts as a silence for ffmpeg's silencedetect
+SILENCE_NOISE = "-35dB"
+SILENCE_MIN_DURATION = 0.5
+# Directory under the cache location with the full audio of videos being transcribed in chunks
+CHUNK_SOURCE_DIRECTORY = "chunk_sources"
+# Full audio no chunk has used for this long is removed, every chunk marks its video's audio as used
+CHUNK_SOURCE_MAX_AGE_SECONDS = 6 * 3600
+# Attempts a failed chunk gets before the whole video is given up on
+CHUNK_MAX_RETRIES = 3
+
+_silence_start_pattern = re.compile(r"silence_start: (-?[\d.]+)")
+_silence_end_pattern = re.compile(r"silence_end: (-?[\d.]+)")
+
+# A chunk's start and end in seconds, end None for the rest of the audio
+Chunk = tuple[float, float | None]
+
+
+def detect_silences(path: str) -> list[tuple[float, float]]:
+    """Start and end of every silence in an audio file."""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-nostats", "-i", path,
+            "-af", f"silencedetect=noise={SILENCE_NOISE}:d={SILENCE_MIN_DURATION}",
+            "-f", "null", "-",
+        ],
+        capture_output=True, text=True, check=True,
+    )
+    silences = []
+    start: float | None = None
+    for line in result.stderr.splitlines():
+        if (match := _silence_start_pattern.search(line)) is not None:
+            start = max(float(match.group(1)), 0.0)
+        elif (match := _silence_end_pattern.search(line)) is not None and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+
+def plan_chunks(
+    duration: float,
+    silences: list[tuple[float, float]],
+    target: float | None = None,
+    window: float = CHUNK_SEARCH_SECONDS,
+) -> list[Chunk]:
+    """
+    Chunks of about target seconds covering the whole audio, cut at the silence closest to each target.
+
+    Where no silence is within window seconds of a target the chunk is cut at the target.
+    Audio shorter than two chunks isn't split.
+    """
+    if target is None:
+        target = config.transcription_chunk_seconds
+    if target <= 0 or duration < 2 * target:
+        return [(0.0, None)]
+    midpoints = sorted((start + end) / 2 for start, end in silences)
+
+    chunks: list[Chunk] = []
+    position = 0.0
+    while duration - position > target + window:
+        ideal = position + target
+        candidates = [m for m in midpoints if ideal - window <= m <= ideal + window]
+        cut = min(candidates, key=lambda m: abs(m - ideal)) if candidates else ideal
+        chunks.append((position, cut))
+        position = cut
+    chunks.append((position, None))
+    return chunks
+
+
+def extract_chunk(path: str, start: float, end: float | None = None) -> str:
+    """Write a chunk of an audio file as 16 kHz mono wav, the format the model works on, returns its path."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav", dir=config.cache_location) as temp_file:
+        output = temp_file.name
+    command = ["ffmpeg", "-hide_banner", "-nostats", "-y", "-ss", f"{start:.3f}"]
+    if end is not None:
+        command += ["-to", f"{end:.3f}"]
+    command += ["-i", path, "-vn", "-ac", "1", "-ar", "16000", output]
+    # -ss and -to before -i seek in the input, both are positions in the full audio
+    subprocess.run(command, capture_output=True, check=True)
+    return output
+
+
+def remove_stale_chunk_sources(directory: str, max_age: float = CHUNK_SOURCE_MAX_AGE_SECONDS) -> int:
+    """Remove downloaded full audio no chunk has used for max_age seconds, returns how many files were removed."""
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in os.scandir(directory):
+        if entry.is_file() and not entry.name.startswith(".") and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    if removed:
+        logger.info("Removed unused chunk audio", extra={"directory": directory, "removed": removed})
+    return removed
+
+
+def _shift(item: dict, offset: float):
+    for key in ("start", "end"):
+        if isinstance(item.get(key), (int, float)):
+            item[key] = item[key] + offset
+
+
+def stitch_chunk_results(chunk_results: list[dict]) -> dict:
+    """
+    One transcription result out of the results of all chunks.
+
+    chunk_results are {"offset": chunk start, "result": WhisperX output of the chunk}, every
+    segment and word timestamp is moved by its chunk's offset.
+    """
+    segments: list[dict] = []
+    word_segments: list[dict] = []
+    language = None
+    skipped_seconds = 0.0
+    for chunk in sorted(chunk_results, key=lambda c: c["offset"]):
+        offset = chunk["offset"]
+        result = chunk["result"]
+        language = language or result.get("language")
+        skipped_seconds += result.get("skipped_seconds", 0.0)
+        for segment in result.get("segments", []):
+            _shift(segment, offset)
+            for word in segment.get("words", []):
+                _shift(word, offset)
+            segments.append(segment)
+        for word in result.get("word_segments", []):
+            _shift(word, offset)
+            word_segments.append(word)
+
+    stitched: dict = {"segments": segments, "language": language or "en"}
+    if word_segments:
+        stitched["word_segments"] = word_segments
+    if skipped_seconds:
+        stitched["skipped_seconds"] = skipped_seconds
+    logger.info("Stitched chunked transcription", extra={"chunks": len(chunk_results), "segments": len(segments)})
+    return stitched
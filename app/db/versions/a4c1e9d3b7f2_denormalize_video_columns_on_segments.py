@@ -0,0 +1,67 @@
+"""denormalize video columns on segments
+
+Revision ID: a4c1e9d3b7f2
+Revises: 919f4fbd346c
+Create Date: 2025-09-20 14:12:37.418203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_file
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c1e9d3b7f2'
+down_revision: Union[str, None] = '919f4fbd346c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('segments', sa.Column('video_id', sa.Integer(), nullable=True))
+    op.add_column('segments', sa.Column('channel_id', sa.Integer(), nullable=True))
+    op.add_column('segments', sa.Column('video_uploaded', sa.DateTime(), nullable=True))
+
+    # Backfill from the transcription's video
+    op.execute("""
+        UPDATE segments SET
+            video_id = v.id,
+            channel_id = v.channel_id,
+            video_uploaded = v.uploaded
+        FROM transcriptions t
+        JOIN video v ON v.id = t.video_id
+        WHERE segments.transcription_id = t.id;
+    """)
+
+    op.alter_column('segments', 'video_id', nullable=False)
+    op.alter_column('segments', 'channel_id', nullable=False)
+    op.alter_column('segments', 'video_uploaded', nullable=False)
+    op.create_foreign_key(op.f('segments_video_id_fkey'), 'segments', 'video', ['video_id'], ['id'])
+    op.create_foreign_key(op.f('segments_channel_id_fkey'), 'segments', 'channels', ['channel_id'], ['id'])
+
+    # segments is large, a plain CREATE INDEX would block writes to it until done
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_segments_video_id'), 'segments', ['video_id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_segments_channel_uploaded', 'segments', [
+            'channel_id',
+            sa.text('video_uploaded DESC'),
+            sa.text('transcription_id DESC'),
+            sa.text('start DESC'),
+        ], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_segments_channel_uploaded', table_name='segments', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_segments_video_id'), table_name='segments', postgresql_concurrently=True)
+    op.drop_constraint(op.f('segments_channel_id_fkey'), 'segments', type_='foreignkey')
+    op.drop_constraint(op.f('segments_video_id_fkey'), 'segments', type_='foreignkey')
+    op.drop_column('segments', 'video_uploaded')
+    op.drop_column('segments', 'channel_id')
+    op.drop_column('segments', 'video_id')
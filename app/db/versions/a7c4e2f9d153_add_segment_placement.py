@@ -0,0 +1,92 @@
+"""add segment placement
+
+Revision ID: a7c4e2f9d153
+Revises: d8f3b1a6c520
+Create Date: 2025-10-03 19:27:05.318842
+
+"""
+import json
+from typing import Any, Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c4e2f9d153'
+down_revision: Union[str, None] = 'd8f3b1a6c520'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _source_to_target(mapping: Any, cuts: list[dict], timestamp: float) -> Optional[float]:
+    """Timestamp in the target video as the mapping translated it when this revision was written."""
+    if not (mapping.source_start_time <= timestamp <= mapping.source_end_time):
+        return None
+    target = mapping.target_start_time + timestamp - mapping.source_start_time - mapping.time_offset
+    for cut in cuts:
+        cut_start = cut.get('start', 0.0)
+        cut_end = cut_start + cut.get('duration', 0.0)
+        if timestamp > cut_end:
+            target -= cut.get('duration', 0.0)
+        elif cut_start <= timestamp:
+            return None
+    if target < mapping.target_start_time or target > mapping.target_end_time:
+        return None
+    return max(0.0, target)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    placement = op.create_table('segment_placement',
+    sa.Column('segment_id', sa.Integer(), nullable=False),
+    sa.Column('mapping_id', sa.Integer(), nullable=False),
+    sa.Column('target_video_id', sa.Integer(), nullable=False),
+    sa.Column('target_start', sa.Float(), nullable=False),
+    sa.Column('target_end', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['segment_id'], ['segments.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['mapping_id'], ['timestamp_mapping.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['target_video_id'], ['video.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('segment_id', 'mapping_id')
+    )
+    op.create_index('ix_segment_placement_mapping_id', 'segment_placement', ['mapping_id'], unique=False)
+    op.create_index('ix_segment_placement_target_start', 'segment_placement', ['target_video_id', 'target_start'], unique=False)
+
+    # Place the segments of every existing mapping. The translation is copied in rather than
+    # imported from the model, so this revision keeps doing the same when the model changes.
+    connection = op.get_bind()
+    mappings = connection.execute(sa.text(
+        "SELECT id, source_video_id, target_video_id, source_start_time, source_end_time, "
+        "target_start_time, target_end_time, time_offset, cuts_data FROM timestamp_mapping"
+    )).all()
+    for mapping in mappings:
+        cuts_data = mapping.cuts_data
+        if isinstance(cuts_data, str):
+            cuts_data = json.loads(cuts_data)
+        cuts = (cuts_data or {}).get('cuts', [])
+        segments = connection.execute(
+            sa.text("SELECT id, start, \"end\" FROM segments WHERE video_id = :video_id"),
+            {"video_id": mapping.source_video_id},
+        ).all()
+        rows = []
+        for segment in segments:
+            target_start = _source_to_target(mapping, cuts, segment.start)
+            target_end = _source_to_target(mapping, cuts, segment.end)
+            if target_start is None or target_end is None:
+                continue
+            rows.append({
+                'segment_id': segment.id,
+                'mapping_id': mapping.id,
+                'target_video_id': mapping.target_video_id,
+                'target_start': target_start,
+                'target_end': target_end,
+            })
+        if rows:
+            op.bulk_insert(placement, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_segment_placement_target_start', table_name='segment_placement')
+    op.drop_index('ix_segment_placement_mapping_id', table_name='segment_placement')
+    op.drop_table('segment_placement')
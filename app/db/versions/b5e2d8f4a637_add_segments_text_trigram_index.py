@@ -0,0 +1,33 @@
+"""add segments text trigram index
+
+Revision ID: b5e2d8f4a637
+Revises: f1a9c3e7b254
+Create Date: 2025-09-29 18:52:30.217449
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e2d8f4a637'
+down_revision: Union[str, None] = 'f1a9c3e7b254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        'ix_segments_text_trgm', 'segments', ['text'], unique=False,
+        postgresql_using='gin', postgresql_ops={'text': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_segments_text_trgm', table_name='segments')
+    op.execute("DROP EXTENSION IF EXISTS pg_trgm")
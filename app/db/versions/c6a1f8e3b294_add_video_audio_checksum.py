@@ -0,0 +1,30 @@
+"""add video audio checksum
+
+Revision ID: c6a1f8e3b294
+Revises: a7c4e2f9d153
+Create Date: 2025-10-09 21:14:37.502118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6a1f8e3b294'
+down_revision: Union[str, None] = 'a7c4e2f9d153'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('video', sa.Column('audio_checksum', sa.String(length=64), nullable=True))
+    op.create_index('ix_video_audio_checksum', 'video', ['audio_checksum'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_video_audio_checksum', table_name='video')
+    op.drop_column('video', 'audio_checksum')
@@ -0,0 +1,28 @@
+"""add segments transcription start index
+
+Revision ID: c7d2f5a81e64
+Revises: a4c1e9d3b7f2
+Create Date: 2025-09-22 19:41:05.118346
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2f5a81e64'
+down_revision: Union[str, None] = 'a4c1e9d3b7f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_segments_transcription_start', 'segments', ['transcription_id', 'start'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_segments_transcription_start', table_name='segments')
@@ -0,0 +1,39 @@
+"""add segments text tsv english
+
+Revision ID: d8f3b1a6c520
+Revises: b5e2d8f4a637
+Create Date: 2025-10-01 20:14:48.551093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f3b1a6c520'
+down_revision: Union[str, None] = 'b5e2d8f4a637'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "segments",
+        sa.Column(
+            "text_tsv_english",
+            sqlalchemy_utils.types.ts_vector.TSVectorType(),
+            sa.Computed("to_tsvector('english', \"text\")", persisted=True),
+            nullable=False,
+        ),
+    )
+    op.create_index('ix_segments_text_tsv_english_gin', 'segments', ['text_tsv_english'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_segments_text_tsv_english_gin', table_name='segments', postgresql_using='gin')
+    op.drop_column("segments", "text_tsv_english")
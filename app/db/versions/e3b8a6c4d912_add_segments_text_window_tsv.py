@@ -0,0 +1,43 @@
+"""add segments text window tsv
+
+Revision ID: e3b8a6c4d912
+Revises: c7d2f5a81e64
+Create Date: 2025-09-24 21:03:52.640117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b8a6c4d912'
+down_revision: Union[str, None] = 'c7d2f5a81e64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('segments', sa.Column('text_window_tsv', sqlalchemy_utils.types.ts_vector.TSVectorType(), nullable=True))
+
+    # Backfill every segment with its own text followed by the next segment's text
+    op.execute("""
+        UPDATE segments
+        SET text_window_tsv = to_tsvector('simple', segments.text || ' ' || coalesce(windows.next_text, ''))
+        FROM (
+            SELECT id, lead(text) OVER (PARTITION BY transcription_id ORDER BY start) AS next_text
+            FROM segments
+        ) AS windows
+        WHERE windows.id = segments.id
+    """)
+
+    op.create_index('ix_segments_text_window_tsv_gin', 'segments', ['text_window_tsv'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_segments_text_window_tsv_gin', table_name='segments', postgresql_using='gin')
+    op.drop_column('segments', 'text_window_tsv')
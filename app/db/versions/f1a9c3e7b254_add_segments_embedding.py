@@ -0,0 +1,34 @@
+"""add segments embedding
+
+Revision ID: f1a9c3e7b254
+Revises: e3b8a6c4d912
+Create Date: 2025-09-27 12:26:14.902781
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a9c3e7b254'
+down_revision: Union[str, None] = 'e3b8a6c4d912'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The vector extension is enabled in 19b7bf30c76b
+    op.execute("ALTER TABLE segments ADD COLUMN embedding vector(256)")
+    op.execute(
+        "CREATE INDEX ix_segments_embedding_hnsw ON segments "
+        "USING hnsw (embedding vector_cosine_ops)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_segments_embedding_hnsw', table_name='segments')
+    op.drop_column('segments', 'embedding')
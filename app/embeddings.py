@@ -0,0 +1,83 @@
+"""
+Segment embeddings for semantic search.
+
+Embedders are looked up by name from the EMBEDDER setting, the default hashing embedder
+needs no model download so it works offline. Every embedder must return vectors with
+EMBEDDING_DIMENSIONS values, that is the size of the database column.
+"""
+import hashlib
+import math
+import re
+from collections.abc import Callable, Sequence
+from typing import Protocol
+from app.models.config import config
+from app.normalize import stem
+
+EMBEDDING_DIMENSIONS = 256
+# Segments embedded per embed() call when processing a transcription
+EMBEDDING_BATCH_SIZE = 512
+
+_word_pattern = re.compile(r"\w+")
+
+
+class Embedder(Protocol):
+    name: str
+
+    def embed(self, texts: Sequence[str]) -> list[list[float]]:
+        """One vector of EMBEDDING_DIMENSIONS values per text."""
+        ...
+
+
+class HashingEmbedder:
+    """
+    Feature hashing of stemmed words and word pairs into a fixed size, L2 normalized vector.
+
+    Deterministic across processes, so query vectors line up with stored ones. Catches
+    different forms of the same words in any order, not synonyms.
+    """
+    name = "hashing"
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> list[str]:
+        words = [stem(word) for word in _word_pattern.findall(text.lower())]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: Sequence[str]) -> list[list[float]]:
+        vectors: list[list[float]] = []
+        for text in texts:
+            vector = [0.0] * self.dimensions
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                # Low bits pick the dimension, the top bit the sign, so collisions tend to cancel out
+                vector[digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+            norm = math.sqrt(sum(v * v for v in vector))
+            vectors.append([v / norm for v in vector] if norm else vector)
+        return vectors
+
+
+_embedders: dict[str, Callable[[], Embedder]] = {
+    HashingEmbedder.name: HashingEmbedder,
+}
+_embedder: Embedder | None = None
+
+
+def register_embedder(name: str, factory: Callable[[], Embedder]) -> None:
+    """Make an embedder available to the EMBEDDER setting."""
+    _embedders[name] = factory
+
+
+def get_embedder() -> Embedder:
+    """The configured embedder, created once per process."""
+    global _embedder
+    if _embedder is None:
+        if config.embedder not in _embedders:
+            raise ValueError(f"Unknown embedder: {config.embedder}")
+        _embedder = _embedders[config.embedder]()
+    return _embedder
+
+
+def is_zero(vector: Sequence[float]) -> bool:
+    """Texts without words embed to all zeros, which have no direction to compare."""
+    return not any(vector)
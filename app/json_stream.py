@@ -0,0 +1,148 @@
+"""
+Incremental reading of one array out of a large JSON document.
+
+WhisperX output of a long VOD with word level timings can be hundreds of MB, most of it
+in "word_segments" and the per segment "words". Reading it with json.loads or pydantic
+holds all of it in memory at once. iter_json_array reads the file in chunks, decodes one
+array element at a time and skips everything else without building it.
+"""
+import codecs
+import json
+import re
+from collections.abc import Iterator
+from typing import Any, BinaryIO
+
+# Bytes read from the file at a time
+JSON_STREAM_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789.eE+-"
+# Characters that matter when skipping a value, outside and inside of strings
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_STRING_END = re.compile(r'["\\]')
+_decoder = json.JSONDecoder()
+
+
+class _JsonReader:
+    """Buffered reader over a binary stream, only keeps the text that wasn't consumed yet."""
+
+    def __init__(self, stream: BinaryIO, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Read another chunk into the buffer, False at the end of the stream."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        if not chunk:
+            self.eof = True
+            self.buffer += self.text_decoder.decode(b"", final=True)
+            return False
+        self.buffer += self.text_decoder.decode(chunk)
+        return True
+
+    def peek(self) -> str:
+        """Next character that isn't whitespace, without consuming it. Empty at the end."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON, found {found!r}")
+        self.pos += 1
+
+    def decode(self) -> Any:
+        """Decode the next value, reading more of the stream until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if (end == len(self.buffer) or self.buffer[end] in _NUMBER_CHARS) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip(self):
+        """Consume the next value without building it."""
+        if self.peek() not in "[{":
+            self.decode()
+            return
+        depth = 0
+        in_string = False
+        while True:
+            match = (_STRING_END if in_string else _STRUCTURE).search(self.buffer, self.pos)
+            if match is None:
+                # Nothing of interest in the rest of the buffer, it can be dropped
+                self.pos = len(self.buffer)
+                if not self._fill():
+                    raise ValueError("Unexpected end of JSON")
+                continue
+            char = match.group()
+            if char == "\\":
+                if match.end() == len(self.buffer):
+                    # The escaped character is in the next chunk, look at the backslash again then
+                    self.pos = match.start()
+                    if not self._fill():
+                        raise ValueError("Unexpected end of JSON")
+                    continue
+                self.pos = match.end() + 1
+                continue
+            self.pos = match.end()
+            if char == '"':
+                in_string = not in_string
+            elif char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+
+def iter_json_array(stream: BinaryIO, key: str, chunk_size: int = JSON_STREAM_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Elements of the array under key in the top level object of a UTF-8 JSON stream.
+
+    Only one element is decoded at a time. Yields nothing if the key is missing or null.
+    """
+    reader = _JsonReader(stream, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.decode()
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                return
+            while True:
+                yield reader.decode()
+                if reader.peek() == "]":
+                    return
+                reader.expect(",")
+        elif name == key and reader.peek() == "n":
+            reader.decode()
+            return
+        reader.skip()
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
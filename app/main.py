@@ -3,9 +3,11 @@ import requests
 import os
 import json
 import tempfile
+import fasteners  # type: ignore[import-untyped]
 from .models.utils import DownloadProgress
 import mimetypes
 import asyncio
+import time
 from flask_login import current_user, login_required  # type: ignore
 from flask import (
     Flask,
@@ -13,13 +15,23 @@ from flask import (
     request,
     redirect,
 )
-from celery import Celery, Task, chain
+from celery import Celery, Task, chain, chord, group
+from celery.signals import worker_process_init
 from celery.result import AsyncResult
 from app.models import db
 from app.models import Transcription, TranscriptionSource, TranscriptionResult, PermissionType
-from app.transcribe import transcribe
+from app.models.enums import TranscriptionPriority
+from app.transcribe import transcribe, whisper_model_cache
 from app.models.config import config
 from app.services import ChannelService, VideoService, TranscriptionService, UserService
+from app.services.transcription import SegmentService
+from app.search_cache import invalidate_search_cache
+from app.search_index import build_search_index
+from app.transcription_queue import transcription_queue
+from app.audio_chunks import (
+    detect_silences, plan_chunks, stitch_chunk_results, extract_chunk, remove_stale_chunk_sources,
+    CHUNK_SOURCE_DIRECTORY, CHUNK_MAX_RETRIES,
+)
 from app import app, login_manager
 from app.csrf import csrf
 from app.permissions import require_api_key, require_permission
@@ -30,6 +42,8 @@ from app.chatlogparse import parse_logs
 from app.logger import logger
 from datetime import datetime, timedelta
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import NoResultFound
 from werkzeug.utils import secure_filename
 
 
@@ -67,6 +81,16 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
                     channel.id), name=f'look for new videos every 15 minutes - {channel.name}')
         sender.add_periodic_task(crontab(hour="*", minute="*/5"), update_channels_last_active.s(
         ), name=f'update channels last active every 5 minutes')
+        for broadcaster_id in config.search_index_broadcasters:
+            # Processed transcriptions update the index, a nightly rebuild drops deleted ones
+            sender.add_periodic_task(crontab(hour="4", minute="0"), task_build_search_index.s(
+                broadcaster_id), name=f'rebuild search index nightly - {broadcaster_id}')
+
+
+@worker_process_init.connect
+def warm_transcription_model(**kwargs):
+    if config.transcription_warm_start:
+        whisper_model_cache.load()
 
 
 def get_extension_from_response(response):
@@ -150,8 +174,7 @@ def full_processing_task(channel_id: int):
                        extra={"video_id": video.id, "channel_id": channel_id})
             _ = chain(
                 task_fetch_audio.s(video.id),
-                task_transcribe_audio.s(),
-                task_parse_video_transcriptions.s(),
+                task_queue_transcription.s(TranscriptionPriority.Recent.value),
             ).apply_async(ignore_result=True)
             unprocessed_count += 1
     
@@ -426,52 +449,60 @@ def update_channels_last_active():
     db.session.commit()
 
 
-@celery.task(bind=True, name='app.main.task_transcribe_audio')
-def task_transcribe_audio(self, video_id: int, force: bool = False):
-    from app.transcribe import transcription_tracker
-    import time
-    
-    headers = {"X-API-Key": config.api_key}
-    video = VideoService.get_by_id(video_id)
-
+def _needs_transcription(video, force: bool = False) -> bool:
+    """Whether a video is to be transcribed, with force an existing transcription is deleted first."""
     for t in video.transcriptions:
         if t.source == TranscriptionSource.Unknown:
             if not force:
                 logger.info("Transcription already exists on video",
-                            extra={"video_id": video_id})
-                return video_id
+                            extra={"video_id": video.id})
+                return False
             logger.info("Transcription already exists on video",
-                        extra={"video_id": video_id})
+                        extra={"video_id": video.id})
             TranscriptionService.delete(t)
 
-    logger.info("Task queued, processing audio for video",
-                extra={"video_id": video_id})
-
     if not video.audio:
         logger.warning("No audio associated with video",
-                       extra={"video_id": video_id})
-        return video_id
+                       extra={"video_id": video.id})
+        return False
+    return True
 
-    # Start progress tracking with video duration
-    transcription_tracker.start_progress_tracking(self.request.id, video.duration)
-    transcription_start_time = time.time()
 
-    download_url = f"{config.app_url}/video/{video.id}/download_audio"
+def _download_video_audio(video_id: int) -> str:
+    """Download a video's audio into the cache, returns the local file."""
+    headers = {"X-API-Key": config.api_key}
+    download_url = f"{config.app_url}/video/{video_id}/download_audio"
+    with requests.get(download_url, headers=headers, stream=True) as r:
+        r.raise_for_status()
+        ext = get_extension_from_response(r)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=ext, dir=config.cache_location) as temp_file:
+            for chunk in r.iter_content(chunk_size=8192):
+                temp_file.write(chunk)
+            return temp_file.name
+
 
-    try:
-        with requests.get(download_url, headers=headers, stream=True) as r:
-            r.raise_for_status()
-            ext = get_extension_from_response(r)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=ext, dir=config.cache_location) as temp_file:
-                for chunk in r.iter_content(chunk_size=8192):
-                    temp_file.write(chunk)
-                local_filename = temp_file.name
+def _upload_video_transcription(video_id: int, result: dict):
+    logger.info("Uploading transcription to video",
+                extra={"video_id": video_id})
+    upload_url = f"{config.app_url}/video/{video_id}/upload_transcription"
+    headers = {"X-API-Key": config.api_key, "Content-type": "application/json", "Accept": "text/plain"}
+    response = requests.post(upload_url, json=result, headers=headers)
+    response.raise_for_status()
 
+
+def _transcribe_video_audio(video, local_filename: str, task_id: str):
+    """Transcribe a downloaded audio file and upload the result to the video."""
+    from app.transcribe import transcription_tracker
+
+    # Start progress tracking with video duration
+    transcription_tracker.start_progress_tracking(task_id, video.duration)
+    transcription_start_time = time.time()
+    try:
         logger.info(f"Audio downloaded to %s, starting transcription",
-                    local_filename, extra={"video_id": video_id})
+                    local_filename, extra={"video_id": video.id})
 
         result_file = transcribe(local_filename)
-        
+
         # Calculate transcription time and store metrics
         transcription_end_time = time.time()
         transcription_time = transcription_end_time - transcription_start_time
@@ -480,19 +511,7 @@ def task_transcribe_audio(self, video_id: int, force: bool = False):
         with open(result_file, "r") as f:
             result = json.load(f)
 
-        logger.info("Uploading transcription to video",
-                    extra={"video_id": video_id})
-        upload_url = f"{config.app_url}/video/{video_id}/upload_transcription"
-        headers.update(
-            {"Content-type": "application/json", "Accept": "text/plain"})
-        response = requests.post(upload_url, json=result, headers=headers)
-        response.raise_for_status()
-
-    except Exception as e:
-        logger.error("Transcription task failed: %s", e,
-                     exc_info=True, extra={"video_id": video_id})
-        raise
-
+        _upload_video_transcription(video.id, result)
     finally:
         # Clean up temp file and progress tracking
         try:
@@ -500,14 +519,177 @@ def task_transcribe_audio(self, video_id: int, force: bool = False):
                 os.remove(local_filename)
         except Exception as cleanup_error:
             logger.warning("Failed to delete temp file %s",
-                           cleanup_error, extra={"video_id": video_id})
-        
+                           cleanup_error, extra={"video_id": video.id})
+
         # Cleanup progress tracking
-        transcription_tracker.cleanup_progress_tracking(self.request.id)
+        transcription_tracker.cleanup_progress_tracking(task_id)
+
+
+@celery.task(bind=True, name='app.main.task_transcribe_audio')
+def task_transcribe_audio(self, video_id: int, force: bool = False):
+    video = VideoService.get_by_id(video_id)
+    if not _needs_transcription(video, force):
+        return video_id
 
+    logger.info("Task queued, processing audio for video",
+                extra={"video_id": video_id})
+
+    try:
+        local_filename = _download_video_audio(video_id)
+        _transcribe_video_audio(video, local_filename, self.request.id)
+    except Exception as e:
+        logger.error("Transcription task failed: %s", e,
+                     exc_info=True, extra={"video_id": video_id})
+        raise
+
+    return video_id
+
+
+@celery.task
+def task_queue_transcription(video_id: int, priority: str = TranscriptionPriority.Backfill.value,
+                             force: bool = False):
+    video = VideoService.get_by_id(video_id)
+    chunk_seconds = config.transcription_chunk_seconds
+    if chunk_seconds > 0 and video.duration >= 2 * chunk_seconds:
+        # Long enough to be worth spreading over all GPU workers
+        _ = task_transcribe_chunked.delay(video_id, priority, force)
+        return video_id
+    transcription_queue.enqueue(video_id, TranscriptionPriority(priority), force)
+    _ = task_transcribe_batch.delay()
+    return video_id
+
+
+@celery.task
+def task_transcribe_chunked(video_id: int, priority: str = TranscriptionPriority.Backfill.value,
+                            force: bool = False):
+    """Split a VOD at silences and transcribe the chunks as a group, on as many GPU workers as there are."""
+    video = VideoService.get_by_id(video_id)
+    if not _needs_transcription(video, force):
+        return video_id
+
+    audio_path = VideoService.copy_audio_to_cache(video)
+    try:
+        chunks = plan_chunks(video.duration, detect_silences(audio_path))
+    finally:
+        os.remove(audio_path)
+    if len(chunks) == 1:
+        transcription_queue.enqueue(video_id, TranscriptionPriority(priority))
+        _ = task_transcribe_batch.delay()
+        return video_id
+
+    logger.info("Transcribing video in chunks", extra={"video_id": video_id, "chunks": len(chunks)})
+    _ = chord(
+        group(task_transcribe_chunk.s(video_id, start, end) for start, end in chunks)
+    )(task_upload_chunked_transcription.s(video_id).on_error(task_chunked_transcription_failed.s(video_id, priority)))
     return video_id
 
 
+def _chunk_source_audio(video_id: int) -> str:
+    """
+    The full audio of a video on this worker, downloaded by the first of its chunks to run here.
+
+    Chunks are cut from it locally, so the web process only sends the stored file, once per worker.
+    """
+    directory = os.path.join(config.cache_location, CHUNK_SOURCE_DIRECTORY)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, str(video_id))
+    with fasteners.InterProcessLock(os.path.join(directory, ".lock")):
+        remove_stale_chunk_sources(directory)
+        if not os.path.exists(path):
+            os.replace(_download_video_audio(video_id), path)
+        # Mark as used, so it isn't removed while chunks of the video are still coming in
+        os.utime(path)
+    return path
+
+
+@celery.task(name='app.main.task_transcribe_chunk', autoretry_for=(Exception,),
+             max_retries=CHUNK_MAX_RETRIES, retry_backoff=True)
+def task_transcribe_chunk(video_id: int, start: float, end: float | None = None):
+    """Transcribe one chunk of a video, timestamps in the result start at the chunk's start."""
+    local_filename = extract_chunk(_chunk_source_audio(video_id), start, end)
+    result_file = None
+    try:
+        logger.info("Transcribing chunk %s-%s", start, end, extra={"video_id": video_id})
+        result_file = transcribe(local_filename)
+        with open(result_file, "r") as f:
+            result = json.load(f)
+    finally:
+        for path in (local_filename, result_file):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+    return {"offset": start, "result": result}
+
+
+@celery.task
+def task_upload_chunked_transcription(chunk_results: list[dict], video_id: int):
+    _upload_video_transcription(video_id, stitch_chunk_results(chunk_results))
+    _ = task_parse_video_transcriptions.delay(video_id)
+    return video_id
+
+
+@celery.task
+def task_chunked_transcription_failed(request, exc, traceback, video_id: int,
+                                      priority: str = TranscriptionPriority.Backfill.value):
+    """A chunk failed for good and the chord won't finish, transcribe the video in one piece instead."""
+    logger.error("Chunked transcription failed, queueing video whole: %s", exc,
+                 extra={"video_id": video_id, "task_id": request.id})
+    transcription_queue.enqueue(video_id, TranscriptionPriority(priority))
+    _ = task_transcribe_batch.delay()
+
+
+def _prefetch_next_audio(downloader: ThreadPoolExecutor):
+    """Take the next queued video that needs transcribing and start downloading its audio."""
+    while (queued := transcription_queue.pop()) is not None:
+        video_id, force = queued
+        try:
+            video = VideoService.get_by_id(video_id)
+        except NoResultFound:
+            logger.warning("Queued video no longer exists", extra={"video_id": video_id})
+            continue
+        if not _needs_transcription(video, force):
+            continue
+        return video, downloader.submit(_download_video_audio, video_id)
+    return None
+
+
+@celery.task(bind=True, name='app.main.task_transcribe_batch')
+def task_transcribe_batch(self):
+    """
+    Transcribe up to TRANSCRIPTION_QUEUE_BATCH queued videos back to back.
+
+    The next video's audio downloads while the current one is transcribed, so the model
+    doesn't wait on the network between videos. Each video is taken from the queue only
+    when its download starts, recent VODs queued in the meantime go first.
+    """
+    transcribed = 0
+    with ThreadPoolExecutor(max_workers=1) as downloader:
+        pending = _prefetch_next_audio(downloader)
+        taken = 1 if pending is not None else 0
+        while pending is not None:
+            video, download = pending
+            pending = None
+            if taken < config.transcription_queue_batch:
+                pending = _prefetch_next_audio(downloader)
+                taken += 1 if pending is not None else 0
+
+            try:
+                local_filename = download.result()
+                _transcribe_video_audio(video, local_filename, f"{self.request.id}:{video.id}")
+            except Exception as e:
+                # One broken video doesn't hold up the rest of the queue
+                logger.error("Transcription failed: %s", e,
+                             exc_info=True, extra={"video_id": video.id})
+                continue
+            _ = task_parse_video_transcriptions.delay(video.id)
+            transcribed += 1
+
+    if len(transcription_queue) > 0:
+        # Continue in a new task, other GPU tasks get their turn in between
+        _ = task_transcribe_batch.delay()
+    logger.info("Transcription batch done", extra={"transcribed": transcribed, "taken": taken})
+    return transcribed
+
+
 @app.route("/utils/upload_audio", methods=["POST"])
 @login_required
 @require_permission([PermissionType.Admin, PermissionType.Moderator])
@@ -618,6 +800,54 @@ def task_parse_transcription(transcription_id: int, force: bool = False):
     TranscriptionService.process_transcription(trans, force)
 
 
+@celery.task
+def task_build_search_index(broadcaster_id: int):
+    build_search_index(broadcaster_id)
+
+
+@celery.task
+def task_update_embeddings(transcription_id: int, force: bool = False):
+    trans = TranscriptionService.get_by_id(transcription_id)
+    SegmentService.update_embeddings(trans, force)
+    db.session.commit()
+    invalidate_search_cache([trans.video.channel_id])
+
+
+@celery.task
+def task_search_job(job_id: str, search_term: str, channel_ids: list[int],
+                    start_date: str | None = None, end_date: str | None = None, stemmed: bool = False):
+    """Run a full text search one year at a time, newest first, storing each year's hits as it finishes."""
+    from app.search import search_year_ranges, search_segment_ids
+    from app.search_jobs import search_job_tracker
+
+    timer = time.perf_counter()
+    try:
+        channels = [ChannelService.get_by_id(channel_id) for channel_id in channel_ids]
+        year_ranges = search_year_ranges(
+            channels,
+            datetime.fromisoformat(start_date) if start_date else None,
+            datetime.fromisoformat(end_date) if end_date else None,
+        )
+        search_job_tracker.start(job_id, len(year_ranges))
+        hits = 0
+        for year, year_start, year_end in year_ranges:
+            segment_ids = search_segment_ids(search_term, channels, year_start, year_end, stemmed)
+            search_job_tracker.add_chunk(job_id, year, segment_ids)
+            hits += len(segment_ids)
+        search_job_tracker.finish(job_id)
+    except Exception as e:
+        logger.error("Search job failed: %s", e, exc_info=True, extra={"job_id": job_id})
+        search_job_tracker.finish(job_id, "failed")
+        raise
+    execution_time = time.perf_counter() - timer
+    logger.info(f"search job executed in {execution_time*1000:.2f}ms", extra={
+        "job_id": job_id,
+        "duration": execution_time*1000,
+        "years": len(year_ranges),
+        "segment_count": hits,
+    })
+
+
 @celery.task
 def task_parse_video_transcriptions(video_id: int, force: bool = False):
     video = VideoService.get_by_id(video_id)
@@ -688,9 +918,8 @@ def channel_transcribe_audio(channel_id: int):
                     extra={"channel_id": channel_id})
         for video in channel.videos:
             if video.audio is not None:
-                logger.info("Task queued, processing audio for video",
-                            extra={"video_id": video.id})
-                _ = task_transcribe_audio.delay(video.id)
+                transcription_queue.enqueue(video.id, TranscriptionPriority.Backfill)
+        _ = task_transcribe_batch.delay()
     return redirect(request.referrer)
 
 
@@ -61,6 +61,30 @@ class Config:
         self.transcription_batch_size: int = int(
             os.environ.get("TRANSCRIPTION_BATCH_SIZE", 8)
         )  # lower this if gpu vram low
+        # Queued videos a transcription worker takes per task, the next one downloads during transcription
+        self.transcription_queue_batch: int = int(
+            os.environ.get("TRANSCRIPTION_QUEUE_BATCH", 4)
+        )
+        # Long VODs are split into chunks of about this many seconds transcribed in parallel, 0 disables
+        self.transcription_chunk_seconds: int = int(
+            os.environ.get("TRANSCRIPTION_CHUNK_SECONDS", 600)
+        )
+        # Skip the silent parts of the audio before transcribing
+        self.transcription_vad: bool = os.environ.get(
+            "TRANSCRIPTION_VAD", "true").lower() == "true"
+        # Load the model when a worker process starts instead of on the first transcription
+        self.transcription_warm_start: bool = os.environ.get(
+            "TRANSCRIPTION_WARM_START", "false").lower() == "true"
+        # Seconds a loaded model may sit unused before it is unloaded, 0 keeps it loaded
+        self.transcription_model_idle_timeout: int = int(
+            os.environ.get("TRANSCRIPTION_MODEL_IDLE_TIMEOUT", 1800)
+        )
+        self.embedder: str = os.environ.get("EMBEDDER", "hashing")
+        self.search_index_broadcasters: list[int] = [
+            int(broadcaster_id)
+            for broadcaster_id in os.environ.get("SEARCH_INDEX_BROADCASTERS", "").split(",")
+            if broadcaster_id.strip()
+        ]
         self.api_key: str = os.environ.get("API_KEY", "not_a_secure_key!11")
         self.hf_token: str | None = os.environ.get("HF_TOKEN")
         self.discord_bot_token: str | None = os.environ.get(
@@ -73,4 +73,22 @@ class ModerationActionType(Enum):
 
 class ModerationScope(Enum):
     global_ = "global"
-    channel = "channel"
\ No newline at end of file
+    channel = "channel"
+
+class SearchRank(Enum):
+    Recent = "recent"  # Newest videos first
+    Relevance = "relevance"  # Best matching videos first, ranked by the database
+
+class SearchMode(Enum):
+    FullText = "fulltext"  # Words of the search appear in the segment
+    Semantic = "semantic"  # Segments closest to the search by embedding
+    Fuzzy = "fuzzy"  # Segments with words spelled like the search
+
+class SearchPlan(Enum):
+    IndexFirst = "index_first"  # Text index finds the matches, channel and date are checked on those
+    FilterFirst = "filter_first"  # Channel and date index finds the segments, text is checked on those
+    Default = "default"  # Postgres picks, the estimates were too close to force either index
+
+class TranscriptionPriority(Enum):
+    Recent = "recent"  # New VODs found by full_processing_task
+    Backfill = "backfill"  # Bulk transcription of a channel's older videos
@@ -1,6 +1,13 @@
+import base64
+import json
 from dataclasses import dataclass
+from datetime import datetime
+from markupsafe import Markup
+from app.normalize import highlight, render_headline
 from .transcription import Segments
 from .video import Video
+from .timestamp_mapping import SegmentPlacement
+from .enums import SearchPlan
 
 
 @dataclass
@@ -8,28 +15,45 @@ class SegmentsResult:
     segments: list[Segments]
     video: Video
     search_words: list[str]
+    # Where the segment plays when video is a linked target video rather than its own
+    placement: SegmentPlacement | None = None
 
     def get_sentences(self) -> str:
-        full_sentence: str = ""
-        for segment in self.segments:
-            full_sentence += " " + segment.text
-        return full_sentence
+        return "".join(" " + segment.text for segment in self.segments)
 
-    def get_sentences_formated(self) -> str:
-        full_sentence = self.get_sentences()
-        for word in self.search_words:
-            full_sentence = full_sentence.replace(word, word.upper())
-        return full_sentence
+    def get_sentences_formated(self) -> Markup:
+        """Text with the matched words wrapped in <mark>, safe to render."""
+        headlines = [segment.headline for segment in self.segments if segment.headline is not None]
+        if len(headlines) == len(self.segments):
+            return render_headline("".join(" " + headline for headline in headlines))
+        return highlight(self.get_sentences(), self.search_words)
+
+    def get_context_before(self) -> str:
+        """Text of the segments leading up to the hit, empty unless search context was requested."""
+        first_segment = min(self.segments, key=lambda x: x.start)
+        return " ".join(reversed(first_segment.context_before or []))
+
+    def get_context_after(self) -> str:
+        """Text of the segments following the hit, empty unless search context was requested."""
+        last_segment = max(self.segments, key=lambda x: x.end)
+        return " ".join(last_segment.context_after or [])
 
     def start_time(self) -> int:
+        if self.placement is not None:
+            return int(self.placement.target_start)
         min_segment = min(self.segments, key=lambda x: x.start)
         return min_segment.start
 
     def end_time(self) -> int:
+        if self.placement is not None:
+            return int(self.placement.target_end)
         max_segment = max(self.segments, key=lambda x: x.end)
         return max_segment.end
 
     def get_url(self) -> str:
+        if self.placement is not None:
+            from app.services.video import VideoService
+            return VideoService.get_url_with_timestamp(self.video, max(self.start_time() - 5, 0))
         min_segment = min(self.segments, key=lambda x: x.start)
         from app.services.transcription import SegmentService
         return SegmentService.get_url_timestamped(min_segment)
@@ -39,3 +63,62 @@ class SegmentsResult:
 class VideoResult:
     segment_results: list[SegmentsResult]
     video: Video
+
+
+@dataclass(frozen=True)
+class SearchCursor:
+    """
+    Keyset position in a paginated search.
+
+    Results are ordered by the video a hit is shown on, its upload time and id, then by
+    (transcription id, segment start, segment id), all descending. A page ends between two
+    result videos, the cursor points at the last row that was returned.
+    """
+    uploaded: datetime
+    video_id: int
+    transcription_id: int
+    start: int
+    segment_id: int
+
+    def encode(self) -> str:
+        payload = json.dumps(
+            [self.uploaded.isoformat(), self.video_id, self.transcription_id, self.start, self.segment_id])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @classmethod
+    def decode(cls, token: str) -> "SearchCursor":
+        try:
+            uploaded, video_id, transcription_id, start, segment_id = json.loads(
+                base64.urlsafe_b64decode(token.encode()))
+            return cls(
+                uploaded=datetime.fromisoformat(uploaded),
+                video_id=int(video_id),
+                transcription_id=int(transcription_id),
+                start=int(start),
+                segment_id=int(segment_id),
+            )
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid search cursor: {token}") from e
+
+
+@dataclass
+class SearchPage:
+    video_results: list[VideoResult]
+    next_cursor: SearchCursor | None
+
+
+@dataclass(frozen=True)
+class SearchFacet:
+    """Number of search hits in one channel during one month."""
+    channel_id: int
+    month: datetime
+    hits: int
+    videos: int
+
+
+@dataclass(frozen=True)
+class SearchPlanChoice:
+    """How a full text search is driven, with the row estimates the choice was made from."""
+    plan: SearchPlan
+    estimated_hits: int
+    estimated_scope: int
@@ -1,12 +1,108 @@
-from sqlalchemy import String, Integer, Float, Boolean, ForeignKey, JSON
+from sqlalchemy import String, Integer, Float, Boolean, ForeignKey, JSON, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import TYPE_CHECKING, Dict, Iterable, List, Any, Optional, Protocol, Sequence, Tuple
 from .base import Base
 
 if TYPE_CHECKING:
     from .video import Video
 
 
+class SegmentTimes(Protocol):
+    """A segment's id and time range, a Segments or a row selecting Segments.id, start and end."""
+
+    @property
+    def id(self) -> int: ...
+
+    @property
+    def start(self) -> float: ...
+
+    @property
+    def end(self) -> float: ...
+
+
+class TimestampTranslator:
+    """
+    Piecewise linear translation between a source video and a target video with cuts.
+
+    Cuts are sorted once and their durations prefix summed, so each timestamp is translated
+    with a binary search instead of a pass over every cut.
+    """
+
+    def __init__(self, source_start_time: float, source_end_time: float,
+                 target_start_time: float, target_end_time: float,
+                 time_offset: float, cuts: List[Dict[str, float]]):
+        self.source_start_time = source_start_time
+        self.source_end_time = source_end_time
+        self.target_start_time = target_start_time
+        self.target_end_time = target_end_time
+        self.time_offset = time_offset
+
+        spans = sorted(
+            ((cut.get('start', 0.0), cut.get('duration', 0.0)) for cut in cuts),
+            key=lambda span: span[0],
+        )
+
+        # Source to target: timestamps inside a cut are dropped, after it they move back by its duration.
+        # Overlapping cuts are merged for the inside check, durations are summed by where each cut ends.
+        self._cut_starts: List[float] = []
+        self._cut_ends: List[float] = []
+        for start, duration in spans:
+            if self._cut_starts and start <= self._cut_ends[-1]:
+                self._cut_ends[-1] = max(self._cut_ends[-1], start + duration)
+            else:
+                self._cut_starts.append(start)
+                self._cut_ends.append(start + duration)
+        by_end = sorted((start + duration, duration) for start, duration in spans)
+        self._ends = [end for end, _ in by_end]
+        self._cut_before_end = list(accumulate((duration for _, duration in by_end), initial=0.0))
+
+        # Target to source: walking the cuts in order, a cut is added back while the time adjusted
+        # so far has reached its start. That holds for a prefix of the cuts, whose length is found
+        # from the running maximum of each cut's start minus the durations before it.
+        self._cut_before_start = list(accumulate((duration for _, duration in spans), initial=0.0))
+        self._add_back_from = list(accumulate(
+            (start - self.source_start_time - self._cut_before_start[i] for i, (start, _) in enumerate(spans)),
+            max,
+        ))
+
+    def source_to_target(self, source_timestamp: float) -> Optional[float]:
+        """Timestamp in the target video, or None if not mappable."""
+        if not (self.source_start_time <= source_timestamp <= self.source_end_time):
+            return None
+
+        i = bisect_right(self._cut_starts, source_timestamp) - 1
+        if i >= 0 and source_timestamp <= self._cut_ends[i]:
+            return None
+
+        relative_time = source_timestamp - self.source_start_time
+        target_timestamp = self.target_start_time + relative_time - self.time_offset
+        target_timestamp -= self._cut_before_end[bisect_left(self._ends, source_timestamp)]
+
+        if target_timestamp < self.target_start_time or target_timestamp > self.target_end_time:
+            return None
+        return max(0.0, target_timestamp)
+
+    def target_to_source(self, target_timestamp: float) -> Optional[float]:
+        """Timestamp in the source video, or None if not mappable."""
+        if not (self.target_start_time <= target_timestamp <= self.target_end_time):
+            return None
+
+        relative_target_time = target_timestamp - self.target_start_time
+        added_back = bisect_right(self._add_back_from, relative_target_time)
+        relative_target_time += self._cut_before_start[added_back]
+
+        source_timestamp = self.source_start_time + relative_target_time + self.time_offset
+        if source_timestamp < self.source_start_time or source_timestamp > self.source_end_time:
+            return None
+        return source_timestamp
+
+    def translate_many(self, source_timestamps: Iterable[float]) -> List[Optional[float]]:
+        """source_to_target() for a batch of timestamps, e.g. every segment of a transcription."""
+        return [self.source_to_target(timestamp) for timestamp in source_timestamps]
+
+
 class TimestampMapping(Base):
     __tablename__ = "timestamp_mapping"
     
@@ -45,6 +141,22 @@ class TimestampMapping(Base):
     # Whether this mapping is active
     active: Mapped[bool] = mapped_column(Boolean, default=True)
     
+    def compile_translator(self) -> "TimestampTranslator":
+        """
+        Translator for the mapping as it is now, build once to translate many timestamps.
+
+        Returns:
+            TimestampTranslator, stale once the offset, ranges or cuts change
+        """
+        return TimestampTranslator(
+            source_start_time=self.source_start_time,
+            source_end_time=self.source_end_time,
+            target_start_time=self.target_start_time,
+            target_end_time=self.target_end_time,
+            time_offset=self.time_offset or 0.0,
+            cuts=self.cuts_data.get('cuts', []) if self.cuts_data else [],
+        )
+
     def translate_source_to_target(self, source_timestamp: float) -> Optional[float]:
         """
         Translate a timestamp from source video to target video.
@@ -55,38 +167,7 @@ class TimestampMapping(Base):
         Returns:
             Timestamp in target video, or None if not mappable
         """
-        # Check if timestamp is within this mapping's source range
-        if not (self.source_start_time <= source_timestamp <= self.source_end_time):
-            return None
-            
-        # Calculate base target timestamp
-        relative_time = source_timestamp - self.source_start_time
-        target_timestamp = self.target_start_time + relative_time - self.time_offset
-        
-        # Apply cuts/edits if they exist
-        if self.cuts_data and 'cuts' in self.cuts_data:
-            cuts = self.cuts_data['cuts']
-            total_cut_time = 0.0
-            
-            for cut in cuts:
-                cut_start = cut.get('start', 0.0)
-                cut_duration = cut.get('duration', 0.0)
-                cut_end = cut_start + cut_duration
-                
-                # If the timestamp is after this cut, subtract the cut duration
-                if source_timestamp > cut_end:
-                    total_cut_time += cut_duration
-                # If the timestamp is within the cut, it doesn't exist in target
-                elif cut_start <= source_timestamp <= cut_end:
-                    return None
-                    
-            target_timestamp -= total_cut_time
-        
-        # Ensure the result is within target range
-        if target_timestamp < self.target_start_time or target_timestamp > self.target_end_time:
-            return None
-            
-        return max(0.0, target_timestamp)
+        return self.compile_translator().source_to_target(source_timestamp)
     
     def translate_target_to_source(self, target_timestamp: float) -> Optional[float]:
         """
@@ -98,40 +179,7 @@ class TimestampMapping(Base):
         Returns:
             Timestamp in source video, or None if not mappable
         """
-        # Check if timestamp is within this mapping's target range
-        if not (self.target_start_time <= target_timestamp <= self.target_end_time):
-            return None
-            
-        # Start with relative timestamp in target
-        relative_target_time = target_timestamp - self.target_start_time
-        
-        # Add back cuts to find original source time
-        if self.cuts_data and 'cuts' in self.cuts_data:
-            cuts = self.cuts_data['cuts']
-            adjusted_time = relative_target_time
-            
-            # Sort cuts by start time
-            sorted_cuts = sorted(cuts, key=lambda x: x.get('start', 0.0))
-            
-            for cut in sorted_cuts:
-                cut_start = cut.get('start', 0.0) - self.source_start_time
-                cut_duration = cut.get('duration', 0.0)
-                
-                # If we're past this cut point in the target video,
-                # add back the cut duration to get source time
-                if adjusted_time >= cut_start:
-                    adjusted_time += cut_duration
-            
-            relative_target_time = adjusted_time
-        
-        # Calculate source timestamp
-        source_timestamp = self.source_start_time + relative_target_time + self.time_offset
-        
-        # Ensure the result is within source range
-        if source_timestamp < self.source_start_time or source_timestamp > self.source_end_time:
-            return None
-            
-        return source_timestamp
+        return self.compile_translator().target_to_source(target_timestamp)
     
     def adjust_time_offset(self, new_offset: float) -> None:
         """
@@ -199,8 +247,67 @@ class TimestampMapping(Base):
             
         return sum(cut.get('duration', 0.0) for cut in self.cuts_data['cuts'])
     
+    def place_segments(self, segments: Sequence[SegmentTimes]) -> List[Dict[str, Any]]:
+        """
+        SegmentPlacement rows for the segments of the source video that exist in the target video.
+
+        Args:
+            segments: Segments of the source video
+
+        Returns:
+            Row values for every segment whose start and end both translate
+        """
+        translator = self.compile_translator()
+        starts = translator.translate_many(segment.start for segment in segments)
+        ends = translator.translate_many(segment.end for segment in segments)
+        rows = []
+        for segment, target_start, target_end in zip(segments, starts, ends):
+            if target_start is None or target_end is None:
+                continue
+            rows.append({
+                'segment_id': segment.id,
+                'mapping_id': self.id,
+                'target_video_id': self.target_video_id,
+                'target_start': target_start,
+                'target_end': target_end,
+            })
+        return rows
+
     def __repr__(self) -> str:
         return (f"<TimestampMapping(id={self.id}, "
                 f"source={self.source_video_id}[{self.source_start_time}-{self.source_end_time}], "
                 f"target={self.target_video_id}[{self.target_start_time}-{self.target_end_time}], "
-                f"offset={self.time_offset})>")
\ No newline at end of file
+                f"offset={self.time_offset})>")
+
+
+class SegmentPlacement(Base):
+    """
+    Where a source video segment plays in a linked target video.
+
+    Materialized from the mapping's offset and cuts so readers don't translate timestamps
+    themselves, rebuilt by VideoService whenever the mapping changes and by SegmentService
+    when the source video gets new segments.
+    """
+    __tablename__ = "segment_placement"
+
+    segment_id: Mapped[int] = mapped_column(
+        ForeignKey("segments.id", ondelete="CASCADE"), primary_key=True
+    )
+    mapping_id: Mapped[int] = mapped_column(
+        ForeignKey("timestamp_mapping.id", ondelete="CASCADE"), primary_key=True
+    )
+    target_video_id: Mapped[int] = mapped_column(ForeignKey("video.id", ondelete="CASCADE"))
+
+    # Time range in the target video, in seconds
+    target_start: Mapped[float] = mapped_column(Float)
+    target_end: Mapped[float] = mapped_column(Float)
+
+    def __repr__(self) -> str:
+        return (f"<SegmentPlacement(segment={self.segment_id}, mapping={self.mapping_id}, "
+                f"target={self.target_video_id}[{self.target_start}-{self.target_end}])>")
+
+
+# Rebuilding a mapping deletes its rows, the primary key only covers lookups by segment
+Index('ix_segment_placement_mapping_id', SegmentPlacement.mapping_id)
+# A target video's transcript reads its placed segments in playback order
+Index('ix_segment_placement_target_start', SegmentPlacement.target_video_id, SegmentPlacement.target_start)
@@ -1,5 +1,7 @@
 from sqlalchemy import String, Integer, Boolean, Enum, DateTime, ForeignKey, Text, Computed, Index
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, query_expression
+from app.embeddings import EMBEDDING_DIMENSIONS
+from .vector import Vector
 from pydantic import BaseModel
 from .enums import TranscriptionSource
 from .base import Base
@@ -55,6 +57,20 @@ class Segments(Base):
         TSVectorType("text", regconfig="simple"),
         Computed("to_tsvector('simple', \"text\")", persisted=True),
     )
+    # Same text with English stemming and stopwords, for searches that should match any word form
+    text_tsv_english: Mapped[TSVectorType] = mapped_column(
+        TSVectorType("text", regconfig="english"),
+        Computed("to_tsvector('english', \"text\")", persisted=True),
+    )
+    # Text of this segment followed by the next one, lets phrases match across a segment boundary.
+    # Filled in by SegmentService.update_text_windows once the whole transcription is parsed.
+    text_window_tsv: Mapped[TSVectorType | None] = mapped_column(
+        TSVectorType(regconfig="simple"), nullable=True
+    )
+    # Semantic search vector, filled in by SegmentService.update_embeddings, not loaded unless asked for
+    embedding: Mapped[list[float] | None] = mapped_column(
+        Vector(EMBEDDING_DIMENSIONS), nullable=True, deferred=True
+    )
     start: Mapped[int] = mapped_column(Integer, nullable=False)
     end: Mapped[int] = mapped_column(Integer, nullable=False)
     previous_segment_id: Mapped[int | None] = mapped_column(
@@ -64,8 +80,43 @@ class Segments(Base):
         ForeignKey("transcriptions.id"), index=True
     )
     transcription: Mapped["Transcription"] = relationship()
+    # Copied from the transcription's video so search can filter segments without joining
+    video_id: Mapped[int] = mapped_column(ForeignKey("video.id"), index=True)
+    channel_id: Mapped[int] = mapped_column(ForeignKey("channels.id"))
+    video_uploaded: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # Translated time ranges in the videos this segment's video is linked to
+    placements: Mapped[list["SegmentPlacement"]] = relationship(viewonly=True)  # type: ignore[name-defined]
+    # Highlighted text, only set when a search query loads it with with_expression()
+    headline: Mapped[str | None] = query_expression()
+    # Text of the neighbouring segments, nearest first, only set when a search asks for context
+    context_before: Mapped[list[str] | None] = query_expression()
+    context_after: Mapped[list[str] | None] = query_expression()
 
 
 # Define GIN index for optimal full-text search performance
 # Note: transcription_id already has a btree index from the ForeignKey definition
 Index('ix_segments_text_tsv_gin', Segments.text_tsv, postgresql_using='gin')
+Index('ix_segments_text_tsv_english_gin', Segments.text_tsv_english, postgresql_using='gin')
+Index('ix_segments_text_window_tsv_gin', Segments.text_window_tsv, postgresql_using='gin')
+Index(
+    'ix_segments_text_trgm',
+    Segments.text,
+    postgresql_using='gin',
+    postgresql_ops={'text': 'gin_trgm_ops'},
+)
+Index(
+    'ix_segments_embedding_hnsw',
+    Segments.embedding,
+    postgresql_using='hnsw',
+    postgresql_ops={'embedding': 'vector_cosine_ops'},
+)
+# Channel / date filtering and keyset pagination order of search
+Index(
+    'ix_segments_channel_uploaded',
+    Segments.channel_id,
+    Segments.video_uploaded.desc(),
+    Segments.transcription_id.desc(),
+    Segments.start.desc(),
+)
+# Neighbouring segments of a hit are looked up by position within the transcription
+Index('ix_segments_transcription_start', Segments.transcription_id, Segments.start)
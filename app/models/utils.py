@@ -1,4 +1,9 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pydantic import BaseModel, ConfigDict
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from typing import Callable, Dict, Any
 
 
@@ -19,3 +24,50 @@ class DownloadProgress(BaseModel):
 
 # Type for the progress callback function
 ProgressCallbackType = Callable[[Dict[str, Any]], None]
+
+
+class QueryCount:
+    """Number of statements sent to the database inside a count_queries block."""
+
+    def __init__(self, parent: "QueryCount | None" = None):
+        self.count = 0
+        self.parent = parent
+
+
+# Innermost count_queries block the current thread or task is in, if any
+_query_count: ContextVar[QueryCount | None] = ContextVar("query_count", default=None)
+
+
+def _count_query(*args, **kwargs) -> None:
+    counter = _query_count.get()
+    while counter is not None:
+        counter.count += 1
+        counter = counter.parent
+
+
+def install_query_counter() -> None:
+    """
+    Register the listener count_queries relies on, for every engine.
+
+    Called once at startup, adding and removing listeners isn't thread-safe so it is never
+    done per search.
+    """
+    if not event.contains(Engine, "before_cursor_execute", _count_query):
+        event.listen(Engine, "before_cursor_execute", _count_query)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCount]:
+    """
+    Count database round-trips made by the current thread while the block runs, blocks
+    can be nested.
+
+    Used to keep an eye on lazy loads sneaking into hot paths. Nothing is counted until
+    install_query_counter() has been called, or for a mocked session in tests.
+    """
+    counter = QueryCount(_query_count.get())
+    token = _query_count.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_count.reset(token)
@@ -0,0 +1,34 @@
+from sqlalchemy import Float, cast
+from sqlalchemy.types import UserDefinedType
+
+
+class Vector(UserDefinedType):
+    """pgvector `vector` column, values are lists of floats."""
+    cache_ok = True
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    def get_col_spec(self, **kw) -> str:
+        return f"VECTOR({self.dimensions})"
+
+    def bind_processor(self, dialect):
+        def process(value: list[float] | None) -> str | None:
+            if value is None:
+                return None
+            return "[" + ",".join(str(float(v)) for v in value) + "]"
+        return process
+
+    def result_processor(self, dialect, coltype):
+        def process(value: str | None) -> list[float] | None:
+            if value is None:
+                return None
+            return [float(v) for v in value.strip("[]").split(",")]
+        return process
+
+    def bind_expression(self, bindvalue):
+        return cast(bindvalue, self)
+
+    class comparator_factory(UserDefinedType.Comparator):
+        def cosine_distance(self, other: list[float]):
+            return self.op("<=>", return_type=Float)(other)
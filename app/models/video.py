@@ -48,6 +48,8 @@ class Video(Base):
     thumbnail: Mapped[File | None] = mapped_column(
         FileField(upload_storage="thumbnails"))
     audio: Mapped[File | None] = mapped_column(FileField())
+    # SHA-256 of the normalized audio, the same recording fetched again isn't stored twice
+    audio_checksum: Mapped[str | None] = mapped_column(String(64), index=True, nullable=True)
     transcriptions: Mapped[list["Transcription"]] = relationship(
         back_populates="video", cascade="all, delete-orphan"
     )
@@ -0,0 +1,81 @@
+"""
+Text normalization shared by parsing, searching and result highlighting.
+
+Stopwords and the stemmer are loaded once per process and stemmed tokens are memoized,
+the same word shows up in a lot of queries and segments.
+"""
+import re
+from collections.abc import Iterable
+from functools import cache, lru_cache
+from markupsafe import Markup, escape
+from nltk.corpus import stopwords  # type: ignore
+from nltk.tokenize import word_tokenize  # type: ignore
+from nltk.stem import PorterStemmer  # type: ignore
+
+# Distinct tokens kept in the stem memo
+STEM_CACHE_SIZE = 65536
+
+# Markers around highlighted words in database headlines, private use characters
+# that never appear in transcripts, swapped for HTML once the text is escaped
+HEADLINE_START = "\ue000"
+HEADLINE_STOP = "\ue001"
+
+_stemmer = PorterStemmer()
+_word_pattern = re.compile(r"(\w+)")
+
+
+@cache
+def english_stopwords() -> frozenset[str]:
+    """Loaded on first use, NLTK data is downloaded when the app starts."""
+    return frozenset(stopwords.words("english"))
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(token: str) -> str:
+    return _stemmer.stem(token)
+
+
+def stem_tokens(tokens: Iterable[str]) -> list[str]:
+    """Stem tokens, dropping stopwords."""
+    sw = english_stopwords()
+    return [stem(token) for token in tokens if token not in sw]
+
+
+def normalize(sentence: str) -> list[str]:
+    """Tokenize a sentence into stemmed search words, without stopwords."""
+    return stem_tokens(word_tokenize(sentence))
+
+
+def normalize_many(sentences: Iterable[str]) -> list[list[str]]:
+    """normalize() for a batch of sentences, sharing the stopword set and stem memo."""
+    return [normalize(sentence) for sentence in sentences]
+
+
+def loosely_normalize(sentence: str) -> list[str]:
+    """Tokenize a sentence and drop stopwords, without stemming."""
+    sw = english_stopwords()
+    return [token for token in word_tokenize(sentence) if token not in sw]
+
+
+def render_headline(headline: str) -> Markup:
+    """HTML for a headline with HEADLINE_START/HEADLINE_STOP markers, the text itself is escaped."""
+    return Markup(
+        str(escape(headline))
+        .replace(HEADLINE_START, "<mark>")
+        .replace(HEADLINE_STOP, "</mark>")
+    )
+
+
+def highlight(text: str, search_words: Iterable[str]) -> Markup:
+    """
+    Mark every word in text whose stem is one of the given search words.
+
+    Used when no database headline was loaded, the output matches render_headline().
+    """
+    stems = set(search_words)
+    parts = _word_pattern.split(text)
+    # Words are at the odd indexes of the split
+    for i in range(1, len(parts), 2):
+        if stem(parts[i]) in stems:
+            parts[i] = HEADLINE_START + parts[i] + HEADLINE_STOP
+    return render_headline("".join(parts))
@@ -1,12 +1,18 @@
-from flask import Blueprint, render_template, request, session
+import uuid
+from datetime import datetime
+from flask import Blueprint, flash, render_template, request, session, jsonify
 from app.logger import logger
 from app.rate_limit import limiter, rate_limit_exempt
-from app.search import search_v2
+from app.search import search_v2, search_v2_page, search_facets, load_search_results, SEARCH_MAX_CONTEXT
+from app.search_jobs import search_job_tracker
 from app.utils import get_valid_date
 from app.permissions import check_banned, has_any_moderation_access, get_accessible_channels
 from app.services import UserService, ModerationService, BroadcasterService 
 from flask_login import current_user # type: ignore
 from app.models.channel import Channels
+from app.models.broadcaster import Broadcaster
+from app.models.search import SearchCursor
+from app.models.enums import SearchRank, SearchMode
 from app.models import db
 
 search_blueprint = Blueprint('search', __name__, url_prefix='/search',
@@ -17,6 +23,12 @@ search_blueprint = Blueprint('search', __name__, url_prefix='/search',
 @limiter.shared_limit("1000 per day, 60 per minute", exempt_when=rate_limit_exempt, scope="normal")
 @check_banned()
 def search_page():
+    logger.info(f"Loaded search.html")
+    return render_template("search.html", broadcasters=searchable_broadcasters())
+
+
+def searchable_broadcasters():
+    """Broadcasters the current user can pick on the search form."""
     if current_user.is_anonymous:
         broadcasters = BroadcasterService.get_all(show_hidden=False)
 
@@ -30,41 +42,264 @@ def search_page():
         broadcasters = [broadcaster for broadcaster in all_broadcasters if broadcaster.id not in banned_broadcaster_ids]
     if not current_user.is_anonymous and UserService.is_broadcaster(current_user):
         broadcasters.append(UserService.get_broadcaster(current_user))
-    logger.info(f"Loaded search.html")
-    return render_template("search.html", broadcasters=broadcasters)
+    return broadcasters
 
 
-@search_blueprint.route("", methods=["POST"], strict_slashes=False)
-@limiter.shared_limit("100 per day, 5 per minute", exempt_when=rate_limit_exempt, scope="query")
-@check_banned()
-def search_word():
-    logger.info("User searching something..")
-    search_term = request.form["search"]
-    broadcaster_id = int(request.form["broadcaster"])
-    session["last_selected_broadcaster"] = broadcaster_id
-
-    start_date = get_valid_date(request.form.get("start_date", ""))
-    end_date = get_valid_date(request.form.get("end_date", ""))
-    channel_type = request.form.get("channel_type", "all")
+def parse_search_form(form) -> tuple[str, Broadcaster, list[Channels], datetime | None, datetime | None]:
+    """Read the search form shared by the search endpoints."""
+    search_term = form["search"]
+    broadcaster_id = int(form["broadcaster"])
+    start_date = get_valid_date(form.get("start_date", ""))
+    end_date = get_valid_date(form.get("end_date", ""))
+    channel_type = form.get("channel_type", "all")
     broadcaster = BroadcasterService.get_by_id(broadcaster_id)
     channels = [
         channel
         for channel in broadcaster.channels
         if str(channel.platform_name).lower() == channel_type or channel_type == "all"
     ]
+    return search_term, broadcaster, channels, start_date, end_date
+
+
+def parse_search_cursor(form) -> SearchCursor | None:
+    token = form.get("cursor", "")
+    if token == "":
+        return None
+    return SearchCursor.decode(token)
+
+
+def is_first_page_request() -> bool:
+    """Whether a paginated search request comes without a cursor, which runs the whole search anew."""
+    return request.form.get("cursor", "") == ""
+
+
+def parse_search_rank(form) -> SearchRank:
+    try:
+        return SearchRank(form.get("rank", SearchRank.Recent.value))
+    except ValueError:
+        return SearchRank.Recent
+
+
+def parse_search_mode(form) -> SearchMode:
+    try:
+        return SearchMode(form.get("mode", SearchMode.FullText.value))
+    except ValueError:
+        return SearchMode.FullText
+
+
+def parse_search_stemmed(form) -> bool:
+    """Whether words should match in any form instead of exactly as typed."""
+    return form.get("stemmed", "") in ("on", "true", "1")
+
+
+def parse_search_context(form) -> int:
+    """Neighbouring segments to show around each hit, 0 for none."""
+    try:
+        context = int(form.get("context", 0) or 0)
+    except ValueError:
+        return 0
+    return max(0, min(context, SEARCH_MAX_CONTEXT))
+
+
+def parse_search_background(form) -> bool:
+    """Whether the search should run on a worker, showing results a year at a time as they come in."""
+    return form.get("background", "") in ("on", "true", "1")
+
+
+def start_search_job(search_term: str, channels: list[Channels], start_date: datetime | None,
+                     end_date: datetime | None, context: int, stemmed: bool) -> tuple[str, dict]:
+    """Queue a background search, returns the job id and its initial progress."""
+    # Imported here, the tasks module imports the app
+    from app.main import task_search_job
+    if not search_term.strip('" '):
+        raise ValueError("Search was too short")
+    job_id = str(uuid.uuid4())
+    job = search_job_tracker.create(job_id, search_term, context, stemmed)
+    task_search_job.delay(
+        job_id, search_term, [channel.id for channel in channels],
+        start_date.isoformat() if start_date else None,
+        end_date.isoformat() if end_date else None,
+        stemmed,
+    )
+    logger.info("Queued search job %s", job_id, extra={"job_id": job_id, "channels": [c.name for c in channels]})
+    return job_id, job
+
+
+def search_form_params(form) -> dict[str, str]:
+    """Form values of the search, to fill the search form again and to request the next page."""
+    return {
+        key: form.get(key, "")
+        for key in ("search", "broadcaster", "start_date", "end_date", "channel_type", "rank", "mode",
+                    "context", "stemmed", "background")
+    }
+
+
+@search_blueprint.route("", methods=["POST"], strict_slashes=False)
+@limiter.shared_limit("100 per day, 5 per minute", exempt_when=rate_limit_exempt, scope="query")
+@check_banned()
+def search_word():
+    logger.info("User searching something..")
+    search_term, broadcaster, channels, start_date, end_date = parse_search_form(request.form)
+    session["last_selected_broadcaster"] = broadcaster.id
     logger.info("channels: %s", len(channels))
-    video_result = search_v2(search_term, channels, start_date, end_date)
+    context = parse_search_context(request.form)
+    mode = parse_search_mode(request.form)
+    rank = parse_search_rank(request.form)
+    stemmed = parse_search_stemmed(request.form)
+    search_job_id, search_job = None, None
+    try:
+        if mode != SearchMode.FullText or rank == SearchRank.Relevance:
+            # Ranked searches return a single bounded page of the best matching videos
+            video_result = search_v2(
+                search_term, channels, start_date, end_date, rank=rank, context=context, mode=mode, stemmed=stemmed)
+            next_cursor = None
+        elif parse_search_background(request.form):
+            # Long searches run on a worker, the result page polls for each year's results
+            search_job_id, search_job = start_search_job(search_term, channels, start_date, end_date, context, stemmed)
+            video_result, next_cursor = [], None
+        else:
+            search_page = search_v2_page(search_term, channels, start_date, end_date, context=context, stemmed=stemmed)
+            video_result, next_cursor = search_page.video_results, search_page.next_cursor
+    except ValueError as e:
+        logger.warning("Invalid search: %s", e)
+        flash(str(e))
+        return render_template(
+            "search.html",
+            broadcasters=searchable_broadcasters(),
+            search_params=search_form_params(request.form),
+        ), 400
     transcription_stats = BroadcasterService.get_transcription_stats(
-        broadcaster_id)
+        broadcaster.id)
     return render_template(
         "result.html",
         search_word=search_term,
         broadcaster=broadcaster,
         video_result=video_result,
+        next_cursor=next_cursor,
+        search_params=search_form_params(request.form),
         transcription_stats=transcription_stats,
+        search_job_id=search_job_id,
+        search_job=search_job,
+        search_job_offset=0,
+    )
+
+
+@search_blueprint.route("/more", methods=["POST"])
+@limiter.shared_limit("1000 per day, 60 per minute", exempt_when=rate_limit_exempt, scope="normal")
+@check_banned()
+def search_more():
+    """Render the next page of result cards for an existing search."""
+    if is_first_page_request():
+        # New searches go through search_word and its rate limit
+        return "Missing cursor", 400
+    search_term, broadcaster, channels, start_date, end_date = parse_search_form(request.form)
+    try:
+        cursor = parse_search_cursor(request.form)
+        search_page = search_v2_page(
+            search_term, channels, start_date, end_date, cursor=cursor,
+            context=parse_search_context(request.form), stemmed=parse_search_stemmed(request.form))
+    except ValueError as e:
+        logger.warning("Invalid search: %s", e)
+        return str(e), 400
+    return render_template(
+        "components/search_results_page.html",
+        broadcaster=broadcaster,
+        video_result=search_page.video_results,
+        next_cursor=search_page.next_cursor,
+        search_params=search_form_params(request.form),
     )
 
 
+@search_blueprint.route("/jobs/<job_id>")
+@limiter.shared_limit("1000 per day, 60 per minute", exempt_when=rate_limit_exempt, scope="normal")
+@check_banned()
+def search_job_results(job_id: str):
+    """Render the result cards a background search stored since offset, polling again until it is done."""
+    search_job = search_job_tracker.get_progress(job_id)
+    if search_job is None:
+        return "Search not found or expired", 404
+    offset = request.args.get("offset", 0, type=int)
+    chunks = search_job_tracker.get_chunks(job_id, offset)
+    segment_ids = [segment_id for chunk in chunks for segment_id in chunk["segment_ids"]]
+    video_result = load_search_results(
+        segment_ids, search_job["search_term"], search_job["context"], search_job["stemmed"])
+    return render_template(
+        "components/search_job.html",
+        video_result=video_result,
+        next_cursor=None,
+        search_job_id=job_id,
+        search_job=search_job,
+        search_job_offset=offset + len(chunks),
+    )
+
+
+@search_blueprint.route("/results.json", methods=["POST"])
+@limiter.shared_limit("1000 per day, 60 per minute", scope="normal",
+                      exempt_when=lambda: rate_limit_exempt() or is_first_page_request())
+# Without a cursor the whole search runs, limited like a search from the form
+@limiter.shared_limit("100 per day, 5 per minute", scope="query",
+                      exempt_when=lambda: rate_limit_exempt() or not is_first_page_request())
+@check_banned()
+def search_results_json():
+    """Return one page of search results as JSON, pass next_cursor back as cursor to continue."""
+    search_term, _, channels, start_date, end_date = parse_search_form(request.form)
+    try:
+        cursor = parse_search_cursor(request.form)
+        search_page = search_v2_page(
+            search_term, channels, start_date, end_date, cursor=cursor,
+            context=parse_search_context(request.form), stemmed=parse_search_stemmed(request.form))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "videos": [
+            {
+                "id": v.video.id,
+                "title": v.video.title,
+                "uploaded": v.video.uploaded.isoformat(),
+                "segments": [
+                    {
+                        "start": s.start_time(),
+                        "end": s.end_time(),
+                        "text": s.get_sentences().strip(),
+                        "highlighted": str(s.get_sentences_formated()).strip(),
+                        "context_before": s.get_context_before(),
+                        "context_after": s.get_context_after(),
+                        "url": s.get_url(),
+                    }
+                    for s in v.segment_results
+                ],
+            }
+            for v in search_page.video_results
+        ],
+        "next_cursor": search_page.next_cursor.encode() if search_page.next_cursor else None,
+    })
+
+
+@search_blueprint.route("/facets", methods=["POST"])
+@limiter.shared_limit("1000 per day, 60 per minute", exempt_when=rate_limit_exempt, scope="normal")
+@check_banned()
+def search_facets_json():
+    """Return a histogram of search hits per channel and month, to narrow the date range before searching."""
+    search_term, _, channels, start_date, end_date = parse_search_form(request.form)
+    try:
+        facets = search_facets(search_term, channels, start_date, end_date, parse_search_stemmed(request.form))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "channels": {channel.id: channel.name for channel in channels},
+        "facets": [
+            {
+                "channel_id": facet.channel_id,
+                "month": facet.month.strftime("%Y-%m"),
+                "hits": facet.hits,
+                "videos": facet.videos,
+            }
+            for facet in facets
+        ],
+        "total_hits": sum(facet.hits for facet in facets),
+    })
+
+
 @search_blueprint.route("/chatlog", strict_slashes=False)
 @limiter.shared_limit("1000 per day, 60 per minute", exempt_when=rate_limit_exempt, scope="normal")
 @check_banned()
@@ -151,6 +151,11 @@ def video_chatlogs(video_id: int):
     else:
         chat_logs = get_all_chat_logs()
         
+        # Built once per mapping instead of walking the cuts for every message
+        translators = {
+            mapping.id: mapping.compile_translator()
+            for mapping in video.target_mappings if mapping.active
+        }
         formatted_logs = []
         for log in chat_logs:
             # Calculate offset based on which video this log belongs to
@@ -165,7 +170,7 @@ def video_chatlogs(video_id: int):
                         source_start = mapping.source_video.uploaded + timedelta(seconds=mapping.source_start_time)
                         source_offset = (log.timestamp - source_start).total_seconds()
                         # Translate source timestamp to target timestamp
-                        target_timestamp = mapping.translate_source_to_target(source_offset)
+                        target_timestamp = translators[mapping.id].source_to_target(source_offset)
                         if target_timestamp is not None:
                             offset_seconds = target_timestamp
                             break
@@ -291,33 +296,19 @@ def video_transcription_segments(video_id: int):
                 })
     
     # Add segments from source video's transcriptions if linked via TimestampMapping
+    # Only segments placed in this video are included, the rest fall in cuts or outside the mapping
     if video.target_mappings:
         for mapping in video.target_mappings:
             if mapping.active and mapping.source_video:
-                source_video = mapping.source_video
-                for transcription in source_video.transcriptions:
-                    if transcription.processed:
-                        for segment in transcription.segments:
-                            # Translate source timestamp to target timestamp
-                            target_start = mapping.translate_source_to_target(segment.start)
-                            target_end = mapping.translate_source_to_target(segment.end)
-                            
-                            # Only include segments that can be mapped to target video
-                            if target_start is not None and target_end is not None:
-                                segments.append({
-                                    "id": f"source_{segment.id}",
-                                    "transcription_id": transcription.id,
-                                    "start": target_start,
-                                    "end": target_end,
-                                    "text": f"{segment.text}",
-                                    "timestamp_url": f"{VideoService.get_url(video)}{'&' if '?' in VideoService.get_url(video) else '?'}t={int(target_start)}s"
-                                })
-                            else:
-                                logger.debug("Segment timestamp could not be translated", extra={
-                                    "segment_id": segment.id,
-                                    "source_start": segment.start,
-                                    "source_end": segment.end
-                                })
+                for segment, placement in VideoService.get_placed_segments(mapping):
+                    segments.append({
+                        "id": f"source_{segment.id}",
+                        "transcription_id": segment.transcription_id,
+                        "start": placement.target_start,
+                        "end": placement.target_end,
+                        "text": f"{segment.text}",
+                        "timestamp_url": f"{VideoService.get_url(video)}{'&' if '?' in VideoService.get_url(video) else '?'}t={int(placement.target_start)}s"
+                    })
     
     # Sort by start time
     segments.sort(key=lambda x: float(x["start"])) # type: ignore
@@ -482,6 +473,7 @@ def video_link_confirm(video_id: int):
             video.estimated_upload_time = estimated_date
     
     db.session.commit()
+    VideoService.search_links_changed([source_video])
     
     logger.info(f"Linked video {video_id} to source video {source_video_id}", 
                 extra={"video_id": video_id, "source_video_id": source_video_id, "user_id": current_user.id})
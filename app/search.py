@@ -1,134 +1,996 @@
 from datetime import datetime
-from collections.abc import Sequence
-from sqlalchemy import select
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import islice
+from typing import TypeVar
+from sqlalchemy import select, tuple_, func, and_, or_, exists, cast, literal, ColumnElement, Select, SQLColumnExpression
+from sqlalchemy.dialects.postgresql import plainto_tsquery, phraseto_tsquery, ts_headline, TSVECTOR
+from sqlalchemy.orm import aliased, contains_eager, selectinload, with_expression, InstrumentedAttribute
+from sqlalchemy.sql.base import ExecutableOption
 from app.logger import logger
 from .models import db
 from .models.channel import Channels
-from .models.transcription import Segments
-from .models.search import SegmentsResult, VideoResult
-from .services import TranscriptionService
+from .models.transcription import Segments, Transcription
+from .models.video import Video
+from .models.timestamp_mapping import TimestampMapping
+from .models.utils import count_queries
+from .models.enums import SearchRank, SearchMode, SearchPlan
+from .embeddings import get_embedder, is_zero
+from .models.search import SegmentsResult, VideoResult, SearchCursor, SearchPage, SearchFacet, SearchPlanChoice
+from .search_cache import search_cache_key, get_cached_search, set_cached_search
+from .search_index import IndexedHit, get_search_index, is_indexable_search, with_result_video
+from .normalize import HEADLINE_START, HEADLINE_STOP
 from .utils import sanitize_sentence
+import json
+import re
 import time
 
 
+# Number of videos returned per page in paginated search
+SEARCH_PAGE_SIZE = 24
+# Upper bound of segment rows read for a single page, a page ends early if reached
+SEARCH_PAGE_MAX_SEGMENTS = 2000
+# Most hits a search newest first returns
+SEARCH_RECENT_MAX_SEGMENTS = 6000
+# Rows fetched per round-trip when streaming a page from the database
+SEARCH_YIELD_PER = 200
+# Round-trips a search is expected to need: the hit query plus one selectin load per
+# eager loaded collection (per streamed batch for paginated search)
+SEARCH_EXPECTED_QUERIES = 5
+# Number of videos returned by relevance ranked search
+SEARCH_RELEVANCE_TOP_K = 50
+# Best matching segments kept per video in relevance ranked search, also what a video is scored on
+SEARCH_RELEVANCE_SEGMENTS_PER_VIDEO = 5
+# Upper bound of neighbouring segments loaded on each side of a hit
+SEARCH_MAX_CONTEXT = 3
+# Nearest segments retrieved by semantic search, also the HNSW candidate list size
+SEARCH_SEMANTIC_TOP_K = 200
+# Minimum pg_trgm word_similarity between the search and part of a segment for a fuzzy hit
+SEARCH_FUZZY_THRESHOLD = 0.5
+# Most similar segments retrieved by fuzzy search
+SEARCH_FUZZY_TOP_K = 200
+# Full text searches with fewer hits than this are topped up with fuzzy hits
+SEARCH_FUZZY_FALLBACK_HITS = 5
+# How much more a segment costs when found through the channel/date index and checked against
+# the text than when found through the text index, checking text_tsv means reading it from the row
+SEARCH_FILTER_FIRST_ROW_COST = 4
+# How many times cheaper one plan must be estimated before it is forced, closer than that the
+# estimates are not trusted to beat Postgres' own choice
+SEARCH_PLAN_MARGIN = 10
+# EXPLAIN queries run to pick the plan, only when it isn't in the search cache yet
+SEARCH_PLAN_QUERIES = 2
+# Upper bound of hits returned for one year of a background search
+SEARCH_YEAR_MAX_SEGMENTS = 6000
+
+
+def _hit_loader_options() -> list[ExecutableOption]:
+    """
+    Eager loading for search hits, everything the result grouping and result.html touch.
+
+    Expects the query to join Segments -> Transcription -> Video. Many-to-one relations are
+    joined into the hit query, the mapping collections are fetched with one selectin query each,
+    so the number of round-trips does not depend on how many segments match.
+    """
+    hit_video = contains_eager(Segments.transcription).contains_eager(Transcription.video)
+    active_source_mappings = hit_video.selectinload(
+        Video.source_mappings.and_(TimestampMapping.active == True))
+    return [
+        selectinload(Segments.placements),
+        hit_video.joinedload(Video.channel),
+        hit_video.selectinload(Video.target_mappings)
+        .joinedload(TimestampMapping.source_video),
+        active_source_mappings.joinedload(TimestampMapping.target_video)
+        .joinedload(Video.channel),
+        active_source_mappings.joinedload(TimestampMapping.target_video)
+        .selectinload(Video.target_mappings),
+    ]
+
+
+def _text_search_config(stemmed: bool) -> tuple[InstrumentedAttribute, str]:
+    """tsvector column and text search configuration of an exact or a stemmed search."""
+    if stemmed:
+        return Segments.text_tsv_english, "english"
+    return Segments.text_tsv, "simple"
+
+
+def _headline_option(search_term: str, stemmed: bool = False) -> ExecutableOption:
+    """
+    Load Segments.headline, the segment text with matched words marked by the database.
+
+    Marks use the same text search configuration as the match, so they follow the
+    words Postgres actually matched instead of re-stemming in Python.
+    """
+    _, regconfig = _text_search_config(stemmed)
+    return with_expression(
+        Segments.headline,
+        ts_headline(
+            regconfig,
+            Segments.text,
+            plainto_tsquery(regconfig, search_term),
+            f"StartSel={HEADLINE_START}, StopSel={HEADLINE_STOP}, HighlightAll=true",
+        ),
+    )
+
+
+def _context_options(context: int) -> list[ExecutableOption]:
+    """
+    Load Segments.context_before/context_after, the text of up to `context` neighbouring
+    segments on each side of a hit, nearest first.
+
+    Each side is a correlated ARRAY(SELECT ...) on (transcription_id, start) in the hit
+    query itself, so context costs no extra round-trip per hit.
+    """
+    if context <= 0:
+        return []
+    context = min(context, SEARCH_MAX_CONTEXT)
+    neighbour = aliased(Segments)
+    before = (
+        select(neighbour.text)
+        .where(neighbour.transcription_id == Segments.transcription_id, neighbour.start < Segments.start)
+        .order_by(neighbour.start.desc())
+        .limit(context)
+        .scalar_subquery()
+    )
+    after = (
+        select(neighbour.text)
+        .where(neighbour.transcription_id == Segments.transcription_id, neighbour.start > Segments.start)
+        .order_by(neighbour.start)
+        .limit(context)
+        .scalar_subquery()
+    )
+    return [
+        with_expression(Segments.context_before, func.array(before)),
+        with_expression(Segments.context_after, func.array(after)),
+    ]
+
+
+def _quoted_phrase(search_term: str) -> str | None:
+    """The phrase inside a search wrapped in double quotes, None for a regular search."""
+    term = search_term.strip()
+    if len(term) > 2 and term.startswith('"') and term.endswith('"'):
+        return term[1:-1].strip() or None
+    return None
+
+
+def _text_match(search_term: str, stemmed: bool = False, plan: SearchPlan | None = None) -> ColumnElement[bool]:
+    """
+    Full text condition of a search.
+
+    A stemmed search matches text_tsv_english, so "running" also finds "run".
+    A quoted phrase is always exact and is matched against text_window_tsv, which holds each
+    segment together with the next one, so phrases split over two segments are found by the
+    same index scan. The segment must contain the first word itself, so the hit is where the
+    phrase starts, and when the next segment holds the whole phrase on its own the segment
+    must hold it too, otherwise the hit is the next segment. A phrase that crosses into a next
+    segment which also holds it by itself is only found there.
+
+    With SearchPlan.FilterFirst the tsvector columns are wrapped so the text indexes can't be
+    used, the rows then come from the channel/date index and the text is checked on each.
+    """
+    def searchable(tsv: InstrumentedAttribute) -> SQLColumnExpression:
+        if plan == SearchPlan.FilterFirst:
+            return func.coalesce(tsv, cast("", TSVECTOR))
+        return tsv
+
+    phrase = _quoted_phrase(search_term)
+    if phrase is None:
+        tsv, regconfig = _text_search_config(stemmed)
+        return searchable(tsv).match(search_term, postgresql_regconfig=regconfig)
+    phrase_query = phraseto_tsquery("simple", phrase)
+    phrase_match = searchable(Segments.text_window_tsv).op("@@")(phrase_query)
+    words = re.findall(r"\w+", phrase)
+    if not words:
+        return phrase_match
+    next_segment = aliased(Segments)
+    in_next_segment = exists().where(
+        next_segment.id == Segments.next_segment_id, next_segment.text_tsv.op("@@")(phrase_query)
+    )
+    return and_(
+        phrase_match,
+        searchable(Segments.text_tsv).match(words[0], postgresql_regconfig="simple"),
+        or_(searchable(Segments.text_tsv).op("@@")(phrase_query), ~in_next_segment),
+    )
+
+
+def _range_filters(
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    plan: SearchPlan | None = None,
+) -> list[ColumnElement[bool]]:
+    """
+    Channel and date clauses, both covered by ix_segments_channel_uploaded.
+
+    With SearchPlan.IndexFirst the channel is compared as an expression so that index can't
+    be used and the rows come from the text index.
+    """
+    channel_id = Segments.channel_id + 0 if plan == SearchPlan.IndexFirst else Segments.channel_id
+    filters: list[ColumnElement[bool]] = [channel_id.in_([c.id for c in channels])]
+    if start_date is not None:
+        filters.append(Segments.video_uploaded >= start_date)
+    if end_date is not None:
+        filters.append(Segments.video_uploaded <= end_date)
+    return filters
+
+
+def _scope_filters(
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    plan: SearchPlan | None = None,
+) -> list[ColumnElement[bool]]:
+    """
+    Channel, date and visibility clauses shared by every search mode.
+
+    Channel and date are read from the columns copied onto segments, so they are checked
+    next to the match without looking up the channels' transcriptions first.
+    """
+    return [*_range_filters(channels, start_date, end_date, plan), Video.active == True]
+
+
+def _search_filters(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    stemmed: bool = False,
+    plan: SearchPlan | None = None,
+) -> list[ColumnElement[bool]]:
+    """Where clauses shared by the full text search queries, plan None leaves the choice to Postgres."""
+    return [_text_match(search_term, stemmed, plan), *_scope_filters(channels, start_date, end_date, plan)]
+
+
+def _estimate_rows(query: Select) -> int:
+    """Rows Postgres expects the query to return, from EXPLAIN, without running it."""
+    connection = db.session.connection()
+    compiled = query.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    explain = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar_one()
+    if isinstance(explain, str):
+        explain = json.loads(explain)
+    return int(explain[0]["Plan"]["Plan Rows"])
+
+
+def _plan_search(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    stemmed: bool = False,
+) -> SearchPlanChoice:
+    """
+    Pick between driving a full text search from the text index or from the channel/date index.
+
+    Estimates how many segments match the text and how many are in the channels and date
+    range. A narrow range, like one week, holds fewer segments than a common word has matches,
+    so reading the range and checking the text is cheaper than walking the posting list. For
+    "all time" it is the other way around. When neither side wins by SEARCH_PLAN_MARGIN the
+    choice is left to Postgres, so a poor estimate doesn't hide the index it would have used.
+
+    The choice is kept in the search cache, only the first search for a term, channels and
+    range pays for the two EXPLAIN round-trips, later pages and repeats reuse it.
+    """
+    cache_key = search_cache_key("plan", search_term, [c.id for c in channels], start_date, end_date, stemmed)
+    cached_plan = get_cached_search(cache_key)
+    if cached_plan is not None:
+        plan, estimated_hits, estimated_scope = cached_plan
+        return SearchPlanChoice(plan=SearchPlan(plan), estimated_hits=estimated_hits, estimated_scope=estimated_scope)
+
+    estimated_hits = _estimate_rows(select(Segments.id).where(_text_match(search_term, stemmed)))
+    estimated_scope = _estimate_rows(select(Segments.id).where(*_range_filters(channels, start_date, end_date)))
+    filter_first_cost = estimated_scope * SEARCH_FILTER_FIRST_ROW_COST
+    if filter_first_cost * SEARCH_PLAN_MARGIN < estimated_hits:
+        plan = SearchPlan.FilterFirst
+    elif estimated_hits * SEARCH_PLAN_MARGIN < filter_first_cost:
+        plan = SearchPlan.IndexFirst
+    else:
+        plan = SearchPlan.Default
+    set_cached_search(cache_key, [plan.value, estimated_hits, estimated_scope])
+    return SearchPlanChoice(plan=plan, estimated_hits=estimated_hits, estimated_scope=estimated_scope)
+
+
+def _recent_hits_query(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    stemmed: bool = False,
+    plan: SearchPlan | None = None,
+) -> Select[tuple[Segments]]:
+    return (
+        select(Segments)
+        .join(Segments.transcription)
+        .join(Transcription.video)
+        .where(*_search_filters(search_term, channels, start_date, end_date, stemmed, plan))
+        .options(*_hit_loader_options())
+        .order_by(Segments.video_uploaded.desc(), Segments.transcription_id.desc(), Segments.start)
+        .limit(SEARCH_RECENT_MAX_SEGMENTS)
+    )
+
+
+def _relevance_hits_query(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    top_k: int,
+    stemmed: bool = False,
+    plan: SearchPlan | None = None,
+) -> Select[tuple[Segments]]:
+    """
+    Best segments of the top_k best matching videos, best video first.
+
+    Segments are scored with ts_rank_cd, a video scores the sum of its best
+    SEARCH_RELEVANCE_SEGMENTS_PER_VIDEO segments. Ranking, aggregation and the cut-off all
+    happen in the database, so only the returned segments are sent back.
+    """
+    tsv, regconfig = _text_search_config(stemmed)
+    rank = func.ts_rank_cd(tsv, plainto_tsquery(regconfig, search_term))
+    ranked = (
+        select(
+            Segments.id.label("segment_id"),
+            Segments.video_id,
+            rank.label("rank"),
+            func.row_number().over(
+                partition_by=Segments.video_id,
+                order_by=(rank.desc(), Segments.start),
+            ).label("position"),
+        )
+        .join(Segments.transcription)
+        .join(Transcription.video)
+        .where(*_search_filters(search_term, channels, start_date, end_date, stemmed, plan))
+        .cte("ranked_segments")
+    )
+    best_segments = select(ranked).where(ranked.c.position <= SEARCH_RELEVANCE_SEGMENTS_PER_VIDEO).cte("best_segments")
+    top_videos = (
+        select(best_segments.c.video_id, func.sum(best_segments.c.rank).label("score"))
+        .group_by(best_segments.c.video_id)
+        .order_by(func.sum(best_segments.c.rank).desc(), best_segments.c.video_id.desc())
+        .limit(top_k)
+        .cte("top_videos")
+    )
+    return (
+        select(Segments)
+        .join(best_segments, best_segments.c.segment_id == Segments.id)
+        .join(top_videos, top_videos.c.video_id == best_segments.c.video_id)
+        .join(Segments.transcription)
+        .join(Transcription.video)
+        .options(*_hit_loader_options())
+        .order_by(top_videos.c.score.desc(), top_videos.c.video_id.desc(), best_segments.c.position)
+    )
+
+
+def _load_hits(segment_ids: list[int], search_term: str, context: int, stemmed: bool = False) -> list[Segments]:
+    """Load cached hits by id, returned in the order of segment_ids."""
+    if not segment_ids:
+        return []
+    segments = db.session.execute(
+        select(Segments)
+        .join(Segments.transcription)
+        .join(Transcription.video)
+        .where(Segments.id.in_(segment_ids))
+        .options(*_hit_loader_options(), _headline_option(search_term, stemmed), *_context_options(context))
+    ).scalars().all()
+    by_id = {segment.id: segment for segment in segments}
+    return [by_id[segment_id] for segment_id in segment_ids if segment_id in by_id]
+
+
+def _semantic_hits_query(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    top_k: int,
+) -> Select[tuple[Segments]] | None:
+    """
+    The top_k segments closest to the search by embedding, closest first.
+
+    None when the search has nothing to embed.
+    """
+    query_vector = get_embedder().embed([search_term.strip('"')])[0]
+    if is_zero(query_vector):
+        return None
+    return (
+        select(Segments)
+        .join(Segments.transcription)
+        .join(Transcription.video)
+        .where(Segments.embedding.is_not(None), *_scope_filters(channels, start_date, end_date))
+        .options(*_hit_loader_options())
+        .order_by(Segments.embedding.cosine_distance(query_vector))
+        .limit(top_k)
+    )
+
+
+def _fuzzy_hits_query(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    top_k: int,
+    exclude_ids: Sequence[int] = (),
+) -> Select[tuple[Segments]]:
+    """
+    The top_k segments containing something spelled like the search, most similar first.
+
+    Uses the trigram index on Segments.text, the threshold is set by _set_fuzzy_threshold().
+    """
+    term = search_term.strip('" ')
+    query = (
+        select(Segments)
+        .join(Segments.transcription)
+        .join(Transcription.video)
+        .where(Segments.text.op("%>")(term), *_scope_filters(channels, start_date, end_date))
+    )
+    if exclude_ids:
+        query = query.where(Segments.id.not_in(exclude_ids))
+    return (
+        query.options(*_hit_loader_options())
+        .order_by(func.word_similarity(term, Segments.text).desc(), Segments.id.desc())
+        .limit(top_k)
+    )
+
+
+def _set_fuzzy_threshold() -> None:
+    db.session.execute(
+        select(func.set_config("pg_trgm.word_similarity_threshold", str(SEARCH_FUZZY_THRESHOLD), True)))
+
+
+def _fuzzy_fallback(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    context: int,
+    hits: Sequence[Segments],
+    stemmed: bool = False,
+) -> list[Segments]:
+    """
+    Fuzzy hits to add to a full text search that found fewer than SEARCH_FUZZY_FALLBACK_HITS,
+    so misspelled transcripts show up without the user retrying variations.
+    """
+    if len(hits) >= SEARCH_FUZZY_FALLBACK_HITS or _quoted_phrase(search_term) is not None:
+        return []
+    _set_fuzzy_threshold()
+    query = _fuzzy_hits_query(
+        search_term, channels, start_date, end_date, SEARCH_FUZZY_TOP_K, [hit.id for hit in hits])
+    return list(db.session.execute(
+        query.options(_headline_option(search_term, stemmed), *_context_options(context))
+    ).scalars().all())
+
+
+def _inactive_transcription_ids(channels: Sequence[Channels]) -> set[int]:
+    """Transcriptions of the channels' deactivated videos, the index doesn't know which videos are active."""
+    return set(db.session.execute(
+        select(Transcription.id)
+        .join(Transcription.video)
+        .where(Video.channel_id.in_([c.id for c in channels]), Video.active == False)
+    ).scalars().all())
+
+
+def _index_hits(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    stemmed: bool = False,
+    cursor: SearchCursor | None = None,
+) -> Iterator[IndexedHit] | None:
+    """
+    Hits newest first after the cursor from the channels' in-memory index, read as they're taken.
+
+    None when the search has to go to the database. Hits of inactive videos are left out,
+    as in the database searches.
+    """
+    if stemmed or not is_indexable_search(search_term):
+        return None
+    index = get_search_index(channels)
+    if index is None:
+        return None
+    return index.search(
+        search_term, [c.id for c in channels], start_date, end_date, cursor, _inactive_transcription_ids(channels))
+
+
+def _plan_log_fields(plan: SearchPlanChoice | None) -> dict:
+    """Log fields for the plan a search ran with, empty when it was served from cache or not planned."""
+    if plan is None:
+        return {}
+    return {
+        "plan": plan.plan.value,
+        "estimated_hits": plan.estimated_hits,
+        "estimated_scope": plan.estimated_scope,
+    }
+
+
+def _log_query_count(query_count: int, limit: int) -> None:
+    if query_count > limit:
+        logger.warning("search used %s queries, expected at most %s, check for lazy loads",
+                       query_count, limit, extra={"query_count": query_count})
+
+
+def _add_segment_result(
+    segment: Segments,
+    search_words: list[str],
+    video_result: list[VideoResult],
+    video_lookup: dict[int, VideoResult],
+) -> None:
+    """
+    Add a segment hit to the grouped results, translating it to a linked target video if one exists.
+    """
+    source_video = segment.transcription.video
+
+    # Check if this source video has linked target videos
+    target_video = source_video
+    placement = None
+
+    if source_video.source_mappings:
+        # This is a source video with target mappings - use the target video instead
+        # The primary target is the lowest active mapping, as paginated search orders hits by it
+        active_mapping = min(
+            (mapping for mapping in source_video.source_mappings if mapping.active),
+            key=lambda mapping: mapping.id, default=None)
+
+        if active_mapping:
+            # Only use the target video if the segment was placed in it, segments in cuts or
+            # outside the mapped range stay on the source video
+            placement = next((p for p in segment.placements if p.mapping_id == active_mapping.id), None)
+            if placement is not None:
+                target_video = active_mapping.target_video
+
+    segment_result = SegmentsResult([segment], target_video, search_words, placement)
+
+    video_id = target_video.id
+    if video_id in video_lookup:
+        # Check if we already have a segment result for this same timestamp to avoid duplicates
+        existing_timestamps = {r.start_time() for r in video_lookup[video_id].segment_results}
+        segment_start = segment_result.start_time()
+
+        # Only add if we don't already have a segment at this exact timestamp
+        if segment_start not in existing_timestamps:
+            video_lookup[video_id].segment_results.append(segment_result)
+    else:
+        new_video_result = VideoResult([segment_result], target_video)
+        video_result.append(new_video_result)
+        video_lookup[video_id] = new_video_result
+
 
 def search_v2(
     search_term: str,
     channels: Sequence[Channels],
     start_date: datetime | None = None,
     end_date: datetime | None = None,
+    rank: SearchRank = SearchRank.Recent,
+    top_k: int = SEARCH_RELEVANCE_TOP_K,
+    context: int = 0,
+    mode: SearchMode = SearchMode.FullText,
+    stemmed: bool = False,
 ) -> list[VideoResult]:
     """
     Search for videos containing the given search term using PostgreSQL text search.
+
+    By default every match is returned, newest video first. With SearchRank.Relevance only
+    the top_k best matching videos are returned, best first, each with its best segments.
+    With context > 0 every hit comes with the text of its neighbouring segments.
+    With stemmed set words match in any form, "running" also finds "run".
+
+    SearchMode.Semantic finds the SEARCH_SEMANTIC_TOP_K segments closest in meaning instead
+    of matching words, SearchMode.Fuzzy the SEARCH_FUZZY_TOP_K segments spelled most alike.
+    Videos are then ordered by their best segment and rank is ignored. A full text search
+    with very few hits is topped up with fuzzy hits.
     """
     timer = time.perf_counter()
     video_result: list[VideoResult] = []
     video_lookup: dict[int, VideoResult] = {}
-    
-    # Get transcriptions
-    if start_date is None and end_date is None:
-        transcriptions = TranscriptionService.get_transcriptions_on_channels(channels)
-    elif start_date is not None and end_date is not None:
-        transcriptions = TranscriptionService.get_transcriptions_on_channels_daterange(
-            channels, start_date, end_date
-        )
-    else:
-        transcriptions = None
-        
-    if transcriptions is None:
-        raise ValueError("No transcriptions found on channel / daterange")
-
-    # Handle quoted search terms for phrase matching
-    db_search_term = search_term
-    if search_term.startswith('"') and search_term.endswith('"'):
-        # For phrase search, PostgreSQL handles this natively
-        db_search_term = search_term
-    
-    # Single database query with text search
-    search_result = db.session.execute(
-        select(Segments)
-        .where(
-            Segments.text_tsv.match(db_search_term, postgresql_regconfig="simple"),
-            Segments.transcription_id.in_([t.id for t in transcriptions]),
-        )
-        .order_by(Segments.transcription_id, Segments.start)
-        .limit(6000)
-    ).scalars().all()
 
-    # Process results - trust the database's text search
-    search_words = sanitize_sentence(search_term.strip('"'))
-    processed_segments = set()  # Track processed segments to avoid duplicates
-    
-    for segment in search_result:
-        source_video = segment.transcription.video
-        
-        # Create unique identifier for this segment
-        segment_key = (segment.id, segment.transcription_id, segment.start, segment.end)
-        
-        if segment_key in processed_segments:
-            continue  # Skip already processed segments
-        
-        processed_segments.add(segment_key)
-        
-        # Check if this source video has linked target videos
-        target_video = source_video
-        translated_segment = segment
-        
-        if source_video.source_mappings:
-            # This is a source video with target mappings - use the target video instead
-            # Get the first active mapping (primary target)
-            active_mapping = next((mapping for mapping in source_video.source_mappings if mapping.active), None)
-            
-            if active_mapping:
-                target_video = active_mapping.target_video
-                
-                # Translate the segment timestamps from source to target
-                translated_start = active_mapping.translate_source_to_target(segment.start)
-                translated_end = active_mapping.translate_source_to_target(segment.end)
-                
-                # Only use the target video if we can successfully translate the timestamps
-                if translated_start is not None and translated_end is not None:
-                    # Create a copy of the segment with translated timestamps
-                    # We'll store the original segment but override timestamps in SegmentsResult
-                    translated_segment = segment  # Keep original segment for text content
-                    translated_segment._translated_start = translated_start
-                    translated_segment._translated_end = translated_end
-                    translated_segment._is_translated = True
-                else:
-                    # If translation fails, fall back to source video
-                    target_video = source_video
-                    translated_segment = segment
-        
-        segment_result = SegmentsResult([translated_segment], target_video, search_words)
-        
-        video_id = target_video.id
-        if video_id in video_lookup:
-            # Check if we already have a segment result for this same timestamp to avoid duplicates
-            existing_timestamps = {r.start_time() for r in video_lookup[video_id].segment_results}
-            segment_start = segment_result.start_time()
-            
-            # Only add if we don't already have a segment at this exact timestamp
-            if segment_start not in existing_timestamps:
-                video_lookup[video_id].segment_results.append(segment_result)
+    if not search_term.strip('" '):
+        raise ValueError("Search was too short")
+
+    if not channels:
+        return video_result
+
+    cache_key = search_cache_key(
+        "search", search_term, [c.id for c in channels], start_date, end_date,
+        mode.value, rank.value, top_k, stemmed)
+    cached_ids = get_cached_search(cache_key)
+
+    expected_queries = SEARCH_EXPECTED_QUERIES
+    plan: SearchPlanChoice | None = None
+    index_hits: Iterator[IndexedHit] | None = None
+    with count_queries() as query_count:
+        if cached_ids is not None:
+            search_result = _load_hits(cached_ids, search_term, context, stemmed)
         else:
-            new_video_result = VideoResult([segment_result], target_video)
-            video_result.append(new_video_result)
-            video_lookup[video_id] = new_video_result
+            # Single database query with text search, hits come with video, channel and mappings loaded
+            query: Select[tuple[Segments]] | None = None
+            search_result = []
+            if mode == SearchMode.FullText and rank == SearchRank.Recent:
+                index_hits = _index_hits(search_term, channels, start_date, end_date, stemmed)
+            if index_hits is not None:
+                # Hits are known from the index, the database only loads them
+                search_result = _load_hits(
+                    [hit.segment_id for hit in islice(index_hits, SEARCH_RECENT_MAX_SEGMENTS)],
+                    search_term, context, stemmed)
+                expected_queries += 1
+            elif mode == SearchMode.Semantic:
+                query = _semantic_hits_query(search_term, channels, start_date, end_date, SEARCH_SEMANTIC_TOP_K)
+                if query is not None:
+                    # Let the HNSW scan collect enough candidates to fill top_k after the channel filter
+                    db.session.execute(select(func.set_config("hnsw.ef_search", str(SEARCH_SEMANTIC_TOP_K), True)))
+                    expected_queries += 1
+            elif mode == SearchMode.Fuzzy:
+                _set_fuzzy_threshold()
+                expected_queries += 1
+                query = _fuzzy_hits_query(search_term, channels, start_date, end_date, SEARCH_FUZZY_TOP_K)
+            else:
+                plan = _plan_search(search_term, channels, start_date, end_date, stemmed)
+                expected_queries += SEARCH_PLAN_QUERIES
+                if rank == SearchRank.Relevance:
+                    query = _relevance_hits_query(
+                        search_term, channels, start_date, end_date, top_k, stemmed, plan.plan)
+                else:
+                    query = _recent_hits_query(search_term, channels, start_date, end_date, stemmed, plan.plan)
+            if query is not None:
+                query = query.options(_headline_option(search_term, stemmed), *_context_options(context))
+                search_result = list(db.session.execute(query).scalars().all())
+            if mode == SearchMode.FullText:
+                fuzzy_result = _fuzzy_fallback(
+                    search_term, channels, start_date, end_date, context, search_result, stemmed)
+                if fuzzy_result:
+                    expected_queries += SEARCH_EXPECTED_QUERIES + 1
+                    search_result += fuzzy_result
+            set_cached_search(cache_key, [segment.id for segment in search_result])
+
+        # Process results - trust the database's text search
+        search_words = sanitize_sentence(search_term.strip('"'))
+        processed_segments = set()  # Track processed segments to avoid duplicates
+
+        for segment in search_result:
+            # Create unique identifier for this segment
+            segment_key = (segment.id, segment.transcription_id, segment.start, segment.end)
+
+            if segment_key in processed_segments:
+                continue  # Skip already processed segments
+
+            processed_segments.add(segment_key)
+            _add_segment_result(segment, search_words, video_result, video_lookup)
+    _log_query_count(query_count.count, expected_queries)
 
     # Filter out inactive videos and sort results
     video_result = [v for v in video_result if v.video.active]
-    
+
     for v in video_result:
         v.segment_results.sort(key=lambda r: r.start_time())
-    video_result.sort(key=lambda v: v.video.uploaded, reverse=True)
+    if rank != SearchRank.Relevance and mode == SearchMode.FullText:
+        # Ranked results keep the database order, best video first
+        video_result.sort(key=lambda v: v.video.uploaded, reverse=True)
 
     end_time = time.perf_counter()
     execution_time = end_time - timer
     logger.info(f"search executed in {execution_time*1000:.2f}ms", extra={
-        "channels": [c.name for c in channels], 
-        "duration": execution_time*1000, 
-        "result_count": len(video_result)
+        "channels": [c.name for c in channels],
+        "duration": execution_time*1000,
+        "result_count": len(video_result),
+        "rank": rank.value,
+        "mode": mode.value,
+        "cached": cached_ids is not None,
+        "query_count": query_count.count,
+        "index": index_hits is not None,
+        **_plan_log_fields(plan),
     })
     return video_result
 
 
+def _page_hits_query(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None,
+    end_date: datetime | None,
+    cursor: SearchCursor | None,
+    stemmed: bool = False,
+    plan: SearchPlan | None = None,
+) -> Select[tuple[Segments, datetime, int]]:
+    """
+    Hits after the cursor with the upload time and id of the video each is shown on.
+
+    Ordered by that video rather than the segment's own, so the hits of one result card are
+    read together even when they come from several transcriptions or linked source videos.
+    """
+    query, uploaded, video_id = with_result_video(
+        select(Segments)
+        .join(Segments.transcription)
+        .join(Transcription.video)
+        .where(*_search_filters(search_term, channels, start_date, end_date, stemmed, plan))
+    )
+    if cursor is not None:
+        query = query.where(
+            tuple_(uploaded, video_id, Segments.transcription_id, Segments.start, Segments.id)
+            < tuple_(*map(literal, (
+                cursor.uploaded, cursor.video_id, cursor.transcription_id, cursor.start, cursor.segment_id)))
+        )
+    return (
+        query.add_columns(uploaded, video_id)
+        .order_by(
+            uploaded.desc(),
+            video_id.desc(),
+            Segments.transcription_id.desc(),
+            Segments.start.desc(),
+            Segments.id.desc(),
+        )
+        .options(*_hit_loader_options(), _headline_option(search_term, stemmed))
+        .limit(SEARCH_PAGE_MAX_SEGMENTS + 1)
+        .execution_options(yield_per=SEARCH_YIELD_PER)
+    )
+
+
+_Hit = TypeVar("_Hit", Segments, IndexedHit)
+
+
+def _fill_page(
+    rows: Iterable[tuple[_Hit, SearchCursor]], page_size: int,
+) -> tuple[list[_Hit], SearchCursor | None]:
+    """
+    Take hits with their cursors until page_size result videos are complete or the row budget runs out.
+
+    Rows come grouped by the video they're shown on, so a video is never split over two pages
+    unless the row budget ends the page inside it. Returns the hits of the page and the cursor
+    of the next page, None on the last page.
+    """
+    hits: list[_Hit] = []
+    video_ids: set[int] = set()
+    last_cursor: SearchCursor | None = None
+    next_cursor: SearchCursor | None = None
+
+    for row, cursor in rows:
+        if cursor.video_id not in video_ids:
+            if len(video_ids) >= page_size:
+                # First row of the next page, everything before it is complete
+                next_cursor = last_cursor
+                break
+            video_ids.add(cursor.video_id)
+        if len(hits) >= SEARCH_PAGE_MAX_SEGMENTS:
+            # Row budget exhausted, continue from the last row on the next page
+            next_cursor = last_cursor
+            break
+
+        hits.append(row)
+        last_cursor = cursor
+    return hits, next_cursor
+
+
+def _read_page(
+    query: Select[tuple[Segments, datetime, int]], page_size: int,
+) -> tuple[list[Segments], SearchCursor | None]:
+    """Stream hits from the database until the page is full, see _fill_page."""
+    result = db.session.execute(query)
+    try:
+        return _fill_page(((segment, SearchCursor(
+            uploaded=uploaded,
+            video_id=video_id,
+            transcription_id=segment.transcription_id,
+            start=segment.start,
+            segment_id=segment.id,
+        )) for segment, uploaded, video_id in result), page_size)
+    finally:
+        result.close()
+
+
+def _read_index_page(
+    index_hits: Iterator[IndexedHit], page_size: int,
+) -> tuple[list[IndexedHit], SearchCursor | None]:
+    """Take index hits until the page is full, see _fill_page, the index starts them after the cursor."""
+    return _fill_page(((hit, SearchCursor(
+        uploaded=hit.uploaded,
+        video_id=hit.video_id,
+        transcription_id=hit.transcription_id,
+        start=hit.start,
+        segment_id=hit.segment_id,
+    )) for hit in index_hits), page_size)
+
+
+def search_v2_page(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    cursor: SearchCursor | None = None,
+    page_size: int = SEARCH_PAGE_SIZE,
+    context: int = 0,
+    stemmed: bool = False,
+) -> SearchPage:
+    """
+    Paginated variant of search_v2, returns up to page_size videos starting after the cursor.
+
+    Hits are read newest video first in keyset order and streamed from the database,
+    reading stops as soon as the page is full, so cost follows the page size and not the
+    number of matches.
+    """
+    timer = time.perf_counter()
+    video_result: list[VideoResult] = []
+    video_lookup: dict[int, VideoResult] = {}
+
+    if not search_term.strip('" '):
+        raise ValueError("Search was too short")
+
+    if not channels:
+        return SearchPage(video_results=[], next_cursor=None)
+
+    cache_key = search_cache_key(
+        "page", search_term, [c.id for c in channels], start_date, end_date,
+        cursor.encode() if cursor is not None else None, page_size, stemmed)
+    cached_page = get_cached_search(cache_key)
+
+    plan: SearchPlanChoice | None = None
+    index_hits: Iterator[IndexedHit] | None = None
+    with count_queries() as query_count:
+        if cached_page is not None:
+            hits = _load_hits(cached_page["segment_ids"], search_term, context, stemmed)
+            next_cursor = SearchCursor.decode(cached_page["next_cursor"]) if cached_page["next_cursor"] else None
+            expected_queries = SEARCH_EXPECTED_QUERIES
+        else:
+            index_hits = _index_hits(search_term, channels, start_date, end_date, stemmed, cursor)
+            if index_hits is not None:
+                page_hits, next_cursor = _read_index_page(index_hits, page_size)
+                hits = _load_hits([hit.segment_id for hit in page_hits], search_term, context, stemmed)
+                expected_queries = SEARCH_EXPECTED_QUERIES + 1
+            else:
+                plan = _plan_search(search_term, channels, start_date, end_date, stemmed)
+                query = _page_hits_query(search_term, channels, start_date, end_date, cursor, stemmed, plan.plan)
+                hits, next_cursor = _read_page(query.options(*_context_options(context)), page_size)
+                expected_queries = SEARCH_EXPECTED_QUERIES * (len(hits) // SEARCH_YIELD_PER + 1) + SEARCH_PLAN_QUERIES
+            if cursor is None and next_cursor is None:
+                # Few enough hits to fit one page, top up with fuzzy hits if there are very few
+                fuzzy_hits = _fuzzy_fallback(search_term, channels, start_date, end_date, context, hits, stemmed)
+                if fuzzy_hits:
+                    expected_queries += SEARCH_EXPECTED_QUERIES + 1
+                    hits += fuzzy_hits
+            set_cached_search(cache_key, {
+                "segment_ids": [segment.id for segment in hits],
+                "next_cursor": next_cursor.encode() if next_cursor is not None else None,
+            })
+    _log_query_count(query_count.count, expected_queries)
+
+    search_words = sanitize_sentence(search_term.strip('"'))
+    for segment in hits:
+        _add_segment_result(segment, search_words, video_result, video_lookup)
+
+    video_result = [v for v in video_result if v.video.active]
+    for v in video_result:
+        v.segment_results.sort(key=lambda r: r.start_time())
+
+    execution_time = time.perf_counter() - timer
+    logger.info(f"search page executed in {execution_time*1000:.2f}ms", extra={
+        "channels": [c.name for c in channels],
+        "duration": execution_time*1000,
+        "result_count": len(video_result),
+        "segment_count": len(hits),
+        "has_next_page": next_cursor is not None,
+        "cached": cached_page is not None,
+        "query_count": query_count.count,
+        "index": index_hits is not None,
+        **_plan_log_fields(plan),
+    })
+    return SearchPage(video_results=video_result, next_cursor=next_cursor)
+
+
+def search_facets(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    stemmed: bool = False,
+) -> list[SearchFacet]:
+    """
+    Hit counts per channel and month for a search, oldest month first.
+
+    Counted in the database over the same match as the search itself, no hits are
+    loaded, so it is cheap enough to run before asking for the detailed results.
+    """
+    if not search_term.strip('" '):
+        raise ValueError("Search was too short")
+
+    if not channels:
+        return []
+
+    cache_key = search_cache_key("facets", search_term, [c.id for c in channels], start_date, end_date, stemmed)
+    cached_facets = get_cached_search(cache_key)
+    if cached_facets is not None:
+        return [
+            SearchFacet(channel_id=channel_id, month=datetime.fromisoformat(month), hits=hits, videos=videos)
+            for channel_id, month, hits, videos in cached_facets
+        ]
+
+    plan = _plan_search(search_term, channels, start_date, end_date, stemmed).plan
+    month = func.date_trunc("month", Segments.video_uploaded)
+    rows = db.session.execute(
+        select(
+            Segments.channel_id,
+            month.label("month"),
+            func.count(Segments.id),
+            func.count(Segments.video_id.distinct()),
+        )
+        .join(Video, Video.id == Segments.video_id)
+        .where(*_search_filters(search_term, channels, start_date, end_date, stemmed, plan))
+        .group_by(Segments.channel_id, month)
+        .order_by(month, Segments.channel_id)
+    ).all()
+    facets = [
+        SearchFacet(channel_id=channel_id, month=month, hits=hits, videos=videos)
+        for channel_id, month, hits, videos in rows
+    ]
+    set_cached_search(cache_key, [
+        [facet.channel_id, facet.month.isoformat(), facet.hits, facet.videos] for facet in facets
+    ])
+    return facets
+
+
+def search_year_ranges(
+    channels: Sequence[Channels],
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+) -> list[tuple[int, datetime, datetime]]:
+    """
+    The years a background search goes through, newest first, as (year, start, end).
+
+    Covers the channels' segments within the date range, the first and last year are
+    clipped to the range.
+    """
+    if not channels:
+        return []
+    first, last = db.session.execute(
+        select(func.min(Segments.video_uploaded), func.max(Segments.video_uploaded))
+        .where(*_range_filters(channels, start_date, end_date))
+    ).one()
+    if first is None or last is None:
+        return []
+    ranges = []
+    for year in range(last.year, first.year - 1, -1):
+        year_start = datetime(year, 1, 1)
+        year_end = datetime(year, 12, 31, 23, 59, 59, 999999)
+        if start_date is not None:
+            year_start = max(year_start, start_date)
+        if end_date is not None:
+            year_end = min(year_end, end_date)
+        ranges.append((year, year_start, year_end))
+    return ranges
+
+
+def search_segment_ids(
+    search_term: str,
+    channels: Sequence[Channels],
+    start_date: datetime,
+    end_date: datetime,
+    stemmed: bool = False,
+) -> list[int]:
+    """
+    Ids of the full text hits within one date range, newest video first.
+
+    Used by background searches, which search one year at a time and only store ids,
+    the hits are loaded with load_search_results() when they're shown.
+    """
+    if not search_term.strip('" '):
+        raise ValueError("Search was too short")
+
+    plan = _plan_search(search_term, channels, start_date, end_date, stemmed)
+    return list(db.session.execute(
+        select(Segments.id)
+        .join(Video, Video.id == Segments.video_id)
+        .where(*_search_filters(search_term, channels, start_date, end_date, stemmed, plan.plan))
+        .order_by(Segments.video_uploaded.desc(), Segments.transcription_id.desc(), Segments.start)
+        .limit(SEARCH_YEAR_MAX_SEGMENTS)
+    ).scalars().all())
+
+
+def load_search_results(
+    segment_ids: list[int],
+    search_term: str,
+    context: int = 0,
+    stemmed: bool = False,
+) -> list[VideoResult]:
+    """Group hits found earlier into video results, in the order of segment_ids."""
+    video_result: list[VideoResult] = []
+    video_lookup: dict[int, VideoResult] = {}
+    search_words = sanitize_sentence(search_term.strip('"'))
+    for segment in _load_hits(segment_ids, search_term, context, stemmed):
+        _add_segment_result(segment, search_words, video_result, video_lookup)
+
+    video_result = [v for v in video_result if v.video.active]
+    for v in video_result:
+        v.segment_results.sort(key=lambda r: r.start_time())
+    return video_result
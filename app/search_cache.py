@@ -0,0 +1,70 @@
+"""
+Redis cache for search results.
+
+Entries hold the matching segment ids in result order, not ORM objects, a cache hit
+skips the text search and only loads those rows by primary key.
+"""
+import hashlib
+import json
+import time
+from collections.abc import Iterable
+from typing import Any
+from app.cache import cache
+from app.logger import logger
+
+# Seconds a search result stays cached, entries are also dropped as soon as one of their channels changes
+SEARCH_CACHE_TIMEOUT = 60 * 60
+
+
+def _channel_version_key(channel_id: int) -> str:
+    return f"search_channel_version:{channel_id}"
+
+
+def search_cache_key(kind: str, search_term: str, channel_ids: Iterable[int], *params: Any) -> str | None:
+    """
+    Cache key for a search, None if the cache is unavailable.
+
+    Every channel has a version that is bumped when its searchable content changes,
+    the versions are part of the key so invalidating a channel orphans all its entries.
+    """
+    channel_ids = sorted(channel_ids)
+    try:
+        versions = cache.get_many(*[_channel_version_key(c) for c in channel_ids])
+    except Exception as e:
+        logger.warning("Search cache unavailable: %s", e)
+        return None
+    normalized_term = " ".join(search_term.lower().split())
+    payload = json.dumps(
+        [kind, normalized_term, channel_ids, [v or 0 for v in versions], *params], default=str)
+    return f"search:{hashlib.sha1(payload.encode()).hexdigest()}"
+
+
+def get_cached_search(key: str | None) -> Any:
+    if key is None:
+        return None
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.warning("Search cache unavailable: %s", e)
+        return None
+
+
+def set_cached_search(key: str | None, value: Any) -> None:
+    if key is None:
+        return
+    try:
+        cache.set(key, value, timeout=SEARCH_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning("Search cache unavailable: %s", e)
+
+
+def invalidate_search_cache(channel_ids: Iterable[int]) -> None:
+    """Drop cached search results for the given channels."""
+    channel_ids = set(channel_ids)
+    if not channel_ids:
+        return
+    version = time.time_ns()
+    try:
+        cache.set_many({_channel_version_key(c): version for c in channel_ids}, timeout=0)
+    except Exception as e:
+        logger.warning("Failed to invalidate search cache for channels %s: %s", channel_ids, e)
@@ -0,0 +1,515 @@
+"""
+Compact in-memory inverted index for the broadcasters that get the most searches.
+
+Broadcasters listed in SEARCH_INDEX_BROADCASTERS get an index file with every segment of
+their channels, which each web process memory maps. Plain word searches are answered from
+it without a database round-trip, the database is only asked to load the hits.
+
+The files are written by the worker under CACHE_LOCATION and read by the web processes, so
+both have to see the same CACHE_LOCATION, e.g. a shared volume. Where the web process finds
+no file it searches the database as for any other broadcaster.
+
+Each broadcaster has a base file, rebuilt nightly, and a delta file with the current rows of
+every transcription processed, changed or deleted since. An update rewrites only the delta,
+searches skip the base rows of the transcriptions the delta replaces and merge both. Once
+the delta holds SEARCH_INDEX_DELTA_MAX_ROWS rows it is merged into the base file.
+
+File layout, numbers in the machine's byte order:
+
+    header      magic, version, metadata length
+    metadata    JSON, term -> [offset, count] into the postings, and for a delta the
+                transcriptions whose base rows it replaces
+    uploaded, source_uploaded
+                int64 per row, upload time in microseconds since the epoch of the video
+                the hit is shown on and of the segment's own video
+    segment_id, video_id, transcription_id, start, channel_id
+                uint32 per row, video_id is the video the hit is shown on
+    postings    uint32 row numbers, each term's rows ascending
+
+Rows are sorted the way paginated search orders hits (newest result video first), so the
+intersection of ascending posting lists is already in result order. Date ranges filter on
+the segment's own video, as the database searches do, and are checked row by row.
+
+The terms of a row are the lexemes of the segment's text_tsv as Postgres made them, so the
+index finds the rows the 'simple' configuration would. Only searches of ASCII letters, digits
+and spaces are answered from the index, Postgres' parser splits those on the spaces alone, so
+the lowercased words are the lexemes plainto_tsquery would look for. Quoted phrases, stemmed
+searches and anything with other characters are left to Postgres.
+"""
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from collections.abc import Collection, Container, Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import fasteners  # type: ignore[import-untyped]
+from sqlalchemy import ARRAY, ColumnElement, Select, Text, and_, func, or_, select
+from sqlalchemy.orm import aliased
+from app.logger import logger
+from app.models import db
+from app.models.channel import Channels
+from app.models.config import config
+from app.models.search import SearchCursor
+from app.models.timestamp_mapping import SegmentPlacement, TimestampMapping
+from app.models.transcription import Segments, Transcription
+from app.models.video import Video
+
+SEARCH_INDEX_VERSION = 3
+# Rows read per round-trip while building an index
+SEARCH_INDEX_BUILD_BATCH = 10000
+# Rows a delta file may hold before it is merged into the base file
+SEARCH_INDEX_DELTA_MAX_ROWS = 100000
+
+_MAGIC = b"YSIX"
+_HEADER = struct.Struct("<4sII")
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_plain_search_pattern = re.compile(r"[A-Za-z0-9\s]+")
+
+# Row as stored: segment id, result video uploaded microseconds, result video id, transcription id,
+# start, channel id, the segment's own video uploaded microseconds
+_Row = tuple[int, int, int, int, int, int, int]
+_TRANSCRIPTION_ID = 3
+
+
+def search_terms(search_term: str) -> list[str]:
+    """Lexemes of a plain search, see is_indexable_search()."""
+    return search_term.lower().split()
+
+
+def is_indexable_search(search_term: str) -> bool:
+    """Whether a search is plain words the index can answer the same way Postgres would."""
+    return _plain_search_pattern.fullmatch(search_term) is not None and bool(search_terms(search_term))
+
+
+def _to_micros(value: datetime) -> int:
+    return (value.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + value * _MICROSECOND
+
+
+def _sort_key(row: _Row) -> tuple[int, int, int, int, int]:
+    segment_id, uploaded, video_id, transcription_id, start, _, _ = row
+    return (-uploaded, -video_id, -transcription_id, -start, -segment_id)
+
+
+def with_result_video(query: Select) -> tuple[Select, ColumnElement[datetime], ColumnElement[int]]:
+    """
+    Join the video a segment is shown on to a query over segments, returns the query with its
+    upload time and id.
+
+    That is the target video the segment was placed in by the lowest active mapping of its
+    video, the segment's own video when there is none, the same choice the result grouping makes.
+    """
+    primary_mapping = (
+        select(TimestampMapping.id)
+        .where(TimestampMapping.source_video_id == Segments.video_id, TimestampMapping.active == True)
+        .order_by(TimestampMapping.id)
+        .limit(1)
+        .correlate(Segments)
+        .scalar_subquery()
+    )
+    placement = aliased(SegmentPlacement)
+    target_video = aliased(Video)
+    query = (
+        query
+        .outerjoin_from(
+            Segments, placement, and_(placement.segment_id == Segments.id, placement.mapping_id == primary_mapping))
+        .outerjoin_from(placement, target_video, target_video.id == placement.target_video_id)
+    )
+    return (
+        query,
+        func.coalesce(target_video.uploaded, Segments.video_uploaded),
+        func.coalesce(placement.target_video_id, Segments.video_id),
+    )
+
+
+@dataclass(frozen=True)
+class IndexedHit:
+    """A search hit as the index knows it, enough to load the segment and continue paging after it."""
+    segment_id: int
+    uploaded: datetime
+    video_id: int
+    transcription_id: int
+    start: int
+
+
+def _hit_key(hit: IndexedHit) -> tuple[int, int, int, int, int]:
+    return (-_to_micros(hit.uploaded), -hit.video_id, -hit.transcription_id, -hit.start, -hit.segment_id)
+
+
+class SearchIndex:
+    """Read-only view of an index file, a broadcaster's base file or its delta."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, metadata_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != SEARCH_INDEX_VERSION:
+            raise ValueError(f"Unsupported search index file {path}")
+        metadata = json.loads(self._mmap[_HEADER.size:_HEADER.size + metadata_length])
+        self.broadcaster_id: int = metadata["broadcaster_id"]
+        self.replaced: frozenset[int] = frozenset(metadata.get("replaced", ()))
+        self._terms: dict[str, list[int]] = metadata["terms"]
+
+        rows = metadata["rows"]
+        view = memoryview(self._mmap)
+        offset = _aligned(_HEADER.size + metadata_length)
+        self._uploaded = view[offset:offset + rows * 8].cast("q")
+        offset += rows * 8
+        self._source_uploaded = view[offset:offset + rows * 8].cast("q")
+        offset += rows * 8
+        columns = []
+        for _ in range(5):
+            columns.append(view[offset:offset + rows * 4].cast("I"))
+            offset += rows * 4
+        self._segment_ids, self._video_ids, self._transcription_ids, self._starts, self._channel_ids = columns
+        self._postings = view[offset:offset + metadata["postings"] * 4].cast("I")
+
+    def __len__(self) -> int:
+        return len(self._segment_ids)
+
+    def _posting(self, term: str) -> Sequence[int]:
+        offset, count = self._terms[term]
+        return self._postings[offset:offset + count]
+
+    def _row_key(self, row: int) -> tuple[int, int, int, int, int]:
+        return (-self._uploaded[row], -self._video_ids[row], -self._transcription_ids[row],
+                -self._starts[row], -self._segment_ids[row])
+
+    def _first_row(self, after: SearchCursor | None) -> int:
+        """Row number of the first row after the cursor."""
+        if after is None:
+            return 0
+        cursor_key = (-_to_micros(after.uploaded), -after.video_id, -after.transcription_id, -after.start, -after.segment_id)
+        return bisect_right(range(len(self)), cursor_key, key=self._row_key)
+
+    def search(
+        self,
+        search_term: str,
+        channel_ids: Iterable[int],
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        after: SearchCursor | None = None,
+        excluded_transcription_ids: Container[int] = (),
+    ) -> Iterator[IndexedHit]:
+        """
+        Segments containing every word of the search, newest video first, starting after the cursor.
+
+        Hits are produced as they are read and nothing before the cursor is looked at, so taking
+        a page costs about the page, not every match.
+        """
+        terms = set(search_terms(search_term))
+        if not terms or any(term not in self._terms for term in terms):
+            return
+        first = self._first_row(after)
+        earliest = _to_micros(start_date) if start_date is not None else None
+        latest = _to_micros(end_date) if end_date is not None else None
+        smallest, *others = sorted((self._posting(term) for term in terms), key=len)
+
+        # Each other list is only searched from where the previous match was found
+        positions = [bisect_left(posting, first) for posting in others]
+        channels = set(channel_ids)
+        for row in smallest[bisect_left(smallest, first):]:
+            for i, posting in enumerate(others):
+                positions[i] = bisect_left(posting, row, positions[i])
+                if positions[i] == len(posting) or posting[positions[i]] != row:
+                    break
+            else:
+                transcription_id = self._transcription_ids[row]
+                if self._channel_ids[row] not in channels or transcription_id in excluded_transcription_ids:
+                    continue
+                source_uploaded = self._source_uploaded[row]
+                if (earliest is not None and source_uploaded < earliest) or (latest is not None and source_uploaded > latest):
+                    continue
+                yield IndexedHit(
+                    segment_id=self._segment_ids[row],
+                    uploaded=_from_micros(self._uploaded[row]),
+                    video_id=self._video_ids[row],
+                    transcription_id=transcription_id,
+                    start=self._starts[row],
+                )
+
+    def rows(self) -> list[_Row]:
+        return list(zip(
+            self._segment_ids, self._uploaded, self._video_ids, self._transcription_ids,
+            self._starts, self._channel_ids, self._source_uploaded,
+        ))
+
+    def postings(self) -> Iterable[tuple[str, Sequence[int]]]:
+        for term in self._terms:
+            yield term, self._posting(term)
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+def _write_index(
+    path: str, broadcaster_id: int, rows: list[_Row], postings: dict[str, list[int]],
+    replaced: Iterable[int] = (),
+):
+    """Write an index file next to path and swap it in, readers keep their old mapping until they reload."""
+    terms: dict[str, list[int]] = {}
+    flat = array("I")
+    for term, term_rows in postings.items():
+        terms[term] = [len(flat), len(term_rows)]
+        flat.extend(term_rows)
+    metadata = json.dumps({
+        "broadcaster_id": broadcaster_id,
+        "rows": len(rows),
+        "postings": len(flat),
+        "terms": terms,
+        "replaced": sorted(replaced),
+    }).encode()
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        f.write(_HEADER.pack(_MAGIC, SEARCH_INDEX_VERSION, len(metadata)))
+        f.write(metadata)
+        f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+        for column in (1, 6):
+            array("q", (row[column] for row in rows)).tofile(f)
+        for column in (0, 2, 3, 4, 5):
+            array("I", (row[column] for row in rows)).tofile(f)
+        flat.tofile(f)
+    os.replace(f.name, path)
+
+
+def _index_path(broadcaster_id: int) -> str:
+    return os.path.join(config.cache_location, "search_index", f"{broadcaster_id}.idx")
+
+
+def _delta_path(broadcaster_id: int) -> str:
+    return os.path.join(config.cache_location, "search_index", f"{broadcaster_id}.delta.idx")
+
+
+def _index_lock(broadcaster_id: int) -> fasteners.InterProcessLock:
+    return fasteners.InterProcessLock(f"{_index_path(broadcaster_id)}.lock")
+
+
+def _segment_rows(*where) -> Iterable[tuple[_Row, list[str]]]:
+    """Segments in index order with their distinct lexemes, streamed from a server side cursor."""
+    query, uploaded, video_id = with_result_video(select(
+        Segments.id, Segments.transcription_id, Segments.start, Segments.channel_id,
+        Segments.video_uploaded, func.tsvector_to_array(Segments.text_tsv, type_=ARRAY(Text)),
+    ))
+    result = db.session.execute(
+        query.add_columns(uploaded, video_id)
+        .where(*where)
+        .order_by(
+            uploaded.desc(), video_id.desc(),
+            Segments.transcription_id.desc(), Segments.start.desc(), Segments.id.desc(),
+        )
+        .execution_options(yield_per=SEARCH_INDEX_BUILD_BATCH)
+    )
+    for segment_id, transcription_id, start, channel_id, source_uploaded, lexemes, uploaded, video_id in result:
+        row = (segment_id, _to_micros(uploaded), video_id, transcription_id, start, channel_id, _to_micros(source_uploaded))
+        yield row, lexemes or []
+
+
+def _merge(
+    index: SearchIndex | None, replaced: Container[int], added: list[tuple[_Row, list[str]]],
+) -> tuple[list[_Row], dict[str, list[int]]]:
+    """Rows and postings of an index with the rows of the replaced transcriptions swapped for added rows."""
+    old_rows = index.rows() if index is not None else []
+    kept = [i for i, row in enumerate(old_rows) if row[_TRANSCRIPTION_ID] not in replaced]
+
+    # Sort kept and added rows together, kept rows are referred to by their old row number
+    entries: list[tuple[_Row, int | list[str]]] = [(old_rows[i], i) for i in kept]
+    entries += added
+    entries.sort(key=lambda entry: _sort_key(entry[0]))
+
+    new_row_numbers = [-1] * len(old_rows)
+    postings: dict[str, list[int]] = defaultdict(list)
+    added_postings: dict[str, list[int]] = defaultdict(list)
+    for row_number, (_, source) in enumerate(entries):
+        if isinstance(source, int):
+            new_row_numbers[source] = row_number
+        else:
+            for term in set(source):
+                added_postings[term].append(row_number)
+    if index is not None:
+        for term, term_rows in index.postings():
+            moved = [new_row_numbers[row] for row in term_rows if new_row_numbers[row] >= 0]
+            if moved:
+                postings[term] = moved
+    for term, term_rows in added_postings.items():
+        # Kept rows keep their relative order, only merging with added rows needs a sort
+        postings[term] = sorted(postings[term] + term_rows)
+    return [row for row, _ in entries], postings
+
+
+def _row_tokens(rows: list[_Row], postings: dict[str, list[int]]) -> list[tuple[_Row, list[str]]]:
+    """Every row with its terms, for moving a delta's rows into the base file."""
+    tokens: list[list[str]] = [[] for _ in rows]
+    for term, term_rows in postings.items():
+        for row in term_rows:
+            tokens[row].append(term)
+    return list(zip(rows, tokens))
+
+
+def build_search_index(broadcaster_id: int) -> int:
+    """Build a broadcaster's index from all segments of its channels, returns the number of segments."""
+    channel_ids = select(Channels.id).where(Channels.broadcaster_id == broadcaster_id)
+    with _index_lock(broadcaster_id):
+        # Rows arrive in index order
+        rows: list[_Row] = []
+        postings: dict[str, list[int]] = defaultdict(list)
+        for row, lexemes in _segment_rows(Segments.channel_id.in_(channel_ids)):
+            for term in lexemes:
+                postings[term].append(len(rows))
+            rows.append(row)
+        _write_index(_index_path(broadcaster_id), broadcaster_id, rows, postings)
+        # Everything the delta held is in the new base file
+        if os.path.exists(_delta_path(broadcaster_id)):
+            os.remove(_delta_path(broadcaster_id))
+    logger.info("Built search index", extra={"broadcaster_id": broadcaster_id, "segments": len(rows)})
+    return len(rows)
+
+
+def refresh_search_index(broadcaster_id: int, transcription_ids: Collection[int]) -> bool:
+    """
+    Put the current segments of transcriptions in a broadcaster's index, if the broadcaster has one.
+
+    Only those transcriptions are read from the database and only the delta file is rewritten,
+    a transcription without segments, e.g. a deleted one, is taken out of the index. Returns
+    whether an index was updated.
+    """
+    if broadcaster_id not in config.search_index_broadcasters:
+        return False
+    if not os.path.exists(_index_path(broadcaster_id)):
+        build_search_index(broadcaster_id)
+        return True
+
+    with _index_lock(broadcaster_id):
+        delta_path = _delta_path(broadcaster_id)
+        delta = SearchIndex(delta_path) if os.path.exists(delta_path) else None
+        replaced = set(transcription_ids)
+        added = list(_segment_rows(Segments.transcription_id.in_(replaced)))
+        rows, postings = _merge(delta, replaced, added)
+        if delta is not None:
+            replaced |= delta.replaced
+        if len(rows) <= SEARCH_INDEX_DELTA_MAX_ROWS:
+            _write_index(delta_path, broadcaster_id, rows, postings, replaced)
+        else:
+            # Move the delta into the base file
+            base = SearchIndex(_index_path(broadcaster_id))
+            base_rows, base_postings = _merge(base, replaced, _row_tokens(rows, postings))
+            _write_index(_index_path(broadcaster_id), broadcaster_id, base_rows, base_postings)
+            if delta is not None:
+                os.remove(delta_path)
+    logger.info("Updated search index", extra={
+        "broadcaster_id": broadcaster_id,
+        "transcription_ids": sorted(transcription_ids),
+        "added_segments": len(added),
+        "delta_segments": len(rows),
+    })
+    return True
+
+
+def update_search_index(transcription: Transcription) -> bool:
+    """Put a transcription's segments in its broadcaster's index, see refresh_search_index()."""
+    return refresh_search_index(transcription.video.channel.broadcaster_id, [transcription.id])
+
+
+def refresh_video_search_index(video_ids: Collection[int]) -> None:
+    """
+    Refresh the index rows of the segments shown on videos, after their upload date, channel or links changed.
+
+    That is the transcriptions of the videos and of the videos linked to them as source.
+    """
+    if not config.search_index_broadcasters or not video_ids:
+        return
+    source_video_ids = select(TimestampMapping.source_video_id).where(TimestampMapping.target_video_id.in_(video_ids))
+    transcriptions = db.session.execute(
+        select(Channels.broadcaster_id, Transcription.id)
+        .join(Transcription.video)
+        .join(Video.channel)
+        .where(or_(Transcription.video_id.in_(video_ids), Transcription.video_id.in_(source_video_ids)))
+    ).all()
+    by_broadcaster: dict[int, list[int]] = defaultdict(list)
+    for broadcaster_id, transcription_id in transcriptions:
+        by_broadcaster[broadcaster_id].append(transcription_id)
+    for broadcaster_id, transcription_ids in by_broadcaster.items():
+        refresh_search_index(broadcaster_id, transcription_ids)
+
+
+class LayeredSearchIndex:
+    """A broadcaster's base index with the delta of the transcriptions changed since it was built."""
+
+    def __init__(self, base: SearchIndex, delta: SearchIndex | None):
+        self.base = base
+        self.delta = delta
+
+    def is_current(self, mtime: int, delta_mtime: int | None) -> bool:
+        return self.base.mtime == mtime and (self.delta.mtime if self.delta is not None else None) == delta_mtime
+
+    def search(
+        self,
+        search_term: str,
+        channel_ids: Iterable[int],
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        after: SearchCursor | None = None,
+        excluded_transcription_ids: Collection[int] = (),
+    ) -> Iterator[IndexedHit]:
+        """SearchIndex.search() over both files, the base rows of replaced transcriptions are skipped."""
+        if self.delta is None:
+            return self.base.search(search_term, channel_ids, start_date, end_date, after, excluded_transcription_ids)
+        channel_ids = list(channel_ids)
+        base_excluded = self.delta.replaced.union(excluded_transcription_ids)
+        return heapq.merge(
+            self.base.search(search_term, channel_ids, start_date, end_date, after, base_excluded),
+            self.delta.search(search_term, channel_ids, start_date, end_date, after, excluded_transcription_ids),
+            key=_hit_key,
+        )
+
+
+# Indexes mapped by this process, reloaded when a file on disk was replaced
+_loaded: dict[int, LayeredSearchIndex] = {}
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_search_index(channels: Sequence[Channels]) -> LayeredSearchIndex | None:
+    """The index covering the channels, None unless they belong to one indexed broadcaster."""
+    broadcaster_ids = {channel.broadcaster_id for channel in channels}
+    if len(broadcaster_ids) != 1:
+        return None
+    broadcaster_id = broadcaster_ids.pop()
+    if broadcaster_id not in config.search_index_broadcasters:
+        return None
+    path = _index_path(broadcaster_id)
+    delta_path = _delta_path(broadcaster_id)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        delta_mtime = _mtime(delta_path)
+        index = _loaded.get(broadcaster_id)
+        if index is None or index.base.path != path or not index.is_current(mtime, delta_mtime):
+            delta = SearchIndex(delta_path) if delta_mtime is not None else None
+            index = LayeredSearchIndex(SearchIndex(path), delta)
+            _loaded[broadcaster_id] = index
+        return index
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Search index unavailable: %s", e, extra={"broadcaster_id": broadcaster_id})
+        return None
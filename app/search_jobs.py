@@ -0,0 +1,118 @@
+"""
+Progress and partial results of searches run in the background by a Celery worker.
+
+A background search goes through the channels' videos one year at a time, newest first,
+and appends the segment ids of every finished year to a Redis list. The result page polls
+for chunks it hasn't shown yet, so the first results appear long before the search is done.
+"""
+import json
+import time
+import redis
+from app.logger import logger
+from app.models.config import config
+
+# How long a search job's progress and results are kept after its last update
+SEARCH_JOB_TIMEOUT = 3600
+
+
+class SearchJobTracker:
+    """Stores search job progress and result chunks in Redis."""
+
+    PROGRESS_KEY_PREFIX = "search_job:"
+    CHUNKS_KEY_SUFFIX = ":chunks"
+
+    def __init__(self, redis_client: redis.Redis | None = None):
+        self.redis_client = redis_client or redis.Redis.from_url(config.redis_uri)
+
+    def _progress_key(self, job_id: str) -> str:
+        return f"{self.PROGRESS_KEY_PREFIX}{job_id}"
+
+    def _chunks_key(self, job_id: str) -> str:
+        return f"{self.PROGRESS_KEY_PREFIX}{job_id}{self.CHUNKS_KEY_SUFFIX}"
+
+    def _set_progress(self, job_id: str, progress: dict):
+        self.redis_client.setex(self._progress_key(job_id), SEARCH_JOB_TIMEOUT, json.dumps(progress))
+
+    def create(self, job_id: str, search_term: str, context: int = 0, stemmed: bool = False) -> dict:
+        """
+        Register a job as queued, before the task is sent to the worker.
+
+        The search term and display options are kept with the job, they are needed again to
+        highlight and load context for the hits when the results are shown.
+        """
+        progress = {
+            'status': 'queued',
+            'search_term': search_term,
+            'context': context,
+            'stemmed': stemmed,
+            'queued_time': time.time(),
+            'years_done': 0,
+            'years_total': 0,
+            'percent': 0,
+        }
+        try:
+            self._set_progress(job_id, progress)
+        except Exception as e:
+            logger.error("Failed to create search job %s: %s", job_id, e)
+        return progress
+
+    def start(self, job_id: str, years_total: int):
+        """Mark a job as running through years_total years."""
+        try:
+            progress = self.get_progress(job_id) or {}
+            progress.update(status='running', start_time=time.time(), years_done=0, years_total=years_total)
+            self._set_progress(job_id, progress)
+        except Exception as e:
+            logger.error("Failed to start search job %s: %s", job_id, e)
+
+    def add_chunk(self, job_id: str, year: int, segment_ids: list[int]):
+        """Append the hits of one year and count the year as done."""
+        try:
+            progress = self.get_progress(job_id) or {'status': 'running', 'years_done': 0, 'years_total': 0}
+            progress['years_done'] += 1
+            pipeline = self.redis_client.pipeline()
+            pipeline.rpush(self._chunks_key(job_id), json.dumps({'year': year, 'segment_ids': segment_ids}))
+            pipeline.expire(self._chunks_key(job_id), SEARCH_JOB_TIMEOUT)
+            pipeline.setex(self._progress_key(job_id), SEARCH_JOB_TIMEOUT, json.dumps(progress))
+            pipeline.execute()
+        except Exception as e:
+            logger.error("Failed to store search job %s results for %s: %s", job_id, year, e)
+
+    def finish(self, job_id: str, status: str = 'done'):
+        """Mark a job as done, or as failed with status 'failed'."""
+        try:
+            progress = self.get_progress(job_id) or {'years_done': 0, 'years_total': 0}
+            progress.update(status=status, end_time=time.time())
+            self._set_progress(job_id, progress)
+        except Exception as e:
+            logger.error("Failed to finish search job %s: %s", job_id, e)
+
+    def get_progress(self, job_id: str) -> dict | None:
+        """Status, years done and total and percent done of a job, None if unknown or expired."""
+        try:
+            progress_data = self.redis_client.get(self._progress_key(job_id))
+            if not progress_data:
+                return None
+            progress = json.loads(progress_data)
+            if progress['status'] == 'done':
+                progress['percent'] = 100
+            elif progress['years_total'] > 0:
+                progress['percent'] = int(progress['years_done'] / progress['years_total'] * 100)
+            else:
+                progress['percent'] = 0
+            return progress
+        except Exception as e:
+            logger.debug("Failed to get search job progress %s: %s", job_id, e)
+            return None
+
+    def get_chunks(self, job_id: str, offset: int = 0) -> list[dict]:
+        """Result chunks from offset on, each with the year and its segment ids."""
+        try:
+            return [json.loads(chunk) for chunk in self.redis_client.lrange(self._chunks_key(job_id), offset, -1)]
+        except Exception as e:
+            logger.debug("Failed to get search job results %s: %s", job_id, e)
+            return []
+
+
+# Global instance
+search_job_tracker = SearchJobTracker()
@@ -18,6 +18,8 @@ from app.models.channel import ChannelEvent
 from app.models.enums import AccountSource
 from app.models.user import ModerationAction, UserChannelRole
 from app.logger import logger
+from app.search_cache import invalidate_search_cache
+from app.search_index import refresh_video_search_index
 from app.utils import save_generic_thumbnail
 
 
@@ -271,6 +273,7 @@ class ChannelService:
             ChannelService._process_title_dates(channel)
         
         matches_found = 0
+        linked_sources: list[Video] = []
         
         for source_video in channel.source_channel.videos:
             for target_video in channel.videos:
@@ -311,9 +314,13 @@ class ChannelService:
                     from .video import VideoService
                     VideoService.add_timestamp_mapping(target_video, source_video)
                     db.session.flush()
+                    linked_sources.append(source_video)
                     matches_found += 1
         
         db.session.commit()
+        if linked_sources:
+            from .video import VideoService
+            VideoService.search_links_changed(linked_sources)
         logger.info(f"Linked {matches_found} videos for channel {channel.name}")
     
     @staticmethod
@@ -359,6 +366,7 @@ class ChannelService:
         ChannelService._process_title_dates(channel)
         
         linked_count = 0
+        linked_sources: list[Video] = []
         
         for source_video in channel.source_channel.videos:
             for target_video in channel.videos:
@@ -390,9 +398,13 @@ class ChannelService:
                     from .video import VideoService
                     VideoService.add_timestamp_mapping(target_video, source_video)
                     db.session.flush()
+                    linked_sources.append(source_video)
                     linked_count += 1
         
         db.session.commit()
+        if linked_sources:
+            from .video import VideoService
+            VideoService.search_links_changed(linked_sources)
         logger.info(f"Auto-linked {linked_count} videos for channel {channel.name}")
         return linked_count
 
@@ -401,6 +413,7 @@ class ChannelService:
         """Fetch all videos from platform."""
         from .platform import PlatformServiceRegistry
         from .video import VideoService
+        from .transcription import SegmentService
         
         platform_service = PlatformServiceRegistry.get_service_for_channel(channel)
         if platform_service is None:
@@ -417,6 +430,7 @@ class ChannelService:
         
         successful_count = 0
         failed_count = 0
+        synced_video_ids: list[int] = []
         for v in channel.videos:
             v.active = False
         db.session.flush()
@@ -432,7 +446,10 @@ class ChannelService:
                     existing_video.title = video.title
                     existing_video.video_type = video.video_type
                     existing_video.duration = video.duration
-                    existing_video.uploaded = video.uploaded
+                    if existing_video.uploaded != video.uploaded:
+                        existing_video.uploaded = video.uploaded
+                        SegmentService.sync_video_columns(existing_video)
+                        synced_video_ids.append(existing_video.id)
                     existing_video.active = video.active
                     logger.debug(f"Updated video: {video.title}")
                 successful_count += 1
@@ -443,6 +460,8 @@ class ChannelService:
                 continue
 
         db.session.commit()
+        refresh_video_search_index(synced_video_ids)
+        invalidate_search_cache([channel.id])
         logger.info(f"Successfully processed {successful_count} videos for channel {channel.name}. Failed: {failed_count}")
         
 
@@ -451,6 +470,7 @@ class ChannelService:
         """Fetch latest videos from platform."""
         from .platform import PlatformServiceRegistry
         from .video import VideoService
+        from .transcription import SegmentService
         platform_service = PlatformServiceRegistry.get_service_for_channel(
             channel)
         if platform_service is None:
@@ -465,6 +485,7 @@ class ChannelService:
 
         successful_count = 0
         failed_count = 0
+        synced_video_ids: list[int] = []
         
         for video in videos:
             try:
@@ -481,7 +502,10 @@ class ChannelService:
                     existing_video.title = video.title
                     existing_video.video_type = video.video_type
                     existing_video.duration = video.duration
-                    existing_video.uploaded = video.uploaded
+                    if existing_video.uploaded != video.uploaded:
+                        existing_video.uploaded = video.uploaded
+                        SegmentService.sync_video_columns(existing_video)
+                        synced_video_ids.append(existing_video.id)
                     existing_video.active = video.active
                     logger.debug(f"Updated video: {video.title}")
                 successful_count += 1
@@ -492,6 +516,8 @@ class ChannelService:
                 continue
 
         db.session.commit()
+        refresh_video_search_index(synced_video_ids)
+        invalidate_search_cache([channel.id])
         logger.info(f"Successfully processed {successful_count} videos for channel {channel.name}. Failed: {failed_count}")
 
     @staticmethod
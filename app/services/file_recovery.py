@@ -250,6 +250,8 @@ class FileRecoveryService:
                     content_type=content_type
                 )
                 video.audio = file_obj
+                # Recovered files weren't normalized at ingest
+                video.audio_checksum = None
                 
             db.session.commit()
             logger.info(f"Successfully attached audio file to video {video.id} with filename: {filename}")
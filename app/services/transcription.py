@@ -8,12 +8,22 @@ from collections.abc import Sequence
 from io import BytesIO
 from datetime import datetime
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update, delete, insert
+from sqlalchemy.dialects.postgresql import to_tsvector
 from app.models import db
-from app.models import Transcription, Segments, TranscriptionResult, TranscriptionSource
+from app.models import Transcription, Segments, TranscriptionSource, SegmentPlacement
+from app.models.transcription import SingleSegment
 from app.models.channel import Channels
+from app.models.video import Video
 from app.logger import logger
-from app.utils import get_sec, format_duration_to_srt_timestamp
+from app.search_cache import invalidate_search_cache
+from app.search_index import refresh_search_index, update_search_index
+from app.json_stream import iter_json_array
+from app.embeddings import get_embedder, is_zero, EMBEDDING_BATCH_SIZE
+from app.utils import get_sec, format_duration_to_srt_timestamp, open_stored_file
+
+# Segments inserted per round-trip while parsing a JSON transcription
+SEGMENT_INSERT_BATCH = 2000
 
 
 class TranscriptionService:
@@ -48,9 +58,13 @@ class TranscriptionService:
         try:
             transcription = TranscriptionService.get_by_id(transcription_id)
             TranscriptionService.reset_transcription(transcription)
+            channel_id = transcription.video.channel_id
+            broadcaster_id = transcription.video.channel.broadcaster_id
             db.session.query(Transcription).filter_by(
                 id=transcription_id).delete()
             db.session.commit()
+            refresh_search_index(broadcaster_id, [transcription_id])
+            invalidate_search_cache([channel_id])
             logger.info(f"Deleted transcription {transcription_id}")
             return True
         except Exception as e:
@@ -92,8 +106,13 @@ class TranscriptionService:
         elif transcription.file_extention == "json":
             TranscriptionService.parse_json(transcription)
 
+        SegmentService.update_text_windows(transcription)
+        SegmentService.update_embeddings(transcription)
+        SegmentService.update_placements(transcription)
         transcription.processed = True
         db.session.commit()
+        update_search_index(transcription)
+        invalidate_search_cache([transcription.video.channel_id])
 
     @staticmethod
     def to_srt(transcription: Transcription) -> str:
@@ -183,46 +202,72 @@ class TranscriptionService:
         logger.info(f"Saved JSON file to {output_path}")
         return output_path
 
+    @staticmethod
+    def insert_segments(
+        transcription: Transcription,
+        captions: Sequence[tuple[str, int, int]],
+        previous_segment_id: int | None = None,
+    ) -> list[int]:
+        """
+        Insert a transcription's segments in one batch, captions are (text, start, end) in order.
+
+        Ids are taken from the sequence up front so every segment's previous and next links
+        are known before anything is written. A transcription inserted in several batches passes
+        the last id of the previous batch as previous_segment_id. Returns the ids inserted.
+        """
+        if not captions:
+            return []
+        video = transcription.video
+        segment_ids = sorted(db.session.execute(
+            select(func.nextval(func.pg_get_serial_sequence("segments", "id")))
+            .select_from(func.generate_series(1, len(captions)))
+        ).scalars().all())
+
+        rows = []
+        for i, (text, start, end) in enumerate(captions):
+            rows.append({
+                "id": segment_ids[i],
+                "text": text,
+                "start": start,
+                "end": end,
+                "transcription_id": transcription.id,
+                "video_id": video.id,
+                "channel_id": video.channel_id,
+                "video_uploaded": video.uploaded,
+                "previous_segment_id": segment_ids[i - 1] if i > 0 else previous_segment_id,
+                "next_segment_id": segment_ids[i + 1] if i + 1 < len(segment_ids) else None,
+            })
+        db.session.execute(insert(Segments), rows)
+        if previous_segment_id is not None:
+            db.session.execute(
+                update(Segments).where(Segments.id == previous_segment_id).values(next_segment_id=segment_ids[0]))
+        return segment_ids
+
     @staticmethod
     def parse_json(transcription: Transcription):
         """Parse a JSON transcription file into segments."""
         logger.info(f"Processing json transcription: {transcription.id}")
-        segments: list[Segments] = []
-        content = TranscriptionResult.model_validate_json(
-            transcription.file.file.read().decode()
-        )
         TranscriptionService.reset_transcription(transcription)
 
-        previous_segment: Segments | None = None
-        logger.info(f"Processing json transcription: {transcription.id}")
-
-        for caption in content.segments:
-            start = int(caption.start)
+        # Segments are read from the file one at a time and inserted in batches,
+        # memory use doesn't grow with the length of the VOD
+        captions: list[tuple[str, int, int]] = []
+        previous_text: str | None = None
+        previous_segment_id: int | None = None
+        for item in iter_json_array(open_stored_file(transcription.file.file), "segments"):
+            caption = SingleSegment.model_validate(item)
             if caption.text == "":
                 continue
-            if previous_segment is not None and caption.text == previous_segment.text:
+            if caption.text == previous_text:
                 continue
-
-            segment = Segments(
-                text=caption.text,
-                start=start,
-                transcription_id=transcription.id,
-                end=int(caption.end),
-                previous_segment_id=(
-                    previous_segment.id if previous_segment is not None else None
-                ),
-            )
-            db.session.add(segment)
-            db.session.flush()
-
-            if previous_segment is not None:
-                previous_segment.next_segment_id = segment.id
-                db.session.add(previous_segment)
-                db.session.flush()
-
-            previous_segment = segment
-            segments.append(segment)
-
+            previous_text = caption.text
+            captions.append((caption.text, int(caption.start), int(caption.end)))
+            if len(captions) >= SEGMENT_INSERT_BATCH:
+                previous_segment_id = TranscriptionService.insert_segments(
+                    transcription, captions, previous_segment_id)[-1]
+                captions = []
+
+        TranscriptionService.insert_segments(transcription, captions, previous_segment_id)
         db.session.commit()
         logger.info(f"Done processing transcription: {transcription.id}")
 
@@ -230,10 +275,9 @@ class TranscriptionService:
     def parse_vtt(transcription: Transcription):
         """Parse a VTT transcription file into segments."""
         logger.info(f"Processing vtt transcription: {transcription.id}")
-        segments: list[Segments] = []
         content = BytesIO(transcription.file.file.read())
-        previous_segment: Segments | None = None
 
+        captions: list[tuple[str, int, int]] = []
         for caption in webvtt.from_buffer(content):
             start = get_sec(caption.start)
             # remove annotations, such as [music]
@@ -243,29 +287,11 @@ class TranscriptionService:
                 continue
             if text == "":
                 continue
-            if previous_segment is not None and text == previous_segment.text:
+            if captions and text == captions[-1][0]:
                 continue
+            captions.append((text, start, get_sec(caption.end)))
 
-            segment = Segments(
-                text=text,
-                start=start,
-                transcription_id=transcription.id,
-                end=get_sec(caption.end),
-                previous_segment_id=(
-                    previous_segment.id if previous_segment is not None else None
-                ),
-            )
-            db.session.add(segment)
-            db.session.flush()
-
-            if previous_segment is not None:
-                previous_segment.next_segment_id = segment.id
-                db.session.add(previous_segment)
-                db.session.flush()
-
-            previous_segment = segment
-            segments.append(segment)
-
+        TranscriptionService.insert_segments(transcription, captions)
         db.session.commit()
         logger.info(f"Done processing transcription: {transcription.id}")
 
@@ -297,9 +323,12 @@ class TranscriptionService:
 
     @staticmethod
     def delete(transcription: Transcription):
+        transcription_id = transcription.id
+        broadcaster_id = transcription.video.channel.broadcaster_id
         TranscriptionService.delete_attached_segments(transcription)
         db.session.delete(transcription)
         db.session.commit()
+        refresh_search_index(broadcaster_id, [transcription_id])
 
     @staticmethod
     def get_transcriptions_on_channels(
@@ -417,6 +446,85 @@ class SegmentService:
 
         return VideoService.get_url_with_timestamp(segment.transcription.video, shifted_time)
 
+    @staticmethod
+    def sync_video_columns(video: Video):
+        """
+        Update the video columns copied onto segments after the video's upload date or channel changed.
+
+        Call refresh_video_search_index() with the video after committing.
+        """
+        db.session.execute(
+            update(Segments)
+            .where(Segments.video_id == video.id)
+            .values(channel_id=video.channel_id, video_uploaded=video.uploaded)
+        )
+
+    @staticmethod
+    def update_text_windows(transcription: Transcription):
+        """Rebuild text_window_tsv of a transcription's segments from each segment and the one after it."""
+        windows = (
+            select(
+                Segments.id,
+                func.lead(Segments.text).over(
+                    partition_by=Segments.transcription_id, order_by=Segments.start
+                ).label("next_text"),
+            )
+            .where(Segments.transcription_id == transcription.id)
+            .subquery()
+        )
+        db.session.execute(
+            update(Segments)
+            .where(Segments.id == windows.c.id)
+            .values(text_window_tsv=to_tsvector(
+                "simple", Segments.text + " " + func.coalesce(windows.c.next_text, "")))
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def update_placements(transcription: Transcription):
+        """Place the transcription's segments in every video its video is linked to."""
+        mappings = transcription.video.source_mappings
+        if not mappings:
+            return
+        segments = db.session.execute(
+            select(Segments.id, Segments.start, Segments.end)
+            .where(Segments.transcription_id == transcription.id)
+        ).all()
+        db.session.execute(
+            delete(SegmentPlacement)
+            .where(SegmentPlacement.segment_id.in_([segment.id for segment in segments]))
+        )
+        rows = [row for mapping in mappings for row in mapping.place_segments(segments)]
+        if rows:
+            db.session.execute(insert(SegmentPlacement), rows)
+
+    @staticmethod
+    def update_embeddings(transcription: Transcription, force: bool = False) -> int:
+        """
+        Embed the transcription's segments for semantic search, in batches.
+
+        Only segments without an embedding are embedded unless force is set.
+        Returns the number of segments embedded.
+        """
+        embedder = get_embedder()
+        query = select(Segments.id, Segments.text).where(Segments.transcription_id == transcription.id)
+        if not force:
+            query = query.where(Segments.embedding.is_(None))
+        rows = db.session.execute(query.order_by(Segments.id)).all()
+
+        for i in range(0, len(rows), EMBEDDING_BATCH_SIZE):
+            batch = rows[i:i + EMBEDDING_BATCH_SIZE]
+            vectors = embedder.embed([text for _, text in batch])
+            db.session.execute(
+                update(Segments),
+                [
+                    {"id": segment_id, "embedding": None if is_zero(vector) else vector}
+                    for (segment_id, _), vector in zip(batch, vectors)
+                ],
+            )
+        logger.info(f"Embedded {len(rows)} segments of transcription {transcription.id} with {embedder.name}")
+        return len(rows)
+
 
 # For template accessibility, create simple function interfaces
 def get_transcription_service() -> TranscriptionService:
@@ -2,15 +2,22 @@
 Video service for handling video-related business logic.
 """
 import asyncio
+import os
+import shutil
+import tempfile
 from collections.abc import Sequence
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, delete, insert
+from sqlalchemy.orm.attributes import flag_modified
 from app.models import db
 from app.models import Video, VideoCreate, Transcription, TranscriptionSource, VideoType, PlatformType, TimestampMapping
+from app.models import Segments, SegmentPlacement
 from app.logger import logger
+from app.search_cache import invalidate_search_cache
+from app.search_index import refresh_video_search_index
 from app.models.config import config
-from app.tasks import get_yt_audio, get_twitch_audio
-from app.utils import save_generic_thumbnail
+from app.tasks import get_yt_audio, get_twitch_audio, normalize_audio, file_checksum
+from app.utils import open_stored_file, save_generic_thumbnail
 from app.youtube_api import fetch_transcription
 from youtube_transcript_api.formatters import WebVTTFormatter
 
@@ -162,6 +169,7 @@ class VideoService:
                 logger.error(
                     f"Failed to delete audio for video {video.platform_ref}, exception: {e}")
             video.audio = None
+            video.audio_checksum = None
             video.duration = video_details.duration
 
             video.title = video_details.title
@@ -236,15 +244,45 @@ class VideoService:
 
     @staticmethod
     def save_audio(video: Video, force: bool = False, progress_callback=None):
-        """Save audio for a video."""
+        """Save audio for a video, normalized to 16 kHz mono Opus."""
         if str(video.channel.platform_name).lower() == "twitch":
             audio = get_twitch_audio(VideoService.get_url(video), progress_callback=progress_callback)
-            video.audio = open(audio, "rb")  # type: ignore[assignment]
-            db.session.commit()
         elif str(video.channel.platform_name).lower() == "youtube":
             audio = get_yt_audio(VideoService.get_url(video), progress_callback=progress_callback)
-            video.audio = open(audio, "rb")  # type: ignore[assignment]
-            db.session.commit()
+        else:
+            return
+        VideoService.store_audio(video, normalize_audio(audio))
+
+    @staticmethod
+    def store_audio(video: Video, path: str):
+        """Store a normalized audio file on a video and remove the local file, unchanged audio isn't stored again."""
+        checksum = file_checksum(path)
+        try:
+            if video.audio is not None and video.audio_checksum == checksum:
+                logger.info("Audio unchanged, keeping stored file", extra={"video_id": video.id})
+                return
+            duplicates = db.session.execute(
+                select(Video.id).where(Video.audio_checksum == checksum, Video.id != video.id)
+            ).scalars().all()
+            if duplicates:
+                logger.warning("Audio is identical to other videos", extra={
+                    "video_id": video.id, "duplicate_video_ids": list(duplicates)})
+            with open(path, "rb") as f:
+                video.audio = f  # type: ignore[assignment]
+                video.audio_checksum = checksum
+                db.session.commit()
+        finally:
+            os.remove(path)
+
+    @staticmethod
+    def copy_audio_to_cache(video: Video) -> str:
+        """Copy a video's stored audio to a local file ffmpeg can seek in, the caller removes it."""
+        if video.audio is None:
+            raise ValueError(f"Video {video.id} has no audio")
+        _, ext = os.path.splitext(video.audio.file.filename or "")
+        with tempfile.NamedTemporaryFile(delete=False, suffix=ext, dir=config.cache_location) as temp_file:
+            shutil.copyfileobj(open_stored_file(video.audio.file), temp_file)
+            return temp_file.name
 
     @staticmethod
     def create(video: VideoCreate) -> Video:
@@ -268,22 +306,34 @@ class VideoService:
     @staticmethod
     def update(video_id: int, **kwargs) -> Video:
         """Update video fields."""
+        from .transcription import SegmentService
         video = VideoService.get_by_id(video_id)
+        old_channel_id = video.channel_id
         for key, value in kwargs.items():
             if hasattr(video, key):
                 setattr(video, key, value)
+        synced = "uploaded" in kwargs or "channel_id" in kwargs
+        if synced:
+            SegmentService.sync_video_columns(video)
         db.session.commit()
+        if synced:
+            refresh_video_search_index([video.id])
+            invalidate_search_cache({old_channel_id, video.channel_id})
         return video
 
     @staticmethod
     def activate(video_id: int) -> Video:
         """Activate a video."""
-        return VideoService.update(video_id, active=True)
+        video = VideoService.update(video_id, active=True)
+        invalidate_search_cache([video.channel_id])
+        return video
 
     @staticmethod
     def deactivate(video_id: int) -> Video:
         """Deactivate a video."""
-        return VideoService.update(video_id, active=False)
+        video = VideoService.update(video_id, active=False)
+        invalidate_search_cache([video.channel_id])
+        return video
 
     @staticmethod
     def get_source_video(target_video: Video) -> Video | None:
@@ -317,7 +367,11 @@ class VideoService:
                             source_start: float = 0.0, source_end: float | None = None,
                             target_start: float = 0.0, target_end: float | None = None,
                             time_offset: float = 0.0) -> TimestampMapping:
-        """Add a timestamp mapping between a target video and a source video."""
+        """
+        Add a timestamp mapping between a target video and a source video.
+
+        Only flushed, the caller commits and then calls search_links_changed() with the source video.
+        """
         mapping = TimestampMapping(
             source_video_id=source_video.id,
             target_video_id=target_video.id,
@@ -330,8 +384,41 @@ class VideoService:
         
         db.session.add(mapping)
         target_video.target_mappings.append(mapping)
+        db.session.flush()
+        VideoService.update_segment_placements(mapping)
         return mapping
 
+    @staticmethod
+    def search_links_changed(source_videos: Sequence[Video]):
+        """Refresh the search index and cached searches of source videos after their new links were committed."""
+        refresh_video_search_index([video.id for video in source_videos])
+        invalidate_search_cache({video.channel_id for video in source_videos})
+
+    @staticmethod
+    def update_segment_placements(mapping: TimestampMapping):
+        """Rebuild where the source video's segments play in the target video after the mapping changed."""
+        db.session.execute(delete(SegmentPlacement).where(SegmentPlacement.mapping_id == mapping.id))
+        segments = db.session.execute(
+            select(Segments.id, Segments.start, Segments.end)
+            .where(Segments.video_id == mapping.source_video_id)
+        ).all()
+        rows = mapping.place_segments(segments)
+        if rows:
+            db.session.execute(insert(SegmentPlacement), rows)
+        logger.info("Updated segment placements", extra={
+            "mapping_id": mapping.id, "placed_segments": len(rows), "segments": len(segments)})
+
+    @staticmethod
+    def get_placed_segments(mapping: TimestampMapping) -> list[tuple[Segments, SegmentPlacement]]:
+        """Segments of the source video's processed transcriptions with where they play in the target video."""
+        return list(db.session.execute(
+            select(Segments, SegmentPlacement)
+            .join(SegmentPlacement, SegmentPlacement.segment_id == Segments.id)
+            .join(Segments.transcription)
+            .where(SegmentPlacement.mapping_id == mapping.id, Transcription.processed == True)
+            .order_by(SegmentPlacement.target_start)
+        ).tuples())
+
     @staticmethod
     def get_timestamp_mappings(video: Video, as_source: bool = False) -> list[TimestampMapping]:
         """Get all timestamp mappings for a video.
@@ -380,8 +467,12 @@ class VideoService:
         """Remove a timestamp mapping by ID."""
         mapping = db.session.get(TimestampMapping, mapping_id)
         if mapping:
+            channel_id = mapping.source_video.channel_id
+            source_video_id = mapping.source_video_id
             db.session.delete(mapping)
             db.session.commit()
+            refresh_video_search_index([source_video_id])
+            invalidate_search_cache([channel_id])
             return True
         return False
 
@@ -391,7 +482,9 @@ class VideoService:
         mapping = db.session.get(TimestampMapping, mapping_id)
         if mapping:
             mapping.adjust_time_offset(new_offset)
+            VideoService.update_segment_placements(mapping)
             db.session.commit()
+            invalidate_search_cache([mapping.source_video.channel_id])
             return True
         return False
 
@@ -401,7 +494,11 @@ class VideoService:
         mapping = db.session.get(TimestampMapping, mapping_id)
         if mapping:
             mapping.add_cut(start_time, duration)
+            # add_cut appends to the JSON in place, which SQLAlchemy doesn't see
+            flag_modified(mapping, "cuts_data")
+            VideoService.update_segment_placements(mapping)
             db.session.commit()
+            invalidate_search_cache([mapping.source_video.channel_id])
             return True
         return False
 
@@ -1,6 +1,8 @@
 import yt_dlp  # type: ignore
 from yt_dlp.utils import download_range_func  # type: ignore
 import glob
+import hashlib
+import subprocess
 from .models.yt import VideoData, Thumbnail
 import os
 from .models.config import config
@@ -10,6 +12,10 @@ from .models.utils import ProgressCallbackType
 
 storage_directory = os.path.abspath(config.cache_location)
 
+# Stored audio is what the transcription model works on, 16 kHz mono, as speech tuned Opus
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_OPUS_BITRATE = "24k"
+
 
 def get_largest_thumbnail(video: VideoData) -> Thumbnail:
     if video.thumbnails:
@@ -116,6 +122,41 @@ def get_twitch_audio(video_url: str, progress_callback: ProgressCallbackType | N
         return find_downloaded_file(storage_directory, video_url)
 
 
+def normalize_audio(path: str) -> str:
+    """Transcode downloaded audio to 16 kHz mono Opus, removes the original and returns the new file."""
+    output = f"{os.path.splitext(path)[0]}_{AUDIO_SAMPLE_RATE // 1000}k.opus"
+    logger.info("Normalizing audio %s", path)
+    try:
+        _ = subprocess.run(
+            [
+                "ffmpeg", "-hide_banner", "-nostats", "-y", "-i", path, "-vn",
+                "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE),
+                "-c:a", "libopus", "-b:a", AUDIO_OPUS_BITRATE, "-application", "voip",
+                output,
+            ],
+            capture_output=True, check=True,
+        )
+    except subprocess.CalledProcessError as e:
+        # Failed downloads would otherwise pile up in the audio directory
+        logger.error("Failed to normalize audio %s, removing it: %s", path, e.stderr.decode(errors="replace")[-2000:])
+        for leftover in (path, output):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    logger.info("Normalized audio from %d to %d bytes", os.path.getsize(path), os.path.getsize(output))
+    os.remove(path)
+    return output
+
+
+def file_checksum(path: str) -> str:
+    """SHA-256 of a file as hex."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 def get_twitch_segment(video_url: str, start_time: int, duration: int) -> str:
     clips_directory = os.path.join(storage_directory, "clips")
     os.makedirs(clips_directory, exist_ok=True)
@@ -1,34 +1,167 @@
+import gc
 import json
+import threading
 import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
 from pydantic import BaseModel
 from .models.config import config
 from app.logger import logger
+from app.voice_activity import SAMPLE_RATE, SpeechTimeline, detect_speech, keep_speech
+
+
+class WhisperModelCache:
+    """
+    Keeps the configured WhisperX model loaded between tasks of a worker process.
+
+    Loading large-v2 takes tens of seconds and several GB, so the model is loaded once, on
+    worker start with TRANSCRIPTION_WARM_START or else by the first transcription, and
+    reused until it has been idle for TRANSCRIPTION_MODEL_IDLE_TIMEOUT seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._model: Any = None
+        self._model_key: tuple[str, str, str] | None = None
+        self._last_used = 0.0
+        self._in_use = 0
+        self._evict_timer: threading.Timer | None = None
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.last_load_time = 0.0
+
+    @staticmethod
+    def _configured_key() -> tuple[str, str, str]:
+        return (config.transcription_model, config.transcription_device, config.transcription_compute_type)
+
+    def _load(self, key: tuple[str, str, str]) -> Any:
+        import whisperx  # type: ignore
+        model_name, device, compute_type = key
+        started = time.perf_counter()
+        model = whisperx.load_model(
+            model_name,
+            device,
+            compute_type=compute_type,
+            download_root=f"{config.cache_location}/models/",
+            language="en",
+        )
+        self.last_load_time = time.perf_counter() - started
+        self.loads += 1
+        logger.info("Loaded transcription model %s in %.1fs", model_name, self.last_load_time, extra=self.metrics())
+        return model
+
+    def load(self) -> Any:
+        """The configured model, loaded if it isn't already."""
+        key = self._configured_key()
+        with self._lock:
+            if self._model is None or self._model_key != key:
+                self._release()
+                self._model = self._load(key)
+                self._model_key = key
+            else:
+                self.hits += 1
+                logger.info("Reusing loaded transcription model %s", key[0], extra=self.metrics())
+            self._last_used = time.monotonic()
+            if self._in_use == 0:
+                self._schedule_eviction()
+            return self._model
+
+    @contextmanager
+    def use(self) -> Iterator[Any]:
+        """The model for one transcription, it isn't evicted while in use."""
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield self.load()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self._last_used = time.monotonic()
+                if self._in_use == 0:
+                    self._schedule_eviction()
+
+    def _schedule_eviction(self):
+        if self._evict_timer is not None:
+            self._evict_timer.cancel()
+            self._evict_timer = None
+        if self._in_use or config.transcription_model_idle_timeout <= 0:
+            return
+        self._evict_timer = threading.Timer(config.transcription_model_idle_timeout, self.evict_idle)
+        self._evict_timer.daemon = True
+        self._evict_timer.start()
+
+    def evict_idle(self) -> bool:
+        """Unload the model if it hasn't been used for the idle timeout, returns whether it was unloaded."""
+        with self._lock:
+            if self._model is None or self._in_use:
+                return False
+            if time.monotonic() - self._last_used < config.transcription_model_idle_timeout:
+                return False
+            self._release()
+            self.evictions += 1
+        logger.info("Unloaded idle transcription model", extra=self.metrics())
+        return True
+
+    def _release(self):
+        if self._model is None:
+            return
+        self._model = None
+        self._model_key = None
+        gc.collect()
+        try:
+            import torch  # type: ignore
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def metrics(self) -> dict:
+        """Load and reuse counts of this process, for logging."""
+        return {
+            "model": self._model_key[0] if self._model_key else None,
+            "model_loaded": self._model is not None,
+            "model_loads": self.loads,
+            "model_cache_hits": self.hits,
+            "model_evictions": self.evictions,
+            "model_load_time": self.last_load_time,
+        }
+
+
+# Per process instance, Celery workers fork one per concurrency slot
+whisper_model_cache = WhisperModelCache()
 
 
 def transcribe(path: str) -> str:
     import whisperx  # type: ignore
-    device = config.transcription_device  # cuda
     batch_size = config.transcription_batch_size  # reduce if low on GPU mem
-    compute_type = config.transcription_compute_type
-    load_model = config.transcription_model
 
     logger.info("Got path: %s, starting to transcribe with model %s, device %s, compute type %s, batch size %s",
-                path, load_model, device, compute_type, batch_size)
-    model_dir = f"{config.cache_location}/models/"
-    model = whisperx.load_model(
-        load_model,
-        device,
-        compute_type=compute_type,
-        download_root=model_dir,
-        language="en",
-    )
-
+                path, config.transcription_model, config.transcription_device,
+                config.transcription_compute_type, batch_size)
     audio = whisperx.load_audio(path)
-    result = model.transcribe(
-        audio, batch_size=batch_size, chunk_size=10, language="en")
+    timeline: SpeechTimeline | None = None
+    if config.transcription_vad:
+        # Only the parts with speech go to the model
+        timeline = SpeechTimeline(detect_speech(audio))
+        total_seconds = len(audio) / SAMPLE_RATE
+        audio = keep_speech(audio, timeline.intervals)
+        logger.info("Skipping %.0fs of silence and music out of %.0fs", total_seconds - timeline.speech_seconds, total_seconds,
+                    extra={"audio_seconds": total_seconds, "speech_seconds": timeline.speech_seconds,
+                           "skipped_seconds": total_seconds - timeline.speech_seconds,
+                           "speech_intervals": len(timeline.intervals)})
 
-    # delete model if low on GPU resources
-    # import gc; gc.collect(); torch.cuda.empty_cache(); del model
+    result: dict[str, Any]
+    if timeline is not None and not timeline.intervals:
+        result = {"segments": [], "language": "en"}
+    else:
+        with whisper_model_cache.use() as model:
+            result = model.transcribe(
+                audio, batch_size=batch_size, chunk_size=10, language="en")
+    if timeline is not None:
+        timeline.restore_timestamps(result)
+        result["skipped_seconds"] = total_seconds - timeline.speech_seconds
 
     # # 2. Align whisper output
     # model_a, metadata = whisperx.load_align_model(
@@ -0,0 +1,58 @@
+"""
+Videos waiting for the transcription worker.
+
+Videos are kept in a Redis sorted set, recent VODs found by full_processing_task ahead of
+backfill from bulk actions and oldest first within each. task_transcribe_batch takes them
+one at a time, so a recent VOD queued during a long backfill is transcribed next.
+"""
+import time
+from typing import cast
+import redis
+from app.logger import logger
+from app.models.config import config
+from app.models.enums import TranscriptionPriority
+
+# Added to the queue time, so every recent video sorts before any backfill
+_PRIORITY_OFFSET = {
+    TranscriptionPriority.Recent: 0,
+    TranscriptionPriority.Backfill: 10**10,
+}
+
+
+class TranscriptionQueue:
+    """Priority queue of video ids in Redis."""
+
+    QUEUE_KEY = "transcription_queue"
+    FORCE_KEY = "transcription_queue:force"
+
+    def __init__(self, redis_client: redis.Redis | None = None):
+        self.redis_client = redis_client or redis.Redis.from_url(config.redis_uri)
+
+    def enqueue(self, video_id: int, priority: TranscriptionPriority = TranscriptionPriority.Backfill,
+                force: bool = False):
+        """Queue a video, a video that is already queued only moves up to the new priority."""
+        score = _PRIORITY_OFFSET[priority] + time.time()
+        pipeline = self.redis_client.pipeline()
+        pipeline.zadd(self.QUEUE_KEY, {str(video_id): score}, lt=True)
+        if force:
+            pipeline.hset(self.FORCE_KEY, str(video_id), 1)
+        pipeline.execute()
+        logger.info("Queued video for transcription", extra={"video_id": video_id, "priority": priority.value})
+
+    def pop(self) -> tuple[int, bool] | None:
+        """Take the next video, with whether it is to be transcribed again. None when the queue is empty."""
+        popped = self.redis_client.zpopmin(self.QUEUE_KEY)
+        if not popped:
+            return None
+        # The client doesn't decode responses, entries are (member, score) with the member as bytes
+        member, _ = cast(tuple[bytes, float], popped[0])
+        video_id = int(member.decode())
+        force = self.redis_client.hdel(self.FORCE_KEY, str(video_id)) > 0
+        return video_id, force
+
+    def __len__(self) -> int:
+        return self.redis_client.zcard(self.QUEUE_KEY)
+
+
+# Global instance
+transcription_queue = TranscriptionQueue()
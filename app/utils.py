@@ -1,5 +1,6 @@
 # originally inspired by https://github.com/lawrencehook/SqueexVodSearch/blob/main/preprocessing/scripts/parse.py
 
+import io
 import re
 import os
 import requests
@@ -10,33 +11,54 @@ from app.logger import logger
 from urllib.parse import urlparse, parse_qs
 from pydantic import HttpUrl
 import nltk  # type: ignore
-from nltk.corpus import stopwords  # type: ignore
-from nltk.tag import pos_tag  # type: ignore
-from nltk.tokenize import word_tokenize  # type: ignore
-from nltk.stem import PorterStemmer  # type: ignore
-from typing import Tuple
+from app.normalize import normalize, loosely_normalize
+from typing import BinaryIO, Tuple
+from collections.abc import Iterable, Iterator
+from sqlalchemy_file.stored_file import StoredFile
 from app.logger import logger
 
 def download_nltk() -> None:
     """Download NLTK data if not already downloaded"""
     nltk.download("stopwords", quiet=True)
     nltk.download("punkt_tab", quiet=True)
-    nltk.download("averaged_perceptron_tagger_eng", quiet=True)
 
 
 
 
+class _ChunkStream(io.RawIOBase):
+    """Raw stream over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks: Iterator[bytes] = iter(chunks)
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = chunk
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def open_stored_file(stored_file: StoredFile) -> BinaryIO:
+    """
+    Read a stored file front to back without loading it whole.
+
+    StoredFile.read(n) always reads from the start of the file, so it can't be read in chunks.
+    """
+    return io.BufferedReader(_ChunkStream(stored_file.object.as_stream()))
+
+
 # This function is used by both parsing and searching to ensure we are getting good search results.
 def sanitize_sentence(sentence: str) -> list[str]:
-    sw = stopwords.words("english")
-    words = pos_tag(word_tokenize(sentence))
-    ps = PorterStemmer()
-    result: list[str] = []
-    for word in words:
-        if word[0] not in sw:
-            word = ps.stem(word[0])
-            result.append(word)
-    return result
+    return normalize(sentence)
 
 
 def seconds_to_string(seconds: int | float) -> str:
@@ -44,13 +66,7 @@ def seconds_to_string(seconds: int | float) -> str:
 
 
 def loosely_sanitize_sentence(sentence: str) -> list[str]:
-    sw = stopwords.words("english")
-    result: list[str] = []
-    words = word_tokenize(sentence)
-    for word in words:
-        if word not in sw:
-            result.append(word)
-    return result
+    return loosely_normalize(sentence)
 
 
 def get_sec(time_str: str) -> int:
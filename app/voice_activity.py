@@ -0,0 +1,122 @@
+"""
+Energy based voice activity detection, run before transcription to skip silence and music.
+
+Streams have long stretches of BRB screens, intermission music and AFK time the model would
+otherwise spend time on. Frames are classified by their loudness against the quiet floor of
+the recording, and a second of sound only counts as speech when its loudness keeps dropping
+away, as it does in the short pauses between syllables and words. Music holds its level, so
+it is skipped however loud it is. Only the stretches of speech are passed to the model, and
+timestamps of the result are moved back to where they are in the full recording.
+
+Works on the float32 16 kHz mono PCM whisperx.load_audio returns. NumPy comes with WhisperX
+on the transcription worker and is imported when used.
+"""
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from typing import Any
+
+SAMPLE_RATE = 16000
+VAD_FRAME_SECONDS = 0.03
+# A frame is sound when this many dB above the quietest tenth of the recording
+VAD_THRESHOLD_DB = 12.0
+# Frames are never counted as silence above this level, loud recordings have a loud floor
+VAD_SPEECH_DB = -35.0
+# Sound is judged speech or not per window of this length
+VAD_WINDOW_SECONDS = 1.0
+# A frame dips when this many dB below the loud frames of its window
+VAD_DIP_DB = 15.0
+# Share of dipping frames a window of speech has at least, music stays near its level
+VAD_MIN_DIP_SHARE = 0.1
+# Only gaps at least this long are skipped, shorter pauses stay in for the model's context
+VAD_MIN_SILENCE_SECONDS = 2.0
+# Kept around every stretch of sound, so words aren't clipped
+VAD_PADDING_SECONDS = 0.3
+
+Interval = tuple[float, float]
+
+
+def detect_speech(audio: Any, sample_rate: int = SAMPLE_RATE) -> list[Interval]:
+    """Start and end in seconds of the parts of the audio with speech in them."""
+    import numpy as np  # type: ignore
+
+    frame = int(sample_rate * VAD_FRAME_SECONDS)
+    frame_count = len(audio) // frame
+    if frame_count == 0:
+        return [(0.0, len(audio) / sample_rate)] if len(audio) else []
+    frames = np.asarray(audio[:frame_count * frame], dtype=np.float32).reshape(frame_count, frame)
+    energy = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    threshold = min(float(np.percentile(energy, 10)) + VAD_THRESHOLD_DB, VAD_SPEECH_DB)
+    active = (energy > threshold) & _varying_windows(energy)
+
+    # Edges of runs of active frames
+    padded = np.concatenate(([False], active, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    duration = len(audio) / sample_rate
+    intervals: list[Interval] = []
+    for start_frame, end_frame in zip(edges[::2], edges[1::2]):
+        start = max(start_frame * VAD_FRAME_SECONDS - VAD_PADDING_SECONDS, 0.0)
+        end = min(end_frame * VAD_FRAME_SECONDS + VAD_PADDING_SECONDS, duration)
+        if intervals and start - intervals[-1][1] < VAD_MIN_SILENCE_SECONDS:
+            intervals[-1] = (intervals[-1][0], end)
+        else:
+            intervals.append((start, end))
+    return intervals
+
+
+def _varying_windows(energy: Any) -> Any:
+    """Per frame, whether its window has the dips in loudness of speech."""
+    import numpy as np  # type: ignore
+
+    window = max(int(VAD_WINDOW_SECONDS / VAD_FRAME_SECONDS), 1)
+    window_count = -(-len(energy) // window)
+    # The last window is filled up with NaN, which is neither loud nor a dip
+    windows = np.full(window_count * window, np.nan)
+    windows[:len(energy)] = energy
+    windows = windows.reshape(window_count, window)
+    loud = np.nanpercentile(windows, 90, axis=1, keepdims=True)
+    dips = np.sum(windows < loud - VAD_DIP_DB, axis=1) / np.sum(~np.isnan(windows), axis=1)
+    return np.repeat(dips >= VAD_MIN_DIP_SHARE, window)[:len(energy)]
+
+
+def keep_speech(audio: Any, intervals: Sequence[Interval], sample_rate: int = SAMPLE_RATE) -> Any:
+    """The audio of the intervals, back to back."""
+    import numpy as np  # type: ignore
+
+    if not intervals:
+        return audio[:0]
+    return np.concatenate([audio[int(start * sample_rate):int(end * sample_rate)] for start, end in intervals])
+
+
+class SpeechTimeline:
+    """Maps times in the audio of keep_speech back to times in the full audio."""
+
+    def __init__(self, intervals: Sequence[Interval]):
+        self.intervals = list(intervals)
+        self._compact_starts: list[float] = []
+        position = 0.0
+        for start, end in self.intervals:
+            self._compact_starts.append(position)
+            position += end - start
+        self.speech_seconds = position
+
+    def to_original(self, time: float, is_end: bool = False) -> float:
+        """The time in the full audio, an end that falls on a join stays with the interval before it."""
+        if not self.intervals:
+            return time
+        position = bisect_left if is_end else bisect_right
+        i = max(position(self._compact_starts, time) - 1, 0)
+        start, end = self.intervals[i]
+        return min(start + time - self._compact_starts[i], end)
+
+    def restore_timestamps(self, result: dict) -> dict:
+        """Move every segment and word timestamp of a WhisperX result back to the full audio."""
+        items = []
+        for segment in result.get("segments", []):
+            items.append(segment)
+            items.extend(segment.get("words", []))
+        items.extend(result.get("word_segments", []))
+        for item in items:
+            for key in ("start", "end"):
+                if isinstance(item.get(key), (int, float)):
+                    item[key] = self.to_original(item[key], is_end=key == "end")
+        return result
@@ -0,0 +1,173 @@
+import pytest
+from unittest.mock import Mock, patch
+
+from app.audio_chunks import detect_silences, plan_chunks, stitch_chunk_results
+
+SILENCEDETECT_OUTPUT = """Input #0, mp3, from 'audio.mp3':
+[silencedetect @ 0x5581] silence_start: -0.01
+[silencedetect @ 0x5581] silence_end: 1.5 | silence_duration: 1.51
+[silencedetect @ 0x5581] silence_start: 598.2
+[silencedetect @ 0x5581] silence_end: 601.8 | silence_duration: 3.6
+size=N/A time=00:20:00.00 bitrate=N/A speed= 800x
+"""
+
+
+@pytest.mark.unit
+class TestAudioChunks:
+    """Test splitting long audio at silences and stitching the chunk transcriptions back together"""
+
+    @patch('app.audio_chunks.subprocess.run')
+    def test_detect_silences(self, mock_run):
+        mock_run.return_value = Mock(stderr=SILENCEDETECT_OUTPUT)
+
+        assert detect_silences("audio.mp3") == [(0.0, 1.5), (598.2, 601.8)]
+
+    def test_cuts_at_closest_silence(self):
+        silences = [(500.0, 502.0), (590.0, 596.0), (1230.0, 1232.0)]
+
+        chunks = plan_chunks(1800.0, silences, target=600, window=120)
+
+        assert chunks == [(0.0, 593.0), (593.0, 1231.0), (1231.0, None)]
+
+    def test_cuts_at_target_without_silence(self):
+        assert plan_chunks(1300.0, [], target=600, window=120) == [(0.0, 600.0), (600.0, None)]
+
+    def test_short_audio_is_one_chunk(self):
+        assert plan_chunks(1100.0, [(590.0, 596.0)], target=600) == [(0.0, None)]
+        assert plan_chunks(5000.0, [], target=0) == [(0.0, None)]
+
+    def test_stitch_moves_timestamps(self):
+        chunk_results = [
+            {"offset": 593.0, "result": {"language": "en", "segments": [
+                {"start": 1.0, "end": 2.5, "text": "second", "words": [{"word": "second", "start": 1.0, "end": 2.0}]},
+            ]}},
+            {"offset": 0.0, "result": {"language": "en", "segments": [
+                {"start": 3.0, "end": 4.0, "text": "first"},
+            ], "word_segments": [{"word": "first", "start": 3.0, "end": 4.0}]}},
+        ]
+
+        stitched = stitch_chunk_results(chunk_results)
+
+        assert [(s["text"], s["start"], s["end"]) for s in stitched["segments"]] == [
+            ("first", 3.0, 4.0), ("second", 594.0, 595.5),
+        ]
+        assert stitched["segments"][1]["words"][0] == {"word": "second", "start": 594.0, "end": 595.0}
+        assert stitched["word_segments"] == [{"word": "first", "start": 3.0, "end": 4.0}]
+        assert stitched["language"] == "en"
+
+    def test_stale_chunk_sources_removed(self, tmp_path):
+        import os
+        from app.audio_chunks import remove_stale_chunk_sources
+        (tmp_path / "1").write_bytes(b"old")
+        (tmp_path / "2").write_bytes(b"new")
+        (tmp_path / ".lock").write_bytes(b"")
+        os.utime(tmp_path / "1", (0, 0))
+        os.utime(tmp_path / ".lock", (0, 0))
+
+        assert remove_stale_chunk_sources(str(tmp_path)) == 1
+        assert sorted(p.name for p in tmp_path.iterdir()) == [".lock", "2"]
+
+
+@pytest.mark.unit
+class TestChunkTasks:
+    """Test that chunk tasks share one download per worker and a failed chunk doesn't lose the video"""
+
+    @patch('app.main.transcribe')
+    @patch('app.main._download_video_audio')
+    @patch('app.main.extract_chunk')
+    @patch('app.main.config')
+    def test_chunks_cut_from_one_download(self, mock_config, mock_extract, mock_download, mock_transcribe, tmp_path):
+        from app.main import task_transcribe_chunk
+        mock_config.cache_location = str(tmp_path)
+        chunks = []
+
+        def download(video_id):
+            downloaded = tmp_path / "download"
+            downloaded.write_bytes(b"audio")
+            return str(downloaded)
+        mock_download.side_effect = download
+
+        def extract(path, start, end):
+            chunks.append((path, start, end))
+            chunk = tmp_path / f"chunk_{start}.wav"
+            chunk.write_bytes(b"wav")
+            return str(chunk)
+        mock_extract.side_effect = extract
+
+        def transcribe(path):
+            result = tmp_path / "result.json"
+            result.write_text('{"segments": [], "language": "en"}')
+            return str(result)
+        mock_transcribe.side_effect = transcribe
+
+        first = task_transcribe_chunk.run(5, 0.0, 600.0)
+        second = task_transcribe_chunk.run(5, 600.0, None)
+
+        mock_download.assert_called_once_with(5)
+        source = str(tmp_path / "chunk_sources" / "5")
+        assert chunks == [(source, 0.0, 600.0), (source, 600.0, None)]
+        assert first == {"offset": 0.0, "result": {"segments": [], "language": "en"}}
+        assert second["offset"] == 600.0
+        # Chunk and result files are removed, the full audio stays for further chunks
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["chunk_sources"]
+
+    def test_chunk_task_retries(self):
+        from app.main import task_transcribe_chunk
+        assert task_transcribe_chunk.autoretry_for == (Exception,)
+        assert task_transcribe_chunk.max_retries > 0
+
+    @patch('app.main.task_transcribe_batch.delay')
+    @patch('app.main.transcription_queue')
+    def test_failed_chord_queues_video_whole(self, mock_queue, mock_batch):
+        from app.main import task_chunked_transcription_failed
+        from app.models.enums import TranscriptionPriority
+
+        task_chunked_transcription_failed.run(Mock(id="chord"), RuntimeError("chunk failed"), None, 5, "recent")
+
+        mock_queue.enqueue.assert_called_once_with(5, TranscriptionPriority.Recent)
+        mock_batch.assert_called_once()
+
+    @patch('app.main.chord')
+    @patch('app.main.detect_silences', return_value=[])
+    @patch('app.main.VideoService')
+    @patch('app.main._needs_transcription', return_value=True)
+    @patch('app.main.config')
+    def test_chord_has_error_callback(self, mock_config, mock_needs, mock_video_service, mock_silences, mock_chord, tmp_path):
+        from app.main import task_transcribe_chunked
+        mock_config.transcription_chunk_seconds = 600
+        mock_video_service.get_by_id.return_value = Mock(id=5, duration=3600.0)
+        audio = tmp_path / "audio.opus"
+        audio.write_bytes(b"audio")
+        mock_video_service.copy_audio_to_cache.return_value = str(audio)
+
+        task_transcribe_chunked.run(5, "recent")
+
+        callback = mock_chord.return_value.call_args[0][0]
+        errback = callback.options["link_error"][0]
+        assert errback["task"] == "app.main.task_chunked_transcription_failed"
+        assert tuple(errback["args"]) == (5, "recent")
+
+
+@pytest.mark.unit
+class TestCopyAudioToCache:
+    """Test copying a video's stored audio to a local file"""
+
+    @patch('app.services.video.config')
+    def test_copies_whole_file(self, mock_config, tmp_path):
+        from app.services.video import VideoService
+        mock_config.cache_location = str(tmp_path)
+        video = Mock(id=1)
+        video.audio.file.filename = "audio.opus"
+        video.audio.file.object.as_stream.return_value = iter([b"first", b"second"])
+
+        path = VideoService.copy_audio_to_cache(video)
+
+        assert path.endswith(".opus")
+        with open(path, "rb") as f:
+            assert f.read() == b"firstsecond"
+
+    def test_video_without_audio(self):
+        from app.services.video import VideoService
+
+        with pytest.raises(ValueError, match="has no audio"):
+            VideoService.copy_audio_to_cache(Mock(id=1, audio=None))
@@ -0,0 +1,77 @@
+import hashlib
+import subprocess
+import pytest
+from unittest.mock import Mock, patch
+
+from app.tasks import normalize_audio, file_checksum
+from app.services.video import VideoService
+
+
+@pytest.mark.unit
+class TestAudioIngest:
+    """Test that fetched audio is stored normalized and only once"""
+
+    @patch('app.tasks.subprocess.run')
+    def test_normalize_transcodes_to_opus(self, mock_run, tmp_path):
+        source = tmp_path / "123s.webm"
+        source.write_bytes(b"x" * 100)
+
+        def transcode(command, **kwargs):
+            (tmp_path / "123s_16k.opus").write_bytes(b"x" * 10)
+        mock_run.side_effect = transcode
+
+        output = normalize_audio(str(source))
+
+        assert output == str(tmp_path / "123s_16k.opus")
+        command = mock_run.call_args[0][0]
+        assert command[command.index("-ac") + 1] == "1"
+        assert command[command.index("-ar") + 1] == "16000"
+        assert command[command.index("-c:a") + 1] == "libopus"
+        assert not source.exists()
+
+    @patch('app.tasks.subprocess.run')
+    def test_failed_normalize_removes_download(self, mock_run, tmp_path):
+        source = tmp_path / "123s.webm"
+        source.write_bytes(b"x" * 100)
+
+        def transcode(command, **kwargs):
+            (tmp_path / "123s_16k.opus").write_bytes(b"x")
+            raise subprocess.CalledProcessError(1, command, stderr=b"Invalid data found when processing input")
+        mock_run.side_effect = transcode
+
+        with pytest.raises(subprocess.CalledProcessError):
+            normalize_audio(str(source))
+
+        assert list(tmp_path.iterdir()) == []
+
+    def test_checksum(self, tmp_path):
+        path = tmp_path / "audio.opus"
+        path.write_bytes(b"audio")
+
+        assert file_checksum(str(path)) == hashlib.sha256(b"audio").hexdigest()
+
+    @patch('app.services.video.db.session')
+    def test_unchanged_audio_not_stored_again(self, mock_db_session, tmp_path):
+        path = tmp_path / "audio.opus"
+        path.write_bytes(b"audio")
+        stored = Mock()
+        video = Mock(id=1, audio=stored, audio_checksum=hashlib.sha256(b"audio").hexdigest())
+
+        VideoService.store_audio(video, str(path))
+
+        assert video.audio is stored
+        mock_db_session.commit.assert_not_called()
+        assert not path.exists()
+
+    @patch('app.services.video.db.session')
+    def test_new_audio_stored_with_checksum(self, mock_db_session, tmp_path):
+        path = tmp_path / "audio.opus"
+        path.write_bytes(b"audio")
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+        video = Mock(id=1, audio=None, audio_checksum=None)
+
+        VideoService.store_audio(video, str(path))
+
+        assert video.audio_checksum == hashlib.sha256(b"audio").hexdigest()
+        mock_db_session.commit.assert_called_once()
+        assert not path.exists()
@@ -64,4 +64,25 @@ class TestChannelServiceUnit:
         # Test ascending
         result = ChannelService.get_videos_sorted_by_uploaded(channel, descending=False)
         assert result == [videos[0], videos[1], videos[2]]
-    
\ No newline at end of file
+    
+    @pytest.mark.unit
+    @patch('app.services.video.VideoService.search_links_changed')
+    @patch('app.services.video.VideoService.add_timestamp_mapping')
+    @patch('app.services.channel.ChannelService._process_title_dates')
+    @patch('app.services.channel.db.session')
+    def test_bulk_auto_link_commits_once(self, mock_db_session, mock_title_dates, mock_add_mapping, mock_links_changed, channel):
+        """Test that linking is one transaction and search is refreshed after it."""
+        sources = [Mock(duration=3600, uploaded=datetime(2023, 1, 1)), Mock(duration=1800, uploaded=datetime(2023, 1, 2))]
+        targets = [Mock(duration=3605, estimated_upload_time=datetime(2023, 1, 1, 12)),
+                   Mock(duration=1795, estimated_upload_time=datetime(2023, 1, 2, 12))]
+        for target in targets:
+            target.is_linked_to_source.return_value = False
+        channel.source_channel.videos = sources
+        channel.videos = targets
+        mock_links_changed.side_effect = lambda videos: mock_db_session.commit.assert_called_once()
+
+        assert ChannelService.bulk_auto_link_videos(channel) == 2
+
+        assert mock_add_mapping.call_count == 2
+        mock_db_session.commit.assert_called_once()
+        mock_links_changed.assert_called_once_with(sources)
@@ -0,0 +1,45 @@
+import json
+import pytest
+from io import BytesIO
+
+from app.json_stream import iter_json_array
+
+
+def stream_array(document, key="segments", chunk_size=7):
+    return list(iter_json_array(BytesIO(json.dumps(document).encode()), key, chunk_size))
+
+
+@pytest.mark.unit
+class TestIterJsonArray:
+    """Test reading one array out of a JSON document in small chunks"""
+
+    def test_elements_across_chunks(self):
+        segments = [{"text": f"segment {i} éè \\\" end", "start": i * 1.25, "end": 1e3 + i} for i in range(50)]
+
+        assert stream_array({"segments": segments, "language": "en"}) == segments
+
+    def test_skips_other_values(self):
+        document = {
+            "word_segments": [{"word": "a]b}c\"[", "nested": [[1, {"x": "\\\\"}]]}] * 20,
+            "language": "en",
+            "count": 12345,
+            "segments": [{"text": "found"}],
+        }
+
+        for chunk_size in (1, 3, 64):
+            assert stream_array(document, chunk_size=chunk_size) == [{"text": "found"}]
+
+    def test_numbers_split_by_chunks(self):
+        assert stream_array({"segments": [123456789, 1.5e-7, -42]}, chunk_size=2) == [123456789, 1.5e-7, -42]
+
+    def test_missing_empty_or_null(self):
+        assert stream_array({"language": "en"}) == []
+        assert stream_array({"segments": []}) == []
+        assert stream_array({"segments": None, "other": [1]}) == []
+        assert stream_array({}) == []
+
+    def test_invalid_document(self):
+        with pytest.raises(ValueError):
+            stream_array([1, 2])
+        with pytest.raises(ValueError):
+            list(iter_json_array(BytesIO(b'{"segments": [{"text": "cut'), "segments", 4))
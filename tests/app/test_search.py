@@ -1,13 +1,33 @@
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, MagicMock, patch
 from datetime import datetime
 
 # Mark these as unit tests to avoid database setup
 pytestmark = pytest.mark.unit
 
 # Import the search functions we want to test
-from app.search import search_v2
-from app.models.search import VideoResult
+from app.search import search_v2, search_v2_page, search_facets, _plan_search, _estimate_rows
+from app.search import search_year_ranges, search_segment_ids, load_search_results
+from app.models.search import VideoResult, SegmentsResult, SearchCursor, SearchPlanChoice
+from app.models.timestamp_mapping import TimestampMapping, SegmentPlacement
+from app.normalize import HEADLINE_START, HEADLINE_STOP
+from app.models.enums import SearchRank, SearchMode, SearchPlan
+from app.search_cache import search_cache_key, invalidate_search_cache
+from app.models.utils import count_queries, install_query_counter
+
+
+@pytest.fixture(autouse=True)
+def no_fuzzy_fallback():
+    """Mocked searches return few hits, keep them from also running the fuzzy fallback query"""
+    with patch('app.search.SEARCH_FUZZY_FALLBACK_HITS', 0):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def no_search_planner():
+    """Mocked sessions can't EXPLAIN, run the searches without forcing a plan"""
+    with patch('app.search._plan_search', return_value=Mock(plan=Mock(value="unplanned"), estimated_hits=0, estimated_scope=0)):
+        yield
 
 
 class TestSearchV2Integration:
@@ -19,6 +39,8 @@ class TestSearchV2Integration:
         self.mock_video = Mock()
         self.mock_video.id = 1
         self.mock_video.uploaded = datetime(2023, 1, 1)
+        self.mock_video.active = True
+        self.mock_video.source_mappings = []
         
         # Create mock transcription
         self.mock_transcription = Mock()
@@ -31,6 +53,7 @@ class TestSearchV2Integration:
         self.mock_segment1.previous_segment_id = None
         self.mock_segment1.next_segment_id = 2
         self.mock_segment1.transcription = self.mock_transcription
+        self.mock_segment1.transcription_id = 1
         self.mock_segment1.start = 0
         self.mock_segment1.end = 5
         
@@ -40,38 +63,28 @@ class TestSearchV2Integration:
         self.mock_segment2.previous_segment_id = 1
         self.mock_segment2.next_segment_id = None
         self.mock_segment2.transcription = self.mock_transcription
+        self.mock_segment2.transcription_id = 1
         self.mock_segment2.start = 5
         self.mock_segment2.end = 10
         
         # Create mock channel
         self.mock_channel = Mock()
         self.mock_channel.id = 1
+        self.mock_channel.name = "test"
+
+    @staticmethod
+    def compiled(mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        statement = mock_db_session.execute.call_args[0][0]
+        return statement.compile(dialect=postgresql.dialect())
     
-    @patch('app.search.TranscriptionService.get_transcriptions_on_channels')
     @patch('app.search.db.session')
     @patch('app.search.sanitize_sentence')
-    @patch('app.search.loosely_sanitize_sentence')
-    def test_search_v2_basic_search(self, mock_loosely_sanitize, mock_sanitize, 
-                                   mock_db_session, mock_get_transcriptions):
+    def test_search_v2_basic_search(self, mock_sanitize, mock_db_session):
         """Test basic search functionality"""
-        # Setup mocks
-        mock_transcription_obj = Mock()
-        mock_transcription_obj.id = 1
-        mock_get_transcriptions.return_value = [mock_transcription_obj]
-        
-        # Mock database query results
-        mock_query_result = Mock()
-        mock_query_result.scalars.return_value.all.return_value = [self.mock_segment1]
-        mock_db_session.execute.return_value = mock_query_result
-        
-        # Mock segment retrieval
-        mock_get_segment = Mock()
-        mock_get_segment.return_value = self.mock_segment1
-        
-        # Mock sanitization functions
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [self.mock_segment1]
         mock_sanitize.return_value = ["hello", "world", "test"]
         
-        # Test non-strict search
         result = search_v2("hello world", [self.mock_channel])
         
         # Verify results
@@ -80,189 +93,898 @@ class TestSearchV2Integration:
         assert result[0].video == self.mock_video
         assert len(result[0].segment_results) == 1
         
-        # Verify that get_transcriptions was called
-        mock_get_transcriptions.assert_called_once_with([self.mock_channel])
+        # Channel filter is applied on the segments, without looking up transcriptions first
+        compiled = self.compiled(mock_db_session)
+        assert "segments.channel_id IN" in str(compiled)
+        assert "transcription_id IN" not in str(compiled)
+        assert [1] in compiled.params.values()
     
-    @patch('app.search.TranscriptionService.get_transcriptions_on_channels_daterange')
     @patch('app.search.db.session')
     @patch('app.search.sanitize_sentence')
-    def test_search_v2_with_date_range(self, mock_sanitize, mock_db_session, 
-                                      mock_get_transcriptions_daterange):
+    def test_search_v2_with_date_range(self, mock_sanitize, mock_db_session):
         """Test search with date range filtering"""
-        # Setup mocks
         start_date = datetime(2023, 1, 1)
         end_date = datetime(2023, 12, 31)
-        
-        mock_transcription_obj = Mock()
-        mock_transcription_obj.id = 1
-        mock_get_transcriptions_daterange.return_value = [mock_transcription_obj]
-        
-        # Mock database query results
-        mock_query_result = Mock()
-        mock_query_result.scalars.return_value.all.return_value = [self.mock_segment1]
-        mock_db_session.execute.return_value = mock_query_result
-        
-        mock_get_segment = Mock()
-        mock_get_segment.return_value = self.mock_segment1
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [self.mock_segment1]
         mock_sanitize.return_value = ["hello", "world"]
         
-        # Test with date range
         result = search_v2("hello world", [self.mock_channel], start_date, end_date)
         
-        # Verify date range function was called
-        mock_get_transcriptions_daterange.assert_called_once_with([self.mock_channel], start_date, end_date)
         assert len(result) == 1
+        compiled = self.compiled(mock_db_session)
+        assert "segments.video_uploaded >=" in str(compiled)
+        assert "segments.video_uploaded <=" in str(compiled)
+        assert start_date in compiled.params.values()
+        assert end_date in compiled.params.values()
     
-    @patch('app.search.TranscriptionService.get_transcriptions_on_channels')
     @patch('app.search.db.session')
-    @patch('app.search.loosely_sanitize_sentence')
-    def test_search_v2_strict_search(self, mock_loosely_sanitize, mock_db_session, 
-                                    mock_get_transcriptions):
+    @patch('app.search.sanitize_sentence')
+    def test_search_v2_strict_search(self, mock_sanitize, mock_db_session):
         """Test strict search with quoted terms"""
-        # Setup mocks for strict search
-        mock_transcription_obj = Mock()
-        mock_transcription_obj.id = 1
-        mock_get_transcriptions.return_value = [mock_transcription_obj]
-        
-        # Mock database query results
-        mock_query_result = Mock()
-        mock_query_result.scalars.return_value.all.return_value = [self.mock_segment1]
-        mock_db_session.execute.return_value = mock_query_result
-        
-        mock_get_segment = Mock()
-        mock_get_segment.return_value = self.mock_segment1
-        mock_loosely_sanitize.return_value = ["hello", "world"]
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [self.mock_segment1]
+        mock_sanitize.return_value = ["hello", "world"]
         
-        # Test strict search (quoted terms)
         result = search_v2('"hello world"', [self.mock_channel])
         
-        # Verify loosely_sanitize was used for strict search
-        mock_loosely_sanitize.assert_called()
-        assert len(result) >= 0  # May be 0 if strict matching fails
+        # Quoted terms are matched as a phrase over the segment and the one after it
+        mock_sanitize.assert_called_once_with("hello world")
+        compiled = self.compiled(mock_db_session)
+        assert "segments.text_window_tsv @@ phraseto_tsquery" in str(compiled)
+        assert "hello world" in compiled.params.values()
+        # The hit is the segment the phrase starts in
+        assert "hello" in compiled.params.values()
+        assert len(result) == 1
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_search_v2_phrase_only_in_next_segment(self, mock_sanitize, mock_db_session):
+        """A segment containing the first word is not the hit when the next segment holds the whole phrase"""
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+        mock_sanitize.return_value = ["hello", "world"]
+
+        search_v2('"hello world"', [self.mock_channel])
+
+        sql = str(self.compiled(mock_db_session))
+        assert "segments.text_tsv @@ phraseto_tsquery" in sql
+        assert "OR NOT (EXISTS (SELECT *" in sql
+        assert "segments_1.id = segments.next_segment_id AND (segments_1.text_tsv @@ phraseto_tsquery" in sql
+
+    def test_update_text_windows_joins_next_segment(self):
+        from sqlalchemy.dialects import postgresql
+        from app.services.transcription import SegmentService
+        with patch('app.services.transcription.db.session') as mock_session:
+            SegmentService.update_text_windows(Mock(id=5))
+        sql = str(mock_session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert "UPDATE segments SET text_window_tsv=to_tsvector" in sql
+        assert "lead(segments.text) OVER (PARTITION BY segments.transcription_id ORDER BY segments.start)" in sql
     
-    @patch('app.search.TranscriptionService.get_transcriptions_on_channels')
-    def test_search_v2_no_transcriptions_error(self, mock_get_transcriptions):
-        """Test error when no transcriptions are found"""
-        mock_get_transcriptions.return_value = None
-        
-        with pytest.raises(ValueError, match="No transcriptions found"):
-            search_v2("hello world", [self.mock_channel])
+    def test_search_v2_no_channels(self):
+        """Test that searching no channels returns nothing"""
+        assert search_v2("hello world", []) == []
     
-    @patch('app.search.TranscriptionService.get_transcriptions_on_channels')
     @patch('app.search.db.session')
-    @patch('app.search.sanitize_sentence')
-    def test_search_v2_empty_search_words_error(self, mock_sanitize, mock_db_session, mock_get_transcriptions):
+    def test_search_v2_empty_search_words_error(self, mock_db_session):
         """Test error when search results in no useful words"""
-        mock_transcription_obj = Mock()
-        mock_get_transcriptions.return_value = [mock_transcription_obj]
-        
-        # Mock database query results
-        mock_query_result = Mock()
-        mock_query_result.scalars.return_value.all.return_value = []
-        mock_db_session.execute.return_value = mock_query_result
-        
-        # Mock sanitize to return empty list (no useful words)
-        mock_sanitize.return_value = []
-        
         with pytest.raises(ValueError, match="Search was too short"):
             search_v2("   ", [self.mock_channel])  # Search term with only spaces
+        mock_db_session.execute.assert_not_called()
     
-    @patch('app.search.TranscriptionService.get_transcriptions_on_channels')
     @patch('app.search.db.session')
     @patch('app.search.sanitize_sentence')
-    def test_search_v2_adjacent_segment_logic(self, mock_sanitize, mock_db_session, 
-                                             mock_get_transcriptions):
-        """Test adjacent segment retrieval logic"""
-        # Setup mocks
-        mock_transcription_obj = Mock()
-        mock_transcription_obj.id = 1
-        mock_get_transcriptions.return_value = [mock_transcription_obj]
-        
-        # Create segment where search word is at the beginning
-        segment_with_word_at_start = Mock()
-        segment_with_word_at_start.id = 10
-        segment_with_word_at_start.text = "hello this is a test"
-        segment_with_word_at_start.previous_segment_id = 9
-        segment_with_word_at_start.next_segment_id = 11
-        segment_with_word_at_start.transcription = self.mock_transcription
-        
-        # Mock the previous segment
-        previous_segment = Mock()
-        previous_segment.text = "previous segment text"
-        
-        # Mock database query results
-        mock_query_result = Mock()
-        mock_query_result.scalars.return_value.all.return_value = [segment_with_word_at_start]
-        mock_db_session.execute.return_value = mock_query_result
-        
-        # Mock segment retrieval - return different segments based on ID
-        def mock_get_segment_side_effect(segment_id):
-            if segment_id == 10:
-                return segment_with_word_at_start
-            elif segment_id == 9:
-                return previous_segment
-            return segment_with_word_at_start
-        
-        mock_get_segment = Mock()
-        mock_get_segment.side_effect = mock_get_segment_side_effect
-        
-        # Mock sanitize to return words where "hello" is first
-        mock_sanitize.side_effect = lambda text: text.split()
-        
-        # Test search
-        result = search_v2("hello world", [self.mock_channel])
+    def test_search_v2_inactive_video_filtered(self, mock_sanitize, mock_db_session):
+        """Test that hits on inactive videos are dropped"""
+        self.mock_video.active = False
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [self.mock_segment1]
+        mock_sanitize.return_value = ["hello"]
         
+        assert search_v2("hello", [self.mock_channel]) == []
     
-    @patch('app.search.TranscriptionService.get_transcriptions_on_channels')
     @patch('app.search.db.session')
     @patch('app.search.sanitize_sentence')
-    def test_search_v2_multiple_videos_grouping(self, mock_sanitize, mock_db_session, 
-                                               mock_get_transcriptions):
+    def test_search_v2_multiple_videos_grouping(self, mock_sanitize, mock_db_session):
         """Test that results are properly grouped by video"""
-        # Setup mocks for multiple segments from same video
-        mock_transcription_obj = Mock()
-        mock_transcription_obj.id = 1
-        mock_get_transcriptions.return_value = [mock_transcription_obj]
-        
-        # Create two segments from the same video
-        segment1 = Mock()
-        segment1.id = 1
-        segment1.text = "hello world segment one"
-        segment1.transcription = self.mock_transcription
-        segment1.previous_segment_id = None
-        segment1.next_segment_id = None
-        segment1.start = 0  # Add numeric start time for sorting
-        segment1.end = 5
-        
-        segment2 = Mock()
-        segment2.id = 2
-        segment2.text = "hello world segment two"  
-        segment2.transcription = self.mock_transcription
-        segment2.previous_segment_id = None
-        segment2.next_segment_id = None
-        segment2.start = 10  # Add numeric start time for sorting
-        segment2.end = 15
-        
-        # Mock database query results
-        mock_query_result = Mock()
-        mock_query_result.scalars.return_value.all.return_value = [segment1, segment2]
-        mock_db_session.execute.return_value = mock_query_result
-        
-        # Mock segment retrieval
-        def mock_get_segment_side_effect(segment_id):
-            if segment_id == 1:
-                return segment1
-            elif segment_id == 2:
-                return segment2
-        
-        mock_get_segment = Mock()
-        mock_get_segment.side_effect = mock_get_segment_side_effect
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [
+            self.mock_segment2, self.mock_segment1]
         mock_sanitize.return_value = ["hello", "world"]
         
-        # Test search
         result = search_v2("hello world", [self.mock_channel])
         
-        # Should have 1 VideoResult with 2 SegmentsResult
+        # Should have 1 VideoResult with 2 SegmentsResult, sorted by start
         assert len(result) == 1
-        assert len(result[0].segment_results) == 2
-        
\ No newline at end of file
+        assert [s.start_time() for s in result[0].segment_results] == [0, 5]
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_search_v2_relevance_ranked_in_database(self, mock_sanitize, mock_db_session):
+        """Test relevance search ranks, aggregates and limits in the query"""
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [self.mock_segment1]
+        mock_sanitize.return_value = ["hello"]
+
+        result = search_v2("hello", [self.mock_channel], rank=SearchRank.Relevance, top_k=10)
+
+        assert len(result) == 1
+        compiled = self.compiled(mock_db_session)
+        sql = str(compiled)
+        assert "ts_rank_cd(segments.text_tsv" in sql
+        assert "PARTITION BY segments.video_id" in sql
+        assert "ORDER BY top_videos.score DESC" in sql
+        assert 10 in compiled.params.values()
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_search_v2_relevance_keeps_database_order(self, mock_sanitize, mock_db_session):
+        """Test relevance results are not re-sorted by upload date"""
+        older_video = Mock(id=2, uploaded=datetime(2022, 1, 1), active=True, source_mappings=[])
+        older_segment = Mock(id=3, transcription_id=2, start=0, end=5)
+        older_segment.transcription.video = older_video
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [
+            older_segment, self.mock_segment1]
+        mock_sanitize.return_value = ["hello"]
+
+        relevance = search_v2("hello", [self.mock_channel], rank=SearchRank.Relevance)
+        assert [v.video.id for v in relevance] == [2, 1]
+
+        recent = search_v2("hello", [self.mock_channel])
+        assert [v.video.id for v in recent] == [1, 2]
+
+
+class TestSearchHighlighting:
+    """Test highlighted snippets from database headlines"""
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_hit_query_loads_headline(self, mock_sanitize, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+        mock_sanitize.return_value = ["hello"]
+
+        search_v2("hello", [Mock(id=1)])
+
+        sql = str(mock_db_session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert "ts_headline(" in sql
+
+    def test_headline_rendered_escaped(self):
+        segment = Mock(text="say <hello>", headline=f"say <{HEADLINE_START}hello{HEADLINE_STOP}>")
+        result = SegmentsResult([segment], Mock(), ["hello"])
+        assert result.get_sentences_formated() == " say &lt;<mark>hello</mark>&gt;"
+
+    def test_without_headline_highlights_by_stem(self):
+        segment = Mock(text="they were running", headline=None)
+        result = SegmentsResult([segment], Mock(), ["run"])
+        assert result.get_sentences_formated() == " they were <mark>running</mark>"
+
+
+class TestSearchContext:
+    """Test neighbouring segment context around hits"""
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_context_loaded_in_hit_query(self, mock_sanitize, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+        mock_sanitize.return_value = ["hello"]
+
+        search_v2("hello", [Mock(id=1)], context=10)
+
+        compiled = mock_db_session.execute.call_args[0][0].compile(dialect=postgresql.dialect())
+        assert str(compiled).count("array((SELECT segments_1.text") == 2
+        # Capped to SEARCH_MAX_CONTEXT
+        assert list(compiled.params.values()).count(3) == 2
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_no_context_by_default(self, mock_sanitize, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+        mock_sanitize.return_value = ["hello"]
+
+        search_v2("hello", [Mock(id=1)])
+
+        sql = str(mock_db_session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert "array(" not in sql
+
+    def test_context_text_in_reading_order(self):
+        segment = Mock(text="hit", start=10, end=15,
+                       context_before=["just before", "earlier"], context_after=["after", "later"])
+        result = SegmentsResult([segment], Mock(), [])
+        assert result.get_context_before() == "earlier just before"
+        assert result.get_context_after() == "after later"
+
+
+class TestSearchFacets:
+    """Test the per channel and month hit histogram"""
+
+    @patch('app.search.db.session')
+    def test_facets_counted_in_database(self, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        mock_db_session.execute.return_value.all.return_value = [
+            (1, datetime(2023, 1, 1), 12, 3),
+            (2, datetime(2023, 2, 1), 4, 1),
+        ]
+
+        facets = search_facets("hello", [Mock(id=1), Mock(id=2)])
+
+        assert [(f.channel_id, f.month.month, f.hits, f.videos) for f in facets] == [(1, 1, 12, 3), (2, 2, 4, 1)]
+        sql = str(mock_db_session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert "GROUP BY segments.channel_id, date_trunc(" in sql
+        assert "count(DISTINCT segments.video_id)" in sql
+        assert "transcriptions" not in sql
+
+    @patch('app.search.db.session')
+    def test_facets_without_channels(self, mock_db_session):
+        assert search_facets("hello", []) == []
+        mock_db_session.execute.assert_not_called()
+
+
+class TestSemanticSearch:
+    """Test embeddings and semantic retrieval"""
+
+    def test_hashing_embedder_is_deterministic_and_normalized(self):
+        from app.embeddings import HashingEmbedder, EMBEDDING_DIMENSIONS
+        first, again = HashingEmbedder().embed(["the cats were running", "the cats were running"])
+        assert first == again
+        assert len(first) == EMBEDDING_DIMENSIONS
+        assert abs(sum(v * v for v in first) - 1.0) < 1e-9
+
+    def test_hashing_embedder_similar_text_is_closer(self):
+        from app.embeddings import HashingEmbedder
+        query, similar, other = HashingEmbedder().embed(["cat running", "the cats ran and kept running", "weather report"])
+        dot = lambda a, b: sum(x * y for x, y in zip(a, b))
+        assert dot(query, similar) > dot(query, other)
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_semantic_search_orders_by_distance(self, mock_sanitize, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+        mock_sanitize.return_value = ["cat"]
+
+        search_v2("cat", [Mock(id=1)], start_date=datetime(2023, 1, 1), mode=SearchMode.Semantic)
+
+        sql = str(mock_db_session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert "ORDER BY segments.embedding <=> CAST(" in sql
+        assert "segments.channel_id IN" in sql
+        assert "segments.video_uploaded >=" in sql
+        assert "text_tsv @@" not in sql
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_semantic_search_without_words(self, mock_sanitize, mock_db_session):
+        mock_sanitize.return_value = []
+        assert search_v2("?!", [Mock(id=1)], mode=SearchMode.Semantic) == []
+        mock_db_session.execute.assert_not_called()
+
+    def test_update_embeddings_in_batches(self):
+        from app.services.transcription import SegmentService
+        with patch('app.services.transcription.db.session') as mock_session, \
+                patch('app.services.transcription.EMBEDDING_BATCH_SIZE', 2):
+            mock_session.execute.return_value.all.return_value = [(1, "hello"), (2, "world"), (3, "...")]
+            assert SegmentService.update_embeddings(Mock(id=5)) == 3
+
+        updates = [c[0][1] for c in mock_session.execute.call_args_list[1:]]
+        assert [[row["id"] for row in batch] for batch in updates] == [[1, 2], [3]]
+        # Nothing to embed, nothing stored
+        assert updates[1][0]["embedding"] is None
+
+
+class TestStemmedSearch:
+    """Test choosing the English stemmed tsvector over the exact one"""
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_stemmed_search_uses_english_column(self, mock_sanitize, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+        mock_sanitize.return_value = ["run"]
+
+        search_v2("running", [Mock(id=1)], rank=SearchRank.Relevance, stemmed=True)
+
+        sql = str(mock_db_session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert "segments.text_tsv_english @@ plainto_tsquery('english'" in sql
+        assert "ts_rank_cd(segments.text_tsv_english" in sql
+        assert "segments.text_tsv @@" not in sql
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_exact_search_by_default(self, mock_sanitize, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+        mock_sanitize.return_value = ["run"]
+
+        search_v2("running", [Mock(id=1)])
+
+        sql = str(mock_db_session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert "segments.text_tsv @@ plainto_tsquery('simple'" in sql
+        assert "text_tsv_english @@" not in sql
+
+
+class TestFuzzySearch:
+    """Test trigram fuzzy search and the fallback from full text search"""
+
+    @staticmethod
+    def statements(mock_db_session) -> list[str]:
+        from sqlalchemy.dialects import postgresql
+        return [str(c[0][0].compile(dialect=postgresql.dialect())) for c in mock_db_session.execute.call_args_list]
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_fuzzy_mode_ranks_by_word_similarity(self, mock_sanitize, mock_db_session):
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+        mock_sanitize.return_value = ["helo"]
+
+        search_v2('"helo"', [Mock(id=1)], mode=SearchMode.Fuzzy)
+
+        threshold, hits = self.statements(mock_db_session)
+        assert "set_config" in threshold
+        assert "segments.text %%> " in hits
+        assert "ORDER BY word_similarity(" in hits
+        assert "text_tsv @@" not in hits
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_few_exact_hits_fall_back_to_fuzzy(self, mock_sanitize, mock_db_session):
+        video = Mock(id=1, uploaded=datetime(2023, 1, 1), active=True, source_mappings=[])
+        exact = Mock(id=7, transcription_id=1, start=0, end=5)
+        exact.transcription.video = video
+        fuzzy = Mock(id=8, transcription_id=1, start=10, end=15)
+        fuzzy.transcription.video = video
+        mock_db_session.execute.return_value.scalars.return_value.all.side_effect = [[exact], [fuzzy]]
+        mock_sanitize.return_value = ["helo"]
+
+        with patch('app.search.SEARCH_FUZZY_FALLBACK_HITS', 5):
+            result = search_v2("helo", [Mock(id=1)])
+
+        exact_sql, threshold, fuzzy_sql = self.statements(mock_db_session)
+        assert "text_tsv @@" in exact_sql
+        assert "segments.text %%> " in fuzzy_sql
+        assert "segments.id NOT IN" in fuzzy_sql
+        assert [s.start_time() for s in result[0].segment_results] == [0, 10]
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_enough_exact_hits_skip_fuzzy(self, mock_sanitize, mock_db_session):
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+        mock_sanitize.return_value = ["hello"]
+
+        with patch('app.search.SEARCH_FUZZY_FALLBACK_HITS', 5):
+            search_v2('"hello world"', [Mock(id=1)])
+
+        # Quoted phrases are never loosened
+        assert not any("%%> " in statement for statement in self.statements(mock_db_session))
+
+
+class TestSegmentPlacement:
+    """Test hits on source videos shown on their linked target video"""
+
+    def setup_method(self):
+        self.mapping = TimestampMapping(
+            id=7, source_video_id=1, target_video_id=2,
+            source_start_time=0.0, source_end_time=1000.0,
+            target_start_time=0.0, target_end_time=900.0,
+            time_offset=10.0, cuts_data={'cuts': [{'start': 100.0, 'duration': 50.0}]},
+            active=True,
+        )
+
+    def test_place_segments_applies_offset_and_cuts(self):
+        segments = [Mock(id=1, start=20, end=30), Mock(id=2, start=110, end=120), Mock(id=3, start=200, end=210)]
+
+        rows = self.mapping.place_segments(segments)
+
+        # The segment inside the cut has no place in the target video
+        assert rows == [
+            {'segment_id': 1, 'mapping_id': 7, 'target_video_id': 2, 'target_start': 10.0, 'target_end': 20.0},
+            {'segment_id': 3, 'mapping_id': 7, 'target_video_id': 2, 'target_start': 140.0, 'target_end': 150.0},
+        ]
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence', return_value=["hello"])
+    def test_hit_is_shown_on_target_video(self, mock_sanitize, mock_db_session):
+        target_video = Mock(id=2, uploaded=datetime(2023, 1, 2), active=True)
+        mapping = Mock(id=7, active=True, target_video=target_video)
+        source_video = Mock(id=1, uploaded=datetime(2023, 1, 1), active=True, source_mappings=[mapping])
+        placement = SegmentPlacement(segment_id=1, mapping_id=7, target_video_id=2, target_start=140.0, target_end=150.5)
+        segment = Mock(id=1, transcription_id=1, start=200, end=210, text="hello",
+                       transcription=Mock(video=source_video), placements=[placement])
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [segment]
+
+        with patch('app.services.video.VideoService.get_url_with_timestamp', return_value="url") as mock_url:
+            result = search_v2("hello", [Mock(id=1)])
+            assert result[0].segment_results[0].get_url() == "url"
+
+        assert result[0].video is target_video
+        assert (result[0].segment_results[0].start_time(), result[0].segment_results[0].end_time()) == (140, 150)
+        mock_url.assert_called_once_with(target_video, 135)
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence', return_value=["hello"])
+    def test_unplaced_hit_stays_on_source_video(self, mock_sanitize, mock_db_session):
+        mapping = Mock(id=7, active=True, target_video=Mock(id=2))
+        source_video = Mock(id=1, uploaded=datetime(2023, 1, 1), active=True, source_mappings=[mapping])
+        segment = Mock(id=2, transcription_id=1, start=110, end=120, text="hello",
+                       transcription=Mock(video=source_video), placements=[])
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [segment]
+
+        result = search_v2("hello", [Mock(id=1)])
+
+        assert result[0].video is source_video
+        assert result[0].segment_results[0].start_time() == 110
+
+
+class TestBackgroundSearch:
+    """Test the year by year search run by background search jobs"""
+
+    @patch('app.search.db.session')
+    def test_year_ranges_newest_first_and_clipped(self, mock_db_session):
+        mock_db_session.execute.return_value.one.return_value = (datetime(2021, 3, 1), datetime(2023, 5, 1))
+
+        ranges = search_year_ranges([Mock(id=1)], start_date=datetime(2021, 6, 1))
+
+        assert [year for year, _, _ in ranges] == [2023, 2022, 2021]
+        assert ranges[0][1] == datetime(2023, 1, 1)
+        assert ranges[-1][1] == datetime(2021, 6, 1)
+        assert ranges[-1][2].year == 2021 and ranges[-1][2].month == 12
+
+    @patch('app.search.db.session')
+    def test_year_ranges_without_segments(self, mock_db_session):
+        mock_db_session.execute.return_value.one.return_value = (None, None)
+
+        assert search_year_ranges([Mock(id=1)]) == []
+
+    @patch('app.search.db.session')
+    def test_segment_ids_only_selects_ids(self, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [3, 2]
+
+        ids = search_segment_ids("hello", [Mock(id=1)], datetime(2023, 1, 1), datetime(2023, 12, 31))
+
+        assert ids == [3, 2]
+        sql = str(mock_db_session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert sql.startswith("SELECT segments.id \nFROM segments JOIN video")
+        assert "segments.video_uploaded >= " in sql
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence', return_value=["hello"])
+    def test_load_search_results_groups_by_video(self, mock_sanitize, mock_db_session):
+        video = Mock(id=1, uploaded=datetime(2023, 1, 1), active=True, source_mappings=[])
+        segments = [
+            Mock(id=2, transcription_id=1, start=50, end=55, transcription=Mock(video=video)),
+            Mock(id=1, transcription_id=1, start=10, end=15, transcription=Mock(video=video)),
+        ]
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = segments
+
+        result = load_search_results([2, 1], "hello")
+
+        assert len(result) == 1
+        assert [r.start_time() for r in result[0].segment_results] == [10, 50]
+
+
+class TestSearchPlanner:
+    """Test the choice between text index and channel/date index driven searches"""
+
+    def setup_method(self):
+        self.mock_channel = Mock()
+        self.mock_channel.id = 1
+        self.mock_channel.name = "test"
+
+    @pytest.fixture(autouse=True)
+    def plan_cache(self):
+        """Planned choices are cached, start every test with an empty cache"""
+        with patch('app.search.get_cached_search', return_value=None) as get_cached, \
+                patch('app.search.set_cached_search') as set_cached:
+            yield get_cached, set_cached
+
+    @staticmethod
+    def compiled_sql(mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        statement = mock_db_session.execute.call_args[0][0]
+        return str(statement.compile(dialect=postgresql.dialect()))
+
+    @patch('app.search._estimate_rows')
+    def test_narrow_range_with_common_word_is_filter_first(self, mock_estimate):
+        mock_estimate.side_effect = [500000, 2000]
+
+        choice = _plan_search("the", [self.mock_channel], datetime(2023, 1, 1), datetime(2023, 1, 7))
+
+        assert choice == SearchPlanChoice(plan=SearchPlan.FilterFirst, estimated_hits=500000, estimated_scope=2000)
+
+    @patch('app.search._estimate_rows')
+    def test_close_estimates_are_left_to_postgres(self, mock_estimate):
+        mock_estimate.side_effect = [50000, 2000]
+
+        choice = _plan_search("the", [self.mock_channel], datetime(2023, 1, 1), datetime(2023, 1, 7))
+
+        assert choice.plan == SearchPlan.Default
+
+    @patch('app.search._estimate_rows')
+    def test_plan_is_cached(self, mock_estimate, plan_cache):
+        get_cached, set_cached = plan_cache
+        mock_estimate.side_effect = [500000, 2000]
+
+        _plan_search("the", [self.mock_channel], None, None)
+        set_cached.assert_called_once_with(get_cached.call_args[0][0], ["filter_first", 500000, 2000])
+
+        get_cached.return_value = ["filter_first", 500000, 2000]
+        choice = _plan_search("the", [self.mock_channel], None, None)
+
+        # The second search runs no EXPLAIN
+        assert mock_estimate.call_count == 2
+        assert choice == SearchPlanChoice(plan=SearchPlan.FilterFirst, estimated_hits=500000, estimated_scope=2000)
+
+    @patch('app.search._estimate_rows')
+    def test_rare_word_is_index_first(self, mock_estimate):
+        mock_estimate.side_effect = [30, 2000000]
+
+        choice = _plan_search("hello", [self.mock_channel], None, None)
+
+        assert choice.plan == SearchPlan.IndexFirst
+
+    @patch('app.search.db.session')
+    def test_estimate_rows_reads_explain(self, mock_db_session):
+        from sqlalchemy import select
+        from sqlalchemy.dialects import postgresql
+        from app.models.transcription import Segments
+        connection = mock_db_session.connection.return_value
+        connection.dialect = postgresql.dialect()
+        connection.exec_driver_sql.return_value.scalar_one.return_value = '[{"Plan": {"Plan Rows": 42}}]'
+
+        assert _estimate_rows(select(Segments.id).where(Segments.channel_id.in_([1, 2]))) == 42
+        sql = connection.exec_driver_sql.call_args[0][0]
+        assert sql.startswith("EXPLAIN (FORMAT JSON) SELECT")
+        # Expanding parameters are rendered so the statement can go straight to the driver
+        assert "POSTCOMPILE" not in sql
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence', return_value=["the"])
+    @patch('app.search._plan_search')
+    def test_filter_first_hides_text_index(self, mock_plan, mock_sanitize, mock_db_session):
+        mock_plan.return_value = SearchPlanChoice(SearchPlan.FilterFirst, estimated_hits=50000, estimated_scope=2000)
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+
+        search_v2("the", [self.mock_channel], datetime(2023, 1, 1), datetime(2023, 1, 7))
+
+        sql = self.compiled_sql(mock_db_session)
+        assert "coalesce(segments.text_tsv" in sql
+        assert "segments.channel_id IN" in sql
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence', return_value=["hello"])
+    @patch('app.search._plan_search')
+    def test_index_first_hides_channel_index(self, mock_plan, mock_sanitize, mock_db_session):
+        mock_plan.return_value = SearchPlanChoice(SearchPlan.IndexFirst, estimated_hits=30, estimated_scope=2000000)
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+
+        search_v2("hello", [self.mock_channel], rank=SearchRank.Relevance)
+
+        sql = self.compiled_sql(mock_db_session)
+        assert "segments.channel_id + " in sql
+        assert "coalesce(" not in sql
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence', return_value=["hello"])
+    @patch('app.search._plan_search')
+    def test_semantic_search_is_not_planned(self, mock_plan, mock_sanitize, mock_db_session):
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+
+        search_v2("hello", [self.mock_channel], mode=SearchMode.Semantic)
+
+        mock_plan.assert_not_called()
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence', return_value=["hello"])
+    @patch('app.search._plan_search')
+    def test_default_plan_keeps_both_indexes(self, mock_plan, mock_sanitize, mock_db_session):
+        mock_plan.return_value = SearchPlanChoice(SearchPlan.Default, estimated_hits=50000, estimated_scope=2000)
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+
+        search_v2("hello", [self.mock_channel])
+
+        sql = self.compiled_sql(mock_db_session)
+        assert "segments.channel_id IN" in sql
+        assert "coalesce(" not in sql
+
+    @pytest.mark.parametrize("plan", [SearchPlan.IndexFirst, SearchPlan.FilterFirst, SearchPlan.Default])
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence', return_value=["hello"])
+    def test_plans_compile_for_psycopg(self, mock_sanitize, mock_db_session, plan):
+        """Each plan's hit queries compile for the driver the app runs on"""
+        from sqlalchemy.dialects.postgresql import psycopg
+        mock_db_session.execute.return_value = MagicMock()
+        choice = SearchPlanChoice(plan, estimated_hits=500, estimated_scope=500)
+
+        with patch('app.search._plan_search', return_value=choice):
+            search_v2("hello", [self.mock_channel], datetime(2023, 1, 1), datetime(2023, 1, 7))
+            search_v2_page("hello", [self.mock_channel], datetime(2023, 1, 1), datetime(2023, 1, 7))
+
+        statements = [str(c[0][0].compile(dialect=psycopg.dialect())) for c in mock_db_session.execute.call_args_list]
+        hit_statements = [s for s in statements if "FROM segments JOIN transcriptions" in s]
+        assert len(hit_statements) == 2
+        for statement in hit_statements:
+            assert ("coalesce(segments.text_tsv" in statement) == (plan == SearchPlan.FilterFirst)
+            assert ("segments.channel_id + " in statement) == (plan == SearchPlan.IndexFirst)
+
+
+class TestSearchV2Page:
+    """Test the keyset paginated search"""
+
+    def setup_method(self):
+        self.mock_channel = Mock()
+        self.mock_channel.id = 1
+        self.mock_channel.name = "test"
+
+    @staticmethod
+    def make_hit(segment_id, transcription_id, video_id, uploaded, start):
+        video = Mock()
+        video.id = video_id
+        video.uploaded = uploaded
+        video.active = True
+        video.source_mappings = []
+        segment = Mock()
+        segment.id = segment_id
+        segment.transcription_id = transcription_id
+        segment.transcription.video = video
+        segment.video_uploaded = uploaded
+        segment.start = start
+        segment.end = start + 5
+        return segment
+
+    def mock_result(self, rows):
+        """Result of the page query, each hit with the upload time and id of the video it's shown on."""
+        result = MagicMock()
+        result.__iter__.return_value = iter([
+            (segment, segment.video_uploaded, segment.transcription.video.id) for segment in rows])
+        return result
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_page_stops_after_page_size_videos(self, mock_sanitize, mock_db_session):
+        mock_sanitize.return_value = ["hello"]
+        rows = [
+            self.make_hit(30, 3, 3, datetime(2023, 3, 1), 20),
+            self.make_hit(31, 3, 3, datetime(2023, 3, 1), 10),
+            self.make_hit(20, 2, 2, datetime(2023, 2, 1), 50),
+            self.make_hit(10, 1, 1, datetime(2023, 1, 1), 5),
+        ]
+        result = self.mock_result(rows)
+        mock_db_session.execute.return_value = result
+
+        page = search_v2_page("hello", [self.mock_channel], page_size=2)
+
+        assert [v.video.id for v in page.video_results] == [3, 2]
+        assert [s.start_time() for s in page.video_results[0].segment_results] == [10, 20]
+        assert page.next_cursor == SearchCursor(datetime(2023, 2, 1), 2, 2, 50, 20)
+        result.close.assert_called_once()
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_video_with_two_transcriptions_stays_on_one_page(self, mock_sanitize, mock_db_session):
+        mock_sanitize.return_value = ["hello"]
+        rows = [
+            self.make_hit(40, 4, 3, datetime(2023, 3, 1), 30),
+            self.make_hit(30, 3, 3, datetime(2023, 3, 1), 20),
+            self.make_hit(20, 2, 2, datetime(2023, 2, 1), 50),
+        ]
+        mock_db_session.execute.return_value = self.mock_result(rows)
+
+        page = search_v2_page("hello", [self.mock_channel], page_size=1)
+
+        assert [v.video.id for v in page.video_results] == [3]
+        assert [s.start_time() for s in page.video_results[0].segment_results] == [20, 30]
+        assert page.next_cursor == SearchCursor(datetime(2023, 3, 1), 3, 3, 20, 30)
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_placed_segments_grouped_with_target_video(self, mock_sanitize, mock_db_session):
+        mock_sanitize.return_value = ["hello"]
+        target = self.make_hit(30, 3, 3, datetime(2023, 3, 1), 20)
+        placed = self.make_hit(50, 5, 5, datetime(2023, 2, 20), 100)
+        mapping = Mock(id=1, active=True, target_video=target.transcription.video)
+        placed.transcription.video.source_mappings = [Mock(id=2, active=True), mapping]
+        placed.placements = [Mock(mapping_id=1, target_start=80.0, target_end=85.0)]
+        result = MagicMock()
+        # The query orders the placed segment by the video it is shown on
+        result.__iter__.return_value = iter([
+            (target, datetime(2023, 3, 1), 3),
+            (placed, datetime(2023, 3, 1), 3),
+            (self.make_hit(20, 2, 2, datetime(2023, 2, 1), 50), datetime(2023, 2, 1), 2),
+        ])
+        mock_db_session.execute.return_value = result
+
+        page = search_v2_page("hello", [self.mock_channel], page_size=1)
+
+        assert [v.video.id for v in page.video_results] == [3]
+        assert [s.start_time() for s in page.video_results[0].segment_results] == [20, 80]
+        assert page.next_cursor == SearchCursor(datetime(2023, 3, 1), 3, 5, 100, 50)
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_page_query_orders_by_result_video(self, mock_sanitize, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        mock_sanitize.return_value = ["hello"]
+        mock_db_session.execute.return_value = self.mock_result([])
+
+        search_v2_page("hello", [self.mock_channel], cursor=SearchCursor(datetime(2023, 3, 1), 3, 5, 100, 50))
+
+        statement = mock_db_session.execute.call_args[0][0]
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        result_video = "coalesce(video_1.uploaded, segments.video_uploaded), coalesce(segment_placement_1.target_video_id, segments.video_id)"
+        assert f"({result_video}, segments.transcription_id, segments.start, segments.id) < (" in sql
+        assert "ORDER BY coalesce(video_1.uploaded, segments.video_uploaded) DESC, coalesce(segment_placement_1.target_video_id" in sql
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_last_page_has_no_cursor(self, mock_sanitize, mock_db_session):
+        mock_sanitize.return_value = ["hello"]
+        rows = [self.make_hit(10, 1, 1, datetime(2023, 1, 1), 5)]
+        mock_db_session.execute.return_value = self.mock_result(rows)
+
+        page = search_v2_page("hello", [self.mock_channel], page_size=2)
+
+        assert len(page.video_results) == 1
+        assert page.next_cursor is None
+
+    def test_no_channels_skips_query(self):
+        page = search_v2_page("hello", [])
+        assert page.video_results == []
+        assert page.next_cursor is None
+
+
+class TestSearchCursor:
+    def test_roundtrip(self):
+        cursor = SearchCursor(datetime(2023, 5, 4, 12, 30), 7, 42, 120, 9001)
+        assert SearchCursor.decode(cursor.encode()) == cursor
+
+    @pytest.mark.parametrize("token", ["", "not-a-cursor", "WzFd"])
+    def test_invalid_token(self, token):
+        with pytest.raises(ValueError):
+            SearchCursor.decode(token)
+
+
+class TestSearchQueryCount:
+    """Round-trips per search must not grow with the number of hits"""
+
+    # Relations the result grouping and result.html read from each hit
+    RENDERED_RELATIONS = {
+        ("placements",),
+        ("transcription", "video", "channel"),
+        ("transcription", "video", "target_mappings", "source_video"),
+        ("transcription", "video", "source_mappings", "target_video", "channel"),
+        ("transcription", "video", "source_mappings", "target_video", "target_mappings"),
+    }
+
+    @staticmethod
+    def eager_relations(statement):
+        """Relationship paths the statement loads with it, as attribute names"""
+        return {
+            tuple(entity.key for entity in element.path.natural_path if hasattr(entity, "key"))
+            for option in statement._with_options
+            for element in getattr(option, "context", ())
+            if dict(element.strategy or ()).get("lazy") in ("joined", "selectin")
+        }
+
+    @pytest.mark.parametrize("paged", [True, False])
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence', return_value=["hello"])
+    def test_rendered_relations_are_eager_loaded(self, mock_sanitize, mock_db_session, paged):
+        """Nothing the page reads is lazy loaded per hit, so round-trips don't grow with the hits"""
+        mock_db_session.execute.return_value = MagicMock()
+
+        if paged:
+            search_v2_page("hello", [Mock(id=1)])
+        else:
+            search_v2("hello", [Mock(id=1)])
+
+        hit_statement = next(
+            c[0][0] for c in mock_db_session.execute.call_args_list if "FROM segments JOIN transcriptions" in str(c[0][0]))
+        assert self.RENDERED_RELATIONS <= self.eager_relations(hit_statement)
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    def test_page_query_eager_loads_video_and_channel(self, mock_sanitize, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        mock_sanitize.return_value = ["hello"]
+        mock_db_session.execute.return_value = MagicMock()
+
+        search_v2_page("hello", [Mock(id=1)])
+
+        statement = mock_db_session.execute.call_args[0][0]
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert "JOIN transcriptions" in sql
+        assert "JOIN video" in sql
+        assert "JOIN channels" in sql
+
+    def test_count_queries(self):
+        from sqlalchemy import create_engine, text
+        install_query_counter()
+        engine = create_engine("sqlite:///:memory:")
+        with engine.connect() as conn:
+            with count_queries() as counter:
+                conn.execute(text("SELECT 1"))
+                with count_queries() as inner:
+                    conn.execute(text("SELECT 2"))
+            conn.execute(text("SELECT 3"))
+        assert counter.count == 2
+        assert inner.count == 1
+
+    def test_count_queries_only_counts_own_thread(self):
+        import threading
+        from sqlalchemy import create_engine, text
+        install_query_counter()
+        engine = create_engine("sqlite://")
+
+        def query():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+        other = threading.Thread(target=query)
+        with count_queries() as counter:
+            other.start()
+            other.join()
+        assert counter.count == 0
+
+
+class TestSearchCache:
+    """Test search result caching and per-channel invalidation"""
+
+    @staticmethod
+    def fake_cache():
+        store = {}
+        fake = MagicMock()
+        fake.get_many.side_effect = lambda *keys: [store.get(k) for k in keys]
+        fake.set_many.side_effect = lambda mapping, timeout=None: store.update(mapping)
+        return fake
+
+    def test_key_normalizes_term_and_channel_order(self):
+        with patch('app.search_cache.cache', self.fake_cache()):
+            assert search_cache_key("search", "Hello  World", [2, 1]) == search_cache_key("search", "hello world", [1, 2])
+            assert search_cache_key("search", "hello", [1]) != search_cache_key("search", "hello", [1], datetime(2023, 1, 1))
+
+    def test_invalidation_only_changes_keys_of_that_channel(self):
+        with patch('app.search_cache.cache', self.fake_cache()):
+            channel_1 = search_cache_key("search", "hello", [1])
+            channel_2 = search_cache_key("search", "hello", [2])
+            invalidate_search_cache([1])
+            assert search_cache_key("search", "hello", [1]) != channel_1
+            assert search_cache_key("search", "hello", [2]) == channel_2
+
+    def test_unavailable_cache_disables_caching(self):
+        broken = MagicMock()
+        broken.get_many.side_effect = ConnectionError("redis down")
+        with patch('app.search_cache.cache', broken):
+            assert search_cache_key("search", "hello", [1]) is None
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    @patch('app.search.set_cached_search')
+    @patch('app.search.get_cached_search')
+    def test_miss_stores_segment_ids(self, mock_get, mock_set, mock_sanitize, mock_db_session):
+        video = Mock(id=1, uploaded=datetime(2023, 1, 1), active=True, source_mappings=[])
+        segment = Mock(id=7, transcription_id=1, start=0, end=5)
+        segment.transcription.video = video
+        mock_get.return_value = None
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [segment]
+        mock_sanitize.return_value = ["hello"]
+
+        search_v2("hello", [Mock(id=1)])
+
+        assert mock_set.call_args[0][1] == [7]
+
+    @patch('app.search.db.session')
+    @patch('app.search.sanitize_sentence')
+    @patch('app.search.set_cached_search')
+    @patch('app.search.get_cached_search')
+    def test_hit_loads_segments_by_id(self, mock_get, mock_set, mock_sanitize, mock_db_session):
+        from sqlalchemy.dialects import postgresql
+        video = Mock(id=1, uploaded=datetime(2023, 1, 1), active=True, source_mappings=[])
+        segment = Mock(id=7, transcription_id=1, start=0, end=5)
+        segment.transcription.video = video
+        mock_get.return_value = [7]
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [segment]
+        mock_sanitize.return_value = ["hello"]
+
+        result = search_v2("hello", [Mock(id=1)])
+
+        assert result[0].segment_results[0].segments == [segment]
+        mock_set.assert_not_called()
+        sql = str(mock_db_session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert "segments.id IN" in sql
+        assert "text_tsv @@" not in sql
@@ -0,0 +1,302 @@
+import os
+
+import pytest
+from unittest.mock import Mock, patch
+from datetime import datetime
+
+from app.search import search_v2, search_v2_page
+from app.search_index import (
+    SearchIndex, search_terms, is_indexable_search, update_search_index, _write_index, _to_micros, _index_path,
+)
+from app.models.search import SearchCursor
+
+
+def make_row(segment_id, uploaded, video_id, transcription_id, start, channel_id, source_uploaded=None):
+    """A row as the index stores it, the segment's own video is the result video unless source_uploaded is given."""
+    return (segment_id, _to_micros(uploaded), video_id, transcription_id, start, channel_id,
+            _to_micros(source_uploaded or uploaded))
+
+
+def make_rows(segments):
+    """Rows and postings as build_search_index would write them, segments are (id, uploaded, video, transcription, start, channel, lexemes)."""
+    segments = sorted(segments, key=lambda s: (-_to_micros(s[1]), -s[2], -s[3], -s[4], -s[0]))
+    rows = [make_row(*s[:6]) for s in segments]
+    postings: dict[str, list[int]] = {}
+    for row_number, segment in enumerate(segments):
+        for term in segment[6]:
+            postings.setdefault(term, []).append(row_number)
+    return rows, postings
+
+
+SEGMENTS = [
+    (1, datetime(2023, 1, 1), 100, 10, 5, 1, ["hello", "world"]),
+    (2, datetime(2023, 1, 1), 100, 10, 20, 1, ["hello", "there", "world"]),
+    (3, datetime(2023, 6, 1), 101, 11, 0, 1, ["world", "only"]),
+    (4, datetime(2023, 6, 1), 101, 11, 30, 2, ["hello", "world"]),
+    (5, datetime(2022, 3, 1), 102, 12, 0, 1, ["hello", "world", "again"]),
+]
+
+
+@pytest.fixture
+def index_config(tmp_path):
+    with patch('app.search_index.config') as mock_config:
+        mock_config.cache_location = str(tmp_path)
+        mock_config.search_index_broadcasters = [7]
+        yield mock_config
+
+
+@pytest.fixture
+def search_index(index_config):
+    rows, postings = make_rows(SEGMENTS)
+    _write_index(_index_path(7), 7, rows, postings)
+    return SearchIndex(_index_path(7))
+
+
+@pytest.mark.unit
+class TestSearchIndex:
+    """Test the memory mapped inverted index"""
+
+    def test_tokens_match_simple_config(self):
+        assert search_terms("Hello  World 2") == ["hello", "world", "2"]
+        assert is_indexable_search("hello world")
+        assert not is_indexable_search('"hello world"')
+        assert not is_indexable_search("hello & world")
+        # Postgres splits these into other lexemes than the words
+        assert not is_indexable_search("foo_bar")
+        assert not is_indexable_search("café")
+        assert not is_indexable_search("   ")
+
+    def test_intersection_newest_first(self, search_index):
+        hits = list(search_index.search("hello world", [1, 2]))
+
+        assert [hit.segment_id for hit in hits] == [4, 2, 1, 5]
+        assert (hits[0].uploaded, hits[0].video_id) == (datetime(2023, 6, 1), 101)
+        assert (hits[1].transcription_id, hits[1].start) == (10, 20)
+
+    def test_channel_and_date_filters(self, search_index):
+        assert [hit.segment_id for hit in search_index.search("world", [1])] == [3, 2, 1, 5]
+        hits = search_index.search("hello", [1, 2], datetime(2022, 12, 1), datetime(2023, 2, 1))
+        assert [hit.segment_id for hit in hits] == [2, 1]
+
+    def test_dates_filter_on_the_segments_own_video(self, index_config):
+        # Segment 1 is shown on video 200, uploaded in 2024, its own video is from 2023
+        rows = [
+            make_row(1, datetime(2024, 1, 1), 200, 10, 5, 1, source_uploaded=datetime(2023, 1, 1)),
+            make_row(2, datetime(2023, 6, 1), 101, 11, 0, 1),
+        ]
+        _write_index(_index_path(7), 7, rows, {"hello": [0, 1]})
+        index = SearchIndex(_index_path(7))
+
+        assert [hit.segment_id for hit in index.search("hello", [1])] == [1, 2]
+        assert [hit.segment_id for hit in index.search("hello", [1], end_date=datetime(2023, 3, 1))] == [1]
+        assert [hit.segment_id for hit in index.search("hello", [1], start_date=datetime(2023, 3, 1))] == [2]
+
+    def test_unknown_word_has_no_hits(self, search_index):
+        assert list(search_index.search("hello nobody", [1, 2])) == []
+
+    def test_starts_after_cursor(self, search_index):
+        hits = search_index.search("world", [1, 2], after=SearchCursor(datetime(2023, 1, 1), 100, 10, 20, 2))
+
+        assert [hit.segment_id for hit in hits] == [1, 5]
+
+    def test_rows_before_cursor_are_not_read(self, search_index):
+        channel_ids = search_index._channel_ids
+        read = []
+
+        class RecordingColumn:
+            def __getitem__(self, row):
+                read.append(row)
+                return channel_ids[row]
+
+        with patch.object(search_index, '_channel_ids', RecordingColumn()):
+            hits = list(search_index.search("world", [1, 2], after=SearchCursor(datetime(2023, 1, 1), 100, 10, 20, 2)))
+
+        assert [hit.segment_id for hit in hits] == [1, 5]
+        assert read == [3, 4]
+
+    def test_excludes_transcriptions(self, search_index):
+        hits = search_index.search("world", [1, 2], excluded_transcription_ids={10})
+
+        assert [hit.segment_id for hit in hits] == [4, 3, 5]
+
+    @patch('app.search_index._segment_rows')
+    def test_build_keeps_database_order(self, mock_segment_rows, index_config):
+        from app.search_index import build_search_index
+        rows, _ = make_rows(SEGMENTS)
+        lexemes = {s[0]: s[6] for s in SEGMENTS}
+        mock_segment_rows.return_value = iter([(row, lexemes[row[0]]) for row in rows])
+
+        assert build_search_index(7) == 5
+
+        built = SearchIndex(_index_path(7))
+        assert built.rows() == rows
+        assert [hit.segment_id for hit in built.search("hello world", [1, 2])] == [4, 2, 1, 5]
+
+    def test_segment_rows_ordered_in_database(self):
+        from sqlalchemy.dialects import postgresql
+        from app.search_index import _segment_rows
+        with patch('app.search_index.db.session') as mock_db_session:
+            list(_segment_rows())
+        statement = mock_db_session.execute.call_args[0][0]
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert "LEFT OUTER JOIN segment_placement" in sql
+        assert "tsvector_to_array(segments.text_tsv)" in sql
+        assert sql.endswith(
+            "ORDER BY coalesce(video_1.uploaded, segments.video_uploaded) DESC, "
+            "coalesce(segment_placement_1.target_video_id, segments.video_id) DESC, "
+            "segments.transcription_id DESC, segments.start DESC, segments.id DESC")
+        assert statement.get_execution_options()["yield_per"] > 0
+
+    def test_missing_file_falls_back_to_database(self, index_config):
+        from app.search_index import get_search_index
+        assert get_search_index([Mock(broadcaster_id=7)]) is None
+
+    @patch('app.search_index._segment_rows')
+    def test_update_writes_only_the_delta(self, mock_segment_rows, search_index):
+        from app.search_index import get_search_index, _delta_path
+        mock_segment_rows.return_value = iter([
+            (make_row(6, datetime(2023, 1, 1), 100, 10, 8, 1), ["goodbye", "world"]),
+            (make_row(7, datetime(2024, 1, 1), 100, 10, 0, 1), ["hello", "world"]),
+        ])
+        transcription = Mock(id=10)
+        transcription.video.channel.broadcaster_id = 7
+        base_rows = search_index.rows()
+
+        assert update_search_index(transcription) is True
+
+        assert SearchIndex(_index_path(7)).rows() == base_rows
+        delta = SearchIndex(_delta_path(7))
+        assert len(delta) == 2
+        assert delta.replaced == {10}
+
+        updated = get_search_index([Mock(broadcaster_id=7)])
+        assert [hit.segment_id for hit in updated.search("hello world", [1, 2])] == [7, 4, 5]
+        assert [hit.segment_id for hit in updated.search("world", [1])] == [7, 3, 6, 5]
+        assert [hit.segment_id for hit in updated.search("goodbye", [1])] == [6]
+        assert list(updated.search("there", [1])) == []
+
+    @patch('app.search_index._segment_rows')
+    def test_update_without_segments_removes_transcription(self, mock_segment_rows, search_index):
+        from app.search_index import get_search_index, refresh_search_index
+        mock_segment_rows.return_value = iter([])
+
+        assert refresh_search_index(7, [11]) is True
+
+        updated = get_search_index([Mock(broadcaster_id=7)])
+        assert [hit.segment_id for hit in updated.search("world", [1, 2])] == [2, 1, 5]
+
+    @patch('app.search_index.SEARCH_INDEX_DELTA_MAX_ROWS', 2)
+    @patch('app.search_index._segment_rows')
+    def test_large_delta_merged_into_base(self, mock_segment_rows, search_index):
+        from app.search_index import get_search_index, refresh_search_index, _delta_path
+        mock_segment_rows.return_value = iter([(make_row(6, datetime(2024, 1, 1), 103, 13, 0, 1), ["hello", "world"])])
+        refresh_search_index(7, [13])
+        mock_segment_rows.return_value = iter([
+            (make_row(7, datetime(2023, 1, 1), 100, 10, 8, 1), ["goodbye", "world"]),
+            (make_row(8, datetime(2023, 1, 1), 100, 10, 0, 1), ["hello"]),
+        ])
+
+        refresh_search_index(7, [10])
+
+        assert not os.path.exists(_delta_path(7))
+        base = SearchIndex(_index_path(7))
+        assert [row[0] for row in base.rows()] == [6, 4, 3, 7, 8, 5]
+        assert [hit.segment_id for hit in base.search("hello world", [1, 2])] == [6, 4, 5]
+        assert [hit.segment_id for hit in get_search_index([Mock(broadcaster_id=7)]).search("goodbye", [1])] == [7]
+
+    @patch('app.search_index._segment_rows')
+    def test_build_removes_delta(self, mock_segment_rows, search_index):
+        from app.search_index import build_search_index, refresh_search_index, _delta_path
+        mock_segment_rows.return_value = iter([])
+        refresh_search_index(7, [10])
+        assert os.path.exists(_delta_path(7))
+
+        build_search_index(7)
+
+        assert not os.path.exists(_delta_path(7))
+
+    @patch('app.search_index.refresh_search_index')
+    @patch('app.search_index.db.session')
+    def test_video_refresh_groups_transcriptions_by_broadcaster(self, mock_db_session, mock_refresh, index_config):
+        from app.search_index import refresh_video_search_index
+        mock_db_session.execute.return_value.all.return_value = [(7, 10), (8, 12), (7, 11)]
+
+        refresh_video_search_index([100])
+
+        assert mock_refresh.call_args_list == [((7, [10, 11]),), ((8, [12]),)]
+        sql = str(mock_db_session.execute.call_args[0][0])
+        assert "timestamp_mapping.source_video_id" in sql
+
+    @patch('app.search_index.db.session')
+    def test_video_refresh_without_indexes_reads_nothing(self, mock_db_session, index_config):
+        from app.search_index import refresh_video_search_index
+        index_config.search_index_broadcasters = []
+
+        refresh_video_search_index([100])
+
+        mock_db_session.execute.assert_not_called()
+
+    def test_update_skips_other_broadcasters(self, index_config):
+        transcription = Mock(id=10)
+        transcription.video.channel.broadcaster_id = 8
+
+        assert update_search_index(transcription) is False
+
+
+@pytest.mark.unit
+class TestIndexedSearch:
+    """Test that searches of indexed broadcasters are answered from the index"""
+
+    @pytest.fixture(autouse=True)
+    def no_text_processing(self):
+        with patch('app.search._fuzzy_fallback', return_value=[]), \
+                patch('app.search.sanitize_sentence', return_value=["hello", "world"]):
+            yield
+
+    def setup_method(self):
+        self.mock_channel = Mock()
+        self.mock_channel.id = 1
+        self.mock_channel.name = "test"
+        self.mock_channel.broadcaster_id = 7
+
+    @patch('app.search._load_hits', return_value=[])
+    @patch('app.search._plan_search')
+    @patch('app.search.db.session')
+    def test_search_v2_uses_index(self, mock_db_session, mock_plan, mock_load_hits, search_index):
+        search_v2("hello world", [self.mock_channel])
+
+        mock_plan.assert_not_called()
+        assert mock_load_hits.call_args[0][0] == [2, 1, 5]
+
+    @patch('app.search._load_hits', return_value=[])
+    @patch('app.search.db.session')
+    def test_inactive_videos_left_out(self, mock_db_session, mock_load_hits, search_index):
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [12]
+
+        page = search_v2_page("hello world", [self.mock_channel], page_size=5)
+
+        assert mock_load_hits.call_args[0][0] == [2, 1]
+        assert page.next_cursor is None
+
+    @patch('app.search._load_hits', return_value=[])
+    @patch('app.search.db.session')
+    def test_phrase_goes_to_database(self, mock_db_session, mock_load_hits, search_index):
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = []
+
+        search_v2('"hello world"', [self.mock_channel])
+
+        mock_load_hits.assert_not_called()
+        mock_db_session.execute.assert_called()
+
+    @patch('app.search._load_hits', return_value=[])
+    @patch('app.search.db.session')
+    def test_page_continues_after_cursor(self, mock_db_session, mock_load_hits, search_index):
+        page = search_v2_page("world", [self.mock_channel], page_size=1)
+
+        assert mock_load_hits.call_args[0][0] == [3]
+        assert page.next_cursor == SearchCursor(datetime(2023, 6, 1), 101, 11, 0, 3)
+
+        page = search_v2_page("world", [self.mock_channel], cursor=page.next_cursor, page_size=1)
+
+        assert mock_load_hits.call_args[0][0] == [2, 1]
+        assert page.next_cursor == SearchCursor(datetime(2023, 1, 1), 100, 10, 5, 1)
@@ -0,0 +1,70 @@
+import pytest
+
+from app.search_jobs import SearchJobTracker
+
+
+class FakeRedis:
+    """Just enough of redis for the tracker, pipelines run their commands straight away"""
+
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+
+    def setex(self, key, timeout, value):
+        self.values[key] = value
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    def lrange(self, key, start, end):
+        return self.lists.get(key, [])[start:]
+
+    def expire(self, key, timeout):
+        pass
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        return []
+
+
+@pytest.mark.unit
+class TestSearchJobTracker:
+    """Test search job progress and result chunks"""
+
+    def setup_method(self):
+        self.tracker = SearchJobTracker(FakeRedis())
+
+    def test_progress_through_years(self):
+        self.tracker.create("job", "hello", context=1, stemmed=True)
+        assert self.tracker.get_progress("job")["status"] == "queued"
+
+        self.tracker.start("job", 4)
+        self.tracker.add_chunk("job", 2024, [5, 4])
+        progress = self.tracker.get_progress("job")
+        assert (progress["status"], progress["years_done"], progress["percent"]) == ("running", 1, 25)
+        # Search options survive the updates
+        assert (progress["search_term"], progress["context"], progress["stemmed"]) == ("hello", 1, True)
+
+        self.tracker.finish("job")
+        assert self.tracker.get_progress("job")["percent"] == 100
+
+    def test_chunks_from_offset(self):
+        self.tracker.create("job", "hello")
+        self.tracker.start("job", 2)
+        self.tracker.add_chunk("job", 2024, [5, 4])
+        self.tracker.add_chunk("job", 2023, [3])
+
+        assert self.tracker.get_chunks("job") == [
+            {"year": 2024, "segment_ids": [5, 4]},
+            {"year": 2023, "segment_ids": [3]},
+        ]
+        assert self.tracker.get_chunks("job", 1) == [{"year": 2023, "segment_ids": [3]}]
+
+    def test_unknown_job(self):
+        assert self.tracker.get_progress("missing") is None
+        assert self.tracker.get_chunks("missing") == []
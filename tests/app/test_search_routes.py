@@ -0,0 +1,135 @@
+import inspect
+import pytest
+from unittest.mock import Mock, patch
+from flask import Flask
+
+from app.routes.search import search_word, search_more, search_results_json, is_first_page_request
+from app.models.search import SearchPage
+
+
+@pytest.fixture
+def flask_app():
+    return Flask(__name__)
+
+
+@pytest.mark.unit
+class TestSearchPageRoutes:
+    """Test the load more and JSON endpoints of paginated search"""
+
+    form = {"search": "hello", "broadcaster": "1", "cursor": "WyIyMDIzLTAxLTAxVDAwOjAwOjAwIiwgMSwgMSwgMCwgMV0="}
+
+    @patch('app.routes.search.search_v2_page')
+    def test_load_more_needs_cursor(self, mock_search, flask_app):
+        with flask_app.test_request_context(method="POST", data={**self.form, "cursor": ""}):
+            assert is_first_page_request()
+            body, status = inspect.unwrap(search_more)()
+
+        assert status == 400
+        mock_search.assert_not_called()
+
+    @patch('app.routes.search.parse_search_form', return_value=('""', Mock(), [Mock()], None, None))
+    @patch('app.routes.search.search_v2_page', side_effect=ValueError("Search was too short"))
+    def test_load_more_blank_search(self, mock_search, mock_form, flask_app):
+        with flask_app.test_request_context(method="POST", data=self.form):
+            body, status = inspect.unwrap(search_more)()
+
+        assert status == 400
+        assert body == "Search was too short"
+
+    @patch('app.routes.search.parse_search_form', return_value=('""', Mock(), [Mock()], None, None))
+    @patch('app.routes.search.search_v2_page', side_effect=ValueError("Search was too short"))
+    def test_json_blank_search(self, mock_search, mock_form, flask_app):
+        with flask_app.test_request_context(method="POST", data={**self.form, "cursor": ""}):
+            response, status = inspect.unwrap(search_results_json)()
+
+        assert status == 400
+        assert response.get_json() == {"error": "Search was too short"}
+
+    @patch('app.routes.search.parse_search_form', return_value=("hello", Mock(), [Mock()], None, None))
+    @patch('app.routes.search.search_v2_page', return_value=SearchPage(video_results=[], next_cursor=None))
+    def test_json_first_page(self, mock_search, mock_form, flask_app):
+        with flask_app.test_request_context(method="POST", data={**self.form, "cursor": ""}):
+            response = inspect.unwrap(search_results_json)()
+
+        assert response.get_json() == {"videos": [], "next_cursor": None}
+        assert mock_search.call_args.kwargs["cursor"] is None
+
+
+@pytest.mark.unit
+class TestSearchWord:
+    """Test the search form endpoint"""
+
+    @pytest.mark.parametrize("search_term", ["", "   ", '""'])
+    @patch('app.routes.search.searchable_broadcasters', return_value=[])
+    @patch('app.routes.search.render_template', return_value="search page")
+    def test_empty_search(self, mock_render, mock_broadcasters, flask_app, search_term):
+        flask_app.secret_key = "test"
+        with patch('app.routes.search.parse_search_form', return_value=(search_term, Mock(id=1), [Mock()], None, None)), \
+                flask_app.test_request_context(method="POST", data={"search": search_term, "broadcaster": "1"}):
+            body, status = inspect.unwrap(search_word)()
+
+        assert status == 400
+        assert mock_render.call_args[0][0] == "search.html"
+        assert mock_render.call_args.kwargs["search_params"]["search"] == search_term
+
+
+@pytest.mark.unit
+class TestSearchForm:
+    """Test that the search form keeps the choices of the search it shows results for"""
+
+    @staticmethod
+    def render(search_params=None):
+        from pathlib import Path
+        from flask import render_template
+        from app.routes.search import search_form_params
+        templates = Path(__file__).parents[2] / 'app' / 'templates'
+        flask_app = Flask(__name__, template_folder=str(templates))
+        flask_app.secret_key = "test"
+        flask_app.add_url_rule("/search", "search.search_word")
+        flask_app.jinja_env.globals["csrf_token"] = lambda: ""
+        with flask_app.test_request_context():
+            kwargs = {"search_params": search_form_params(search_params)} if search_params is not None else {}
+            return render_template("search_module.html", broadcasters=[], broadcaster=Mock(id=1), **kwargs)
+
+    def test_empty_without_search(self):
+        html = self.render()
+
+        assert 'value="hello world"' not in html
+        assert "checked" not in html
+
+    def test_search_and_dates_are_kept(self):
+        html = self.render({"search": "hello world", "broadcaster": "1", "start_date": "2023-01-01", "end_date": "2023-02-01"})
+
+        assert 'value="hello world"' in html
+        assert 'value="2023-01-01"' in html
+        assert 'value="2023-02-01"' in html
+
+    def test_rank_is_kept(self):
+        assert '<option value="recent" selected>' in self.render()
+
+        html = self.render({"search": "hello", "rank": "relevance"})
+
+        assert '<option value="relevance" selected>' in html
+        assert '<option value="recent" selected>' not in html
+
+    def test_context_is_kept(self):
+        assert '<option value="0" selected>' in self.render()
+
+        html = self.render({"search": "hello", "context": "2"})
+
+        assert '<option value="2" selected>' in html
+        assert '<option value="0" selected>' not in html
+
+    def test_mode_is_kept(self):
+        assert '<option value="fulltext" selected>' in self.render()
+
+        html = self.render({"search": "hello", "mode": "semantic"})
+
+        assert '<option value="semantic" selected>' in html
+        assert '<option value="fulltext" selected>' not in html
+
+    def test_stemmed_is_kept(self):
+        assert 'name="stemmed" id="stemmed" checked' in self.render({"search": "hello", "stemmed": "on"})
+
+    def test_background_is_kept(self):
+        assert 'name="background" id="background" checked' in self.render({"search": "hello", "background": "on"})
@@ -0,0 +1,93 @@
+import importlib.util
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.timestamp_mapping import TimestampMapping, TimestampTranslator
+
+
+def make_mapping(cuts=None, time_offset=0.0):
+    return TimestampMapping(
+        id=1, source_video_id=1, target_video_id=2,
+        source_start_time=0.0, source_end_time=1000.0,
+        target_start_time=0.0, target_end_time=1000.0,
+        time_offset=time_offset,
+        cuts_data={'cuts': cuts} if cuts is not None else None,
+    )
+
+
+@pytest.mark.unit
+class TestTimestampTranslator:
+    """Test the compiled translation between source and target videos."""
+
+    def test_offset_without_cuts(self):
+        translator = make_mapping(time_offset=10.0).compile_translator()
+
+        assert translator.source_to_target(50.0) == 40.0
+        assert translator.target_to_source(40.0) == 50.0
+        # Before the target video starts
+        assert translator.source_to_target(5.0) is None
+
+    def test_cuts_move_later_timestamps_back(self):
+        translator = make_mapping([{'start': 100.0, 'duration': 50.0}, {'start': 300.0, 'duration': 20.0}]).compile_translator()
+
+        assert translator.source_to_target(90.0) == 90.0
+        assert translator.source_to_target(200.0) == 150.0
+        assert translator.source_to_target(400.0) == 330.0
+        assert translator.source_to_target(120.0) is None
+        assert translator.source_to_target(300.0) is None
+
+    def test_round_trip(self):
+        translator = make_mapping([{'start': 100.0, 'duration': 50.0}, {'start': 300.0, 'duration': 20.0}]).compile_translator()
+
+        for source in (10.0, 99.0, 151.0, 299.0, 321.0, 900.0):
+            assert translator.target_to_source(translator.source_to_target(source)) == source
+
+    def test_unsorted_and_overlapping_cuts(self):
+        cuts = [{'start': 300.0, 'duration': 20.0}, {'start': 100.0, 'duration': 50.0}, {'start': 120.0, 'duration': 60.0}]
+        translator = make_mapping(cuts).compile_translator()
+
+        # Inside the second cut only, it starts within the first
+        assert translator.source_to_target(170.0) is None
+        assert translator.source_to_target(200.0) == 200.0 - 110.0
+        assert translator.source_to_target(400.0) == 400.0 - 130.0
+
+    def test_matches_mapping_methods(self):
+        mapping = make_mapping([{'start': 100.0, 'duration': 50.0}, {'start': 300.0, 'duration': 20.0}], time_offset=5.0)
+        translator = mapping.compile_translator()
+
+        for timestamp in (0.0, 50.0, 100.0, 149.0, 150.0, 151.0, 310.0, 500.0, 999.0, 1200.0):
+            assert mapping.translate_source_to_target(timestamp) == translator.source_to_target(timestamp)
+            assert mapping.translate_target_to_source(timestamp) == translator.target_to_source(timestamp)
+
+    def test_translate_many(self):
+        translator = TimestampTranslator(0.0, 1000.0, 0.0, 1000.0, 0.0, [{'start': 100.0, 'duration': 50.0}])
+
+        assert translator.translate_many([10.0, 120.0, 200.0]) == [10.0, None, 150.0]
+
+
+def load_placement_migration():
+    path = Path(__file__).parents[2] / 'app' / 'db' / 'versions' / 'a7c4e2f9d153_add_segment_placement.py'
+    spec = importlib.util.spec_from_file_location('add_segment_placement', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.unit
+class TestPlacementMigration:
+    """The migration keeps its own copy of the translation, it should agree with the model today."""
+
+    def test_matches_place_segments(self):
+        cuts = [{'start': 300.0, 'duration': 20.0}, {'start': 100.0, 'duration': 50.0}, {'start': 120.0, 'duration': 60.0}]
+        mapping = make_mapping(cuts, time_offset=5.0)
+        segments = [SimpleNamespace(id=i, start=start, end=start + 8.0) for i, start in enumerate(range(0, 1000, 7))]
+        migration = load_placement_migration()
+
+        expected = {row['segment_id']: (row['target_start'], row['target_end']) for row in mapping.place_segments(segments)}
+        for segment in segments:
+            target_start = migration._source_to_target(mapping, cuts, segment.start)
+            target_end = migration._source_to_target(mapping, cuts, segment.end)
+            placed = None if target_start is None or target_end is None else (target_start, target_end)
+            assert placed == expected.get(segment.id)
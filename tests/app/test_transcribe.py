@@ -0,0 +1,60 @@
+import pytest
+from unittest.mock import Mock, patch
+
+from app.transcribe import WhisperModelCache
+
+
+@pytest.fixture
+def model_config():
+    with patch('app.transcribe.config') as mock_config:
+        mock_config.transcription_model = "large-v2"
+        mock_config.transcription_device = "cuda"
+        mock_config.transcription_compute_type = "float16"
+        mock_config.transcription_model_idle_timeout = 0
+        yield mock_config
+
+
+@pytest.mark.unit
+class TestWhisperModelCache:
+    """Test that workers keep the transcription model loaded between tasks"""
+
+    def test_model_loaded_once(self, model_config):
+        cache = WhisperModelCache()
+        with patch.object(cache, '_load', side_effect=lambda key: Mock(key=key)) as mock_load:
+            with cache.use() as first:
+                pass
+            with cache.use() as second:
+                pass
+
+        assert first is second
+        mock_load.assert_called_once_with(("large-v2", "cuda", "float16"))
+        assert cache.metrics()["model_cache_hits"] == 1
+
+    def test_config_change_reloads(self, model_config):
+        cache = WhisperModelCache()
+        with patch.object(cache, '_load', side_effect=lambda key: Mock(key=key)) as mock_load:
+            cache.load()
+            model_config.transcription_model = "medium"
+            model = cache.load()
+
+        assert mock_load.call_count == 2
+        assert model.key[0] == "medium"
+
+    @patch('app.transcribe.time.monotonic')
+    def test_idle_model_evicted(self, mock_monotonic, model_config):
+        model_config.transcription_model_idle_timeout = 60
+        mock_monotonic.return_value = 1000.0
+        cache = WhisperModelCache()
+        with patch.object(cache, '_load', return_value=Mock()), \
+                patch('app.transcribe.threading.Timer'):
+            with cache.use():
+                mock_monotonic.return_value = 2000.0
+                # Never while a transcription is running
+                assert cache.evict_idle() is False
+            mock_monotonic.return_value = 2030.0
+            assert cache.evict_idle() is False
+            mock_monotonic.return_value = 2061.0
+            assert cache.evict_idle() is True
+
+        assert cache.metrics()["model_loaded"] is False
+        assert cache.metrics()["model_evictions"] == 1
@@ -0,0 +1,111 @@
+import threading
+import pytest
+from unittest.mock import Mock, patch
+
+from app.transcription_queue import TranscriptionQueue
+from app.models.enums import TranscriptionPriority
+
+
+class FakeRedis:
+    """Just enough of redis for the queue, pipelines run their commands straight away"""
+
+    def __init__(self):
+        self.sorted = {}
+        self.hashes = {}
+
+    def zadd(self, key, mapping, lt=False):
+        entries = self.sorted.setdefault(key, {})
+        for member, score in mapping.items():
+            if not lt or member not in entries or score < entries[member]:
+                entries[member] = score
+
+    def zpopmin(self, key):
+        entries = self.sorted.get(key, {})
+        if not entries:
+            return []
+        member = min(entries, key=entries.get)
+        return [(member.encode(), entries.pop(member))]
+
+    def zcard(self, key):
+        return len(self.sorted.get(key, {}))
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    def hdel(self, key, field):
+        return 1 if self.hashes.get(key, {}).pop(field, None) is not None else 0
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        return []
+
+
+@pytest.mark.unit
+class TestTranscriptionQueue:
+    """Test the order videos are taken for transcription"""
+
+    def setup_method(self):
+        self.queue = TranscriptionQueue(FakeRedis())
+
+    def test_recent_before_backfill(self):
+        self.queue.enqueue(1, TranscriptionPriority.Backfill)
+        self.queue.enqueue(2, TranscriptionPriority.Backfill)
+        self.queue.enqueue(3, TranscriptionPriority.Recent, force=True)
+
+        assert len(self.queue) == 3
+        assert [self.queue.pop() for _ in range(4)] == [(3, True), (1, False), (2, False), None]
+
+    def test_requeue_only_raises_priority(self):
+        self.queue.enqueue(1, TranscriptionPriority.Backfill)
+        self.queue.enqueue(2, TranscriptionPriority.Recent)
+        self.queue.enqueue(1, TranscriptionPriority.Recent)
+        self.queue.enqueue(2, TranscriptionPriority.Backfill)
+
+        assert [self.queue.pop() for _ in range(2)] == [(2, False), (1, False)]
+
+
+@pytest.mark.unit
+class TestTranscribeBatch:
+    """Test that queued videos are transcribed back to back with the next download running ahead"""
+
+    @patch('app.main.task_transcribe_batch.delay')
+    @patch('app.main.task_parse_video_transcriptions.delay')
+    @patch('app.main._needs_transcription', return_value=True)
+    @patch('app.main.VideoService.get_by_id', side_effect=lambda video_id: Mock(id=video_id))
+    @patch('app.main.config')
+    def test_batch(self, mock_config, mock_get_video, mock_needs, mock_parse, mock_batch):
+        from app.main import task_transcribe_batch
+        mock_config.transcription_queue_batch = 2
+        queue = TranscriptionQueue(FakeRedis())
+        for video_id in (1, 2, 3):
+            queue.enqueue(video_id)
+        events = []
+        second_downloaded = threading.Event()
+
+        def download(video_id):
+            events.append(("download", video_id))
+            if video_id == 2:
+                second_downloaded.set()
+            return f"/tmp/{video_id}.mp3"
+
+        def transcribe(video, local_filename, task_id):
+            if video.id == 1:
+                # The next file downloads while this one is transcribed
+                assert second_downloaded.wait(timeout=5)
+            events.append(("transcribe", video.id))
+            if video.id == 1:
+                raise RuntimeError("broken audio")
+
+        with patch('app.main.transcription_queue', queue), \
+                patch('app.main._download_video_audio', side_effect=download), \
+                patch('app.main._transcribe_video_audio', side_effect=transcribe):
+            assert task_transcribe_batch.run() == 1
+
+        assert events.index(("download", 2)) < events.index(("transcribe", 1))
+        assert [e for e in events if e[0] == "transcribe"] == [("transcribe", 1), ("transcribe", 2)]
+        mock_parse.assert_called_once_with(2)
+        # Video 3 is left for the next task
+        mock_batch.assert_called_once_with()
+        assert len(queue) == 1
@@ -0,0 +1,122 @@
+import json
+import pytest
+from unittest.mock import Mock, patch
+from datetime import datetime
+
+from app.services.transcription import TranscriptionService
+
+
+def make_transcription(content: bytes):
+    transcription = Mock(id=3)
+    transcription.video.id = 5
+    transcription.video.channel_id = 7
+    transcription.video.uploaded = datetime(2024, 1, 1)
+    # Stored files are read through their storage object's stream, in small chunks here
+    transcription.file.file.object.as_stream.return_value = iter(
+        [content[i:i + 7] for i in range(0, len(content), 7)])
+    return transcription
+
+
+@pytest.mark.unit
+class TestSegmentIngestion:
+    """Test that parsed transcriptions are inserted in one batch"""
+
+    @patch('app.services.transcription.db.session')
+    def test_insert_links_neighbours(self, mock_db_session):
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [102, 100, 101]
+        transcription = make_transcription(b"")
+
+        segment_ids = TranscriptionService.insert_segments(transcription, [("a", 0, 2), ("b", 2, 4), ("c", 4, 6)])
+
+        assert segment_ids == [100, 101, 102]
+        # One query for the ids, one for the insert
+        assert mock_db_session.execute.call_count == 2
+        rows = mock_db_session.execute.call_args[0][1]
+        assert [(r["id"], r["previous_segment_id"], r["next_segment_id"]) for r in rows] == [
+            (100, None, 101), (101, 100, 102), (102, 101, None),
+        ]
+        assert rows[1] == {
+            "id": 101, "text": "b", "start": 2, "end": 4, "transcription_id": 3, "video_id": 5,
+            "channel_id": 7, "video_uploaded": datetime(2024, 1, 1),
+            "previous_segment_id": 100, "next_segment_id": 102,
+        }
+        mock_db_session.flush.assert_not_called()
+
+    @patch('app.services.transcription.db.session')
+    def test_insert_nothing(self, mock_db_session):
+        assert TranscriptionService.insert_segments(make_transcription(b""), []) == []
+        mock_db_session.execute.assert_not_called()
+
+    @patch('app.services.transcription.db.session')
+    def test_insert_continues_previous_batch(self, mock_db_session):
+        mock_db_session.execute.return_value.scalars.return_value.all.return_value = [200, 201]
+
+        TranscriptionService.insert_segments(make_transcription(b""), [("d", 6, 8), ("e", 8, 9)], 102)
+
+        insert_call, update_call = mock_db_session.execute.call_args_list[1:]
+        assert insert_call[0][1][0]["previous_segment_id"] == 102
+        statement = update_call[0][0]
+        assert statement.compile().params == {"next_segment_id": 200, "id_1": 102}
+
+    @patch('app.services.transcription.TranscriptionService.insert_segments')
+    @patch('app.services.transcription.TranscriptionService.reset_transcription')
+    @patch('app.services.transcription.db.session')
+    def test_parse_json_skips_empty_and_repeated(self, mock_db_session, mock_reset, mock_insert):
+        content = json.dumps({"language": "en", "segments": [
+            {"text": "hello", "start": 0.5, "end": 2.1, "words": [{"word": "hello"}]},
+            {"text": "hello", "start": 2.1, "end": 3.0},
+            {"text": "", "start": 3.0, "end": 4.0},
+            {"text": "world", "start": 4.0, "end": 5.9},
+        ]}).encode()
+        transcription = make_transcription(content)
+
+        TranscriptionService.parse_json(transcription)
+
+        mock_insert.assert_called_once_with(transcription, [("hello", 0, 2), ("world", 4, 5)], None)
+        mock_db_session.commit.assert_called_once()
+
+    @patch('app.services.transcription.SEGMENT_INSERT_BATCH', 2)
+    @patch('app.services.transcription.TranscriptionService.insert_segments')
+    @patch('app.services.transcription.TranscriptionService.reset_transcription')
+    @patch('app.services.transcription.db.session')
+    def test_parse_json_inserts_in_batches(self, mock_db_session, mock_reset, mock_insert):
+        mock_insert.side_effect = [[10, 11], [12, 13], [14]]
+        content = json.dumps({"segments": [
+            {"text": f"line {i}", "start": i, "end": i + 1} for i in range(5)
+        ]}).encode()
+        transcription = make_transcription(content)
+
+        TranscriptionService.parse_json(transcription)
+
+        assert [(len(c[0][1]), c[0][2]) for c in mock_insert.call_args_list] == [(2, None), (2, 11), (1, 13)]
+
+
+@pytest.mark.unit
+class TestTranscriptionDelete:
+    """Test that deleted transcriptions are taken out of the search index"""
+
+    @patch('app.services.transcription.refresh_search_index')
+    @patch('app.services.transcription.db.session')
+    def test_delete_refreshes_index_after_commit(self, mock_db_session, mock_refresh):
+        transcription = make_transcription(b"")
+        transcription.video.channel.broadcaster_id = 9
+        mock_refresh.side_effect = lambda *args: mock_db_session.commit.assert_called_once()
+
+        TranscriptionService.delete(transcription)
+
+        mock_refresh.assert_called_once_with(9, [3])
+
+
+@pytest.mark.unit
+class TestSyncVideoColumns:
+    """Test that the video columns copied onto segments follow the video"""
+
+    @patch('app.services.transcription.db.session')
+    def test_channel_and_upload_date_synced(self, mock_db_session):
+        from app.services.transcription import SegmentService
+        video = Mock(id=5, channel_id=8, uploaded=datetime(2024, 2, 1))
+
+        SegmentService.sync_video_columns(video)
+
+        statement = mock_db_session.execute.call_args[0][0]
+        assert statement.compile().params == {"channel_id": 8, "video_uploaded": datetime(2024, 2, 1), "video_id_1": 5}
@@ -1,6 +1,7 @@
 import pytest
 from app.services import TranscriptionService
-from app.utils import get_sec
+from unittest.mock import Mock
+from app.utils import get_sec, open_stored_file
 
 def test_convert_segments_to_srt():
     data = {
@@ -42,4 +43,49 @@ def test_convert_json_to_srt():
 ])
 def test_get_sec(time_str, expected_seconds):
     """Test that get_sec correctly converts various time formats to seconds"""
-    assert get_sec(time_str) == expected_seconds
\ No newline at end of file
+    assert get_sec(time_str) == expected_seconds
+
+@pytest.fixture
+def english():
+    """Stand in for the NLTK data so normalization can be tested offline"""
+    from unittest.mock import Mock, patch
+    from app import normalize
+    normalize.english_stopwords.cache_clear()
+    corpus = Mock()
+    corpus.words.return_value = ["the", "is", "a"]
+    with patch("app.normalize.stopwords", corpus), \
+            patch("app.normalize.word_tokenize", side_effect=str.split):
+        yield normalize
+    normalize.english_stopwords.cache_clear()
+
+
+def test_normalize_drops_stopwords_and_stems(english):
+    assert english.normalize("the dog is running") == ["dog", "run"]
+    assert english.normalize_many(["a cat", "dogs"]) == [["cat"], ["dog"]]
+    assert english.loosely_normalize("the dog is running") == ["dog", "running"]
+
+
+def test_stopwords_loaded_once(english):
+    english.normalize("the dog")
+    english.normalize("a cat")
+    assert english.stopwords.words.call_count == 1
+
+
+def test_highlight_matches_word_stems():
+    from app.normalize import highlight
+    assert highlight(" he was running, then ran", ["run"]) == " he was <mark>running</mark>, then ran"
+    assert highlight("<b>run</b>", ["run"]) == "&lt;b&gt;<mark>run</mark>&lt;/b&gt;"
+    assert highlight("no match here", []) == "no match here"
+
+
+def test_open_stored_file_reads_on():
+    stored_file = Mock()
+    stored_file.read.return_value = b"first"
+    stored_file.object.as_stream.return_value = iter([b"first", b"", b"second", b"third"])
+
+    stream = open_stored_file(stored_file)
+
+    assert stream.read(3) == b"fir"
+    assert stream.read(5) == b"stsec"
+    assert stream.read() == b"ondthird"
+    assert stream.read(1) == b""
@@ -0,0 +1,78 @@
+import pytest
+
+from app.voice_activity import SpeechTimeline, detect_speech, keep_speech, SAMPLE_RATE, VAD_WINDOW_SECONDS
+
+
+@pytest.mark.unit
+class TestSpeechTimeline:
+    """Test moving timestamps of the speech only audio back to the full audio"""
+
+    def setup_method(self):
+        # 10s of speech at 5s, 5s at 60s
+        self.timeline = SpeechTimeline([(5.0, 15.0), (60.0, 65.0)])
+
+    def test_to_original(self):
+        assert self.timeline.speech_seconds == 15.0
+        assert self.timeline.to_original(0.0) == 5.0
+        assert self.timeline.to_original(12.0) == 62.0
+        # A join starts the next interval, but ends the previous one
+        assert self.timeline.to_original(10.0) == 60.0
+        assert self.timeline.to_original(10.0, is_end=True) == 15.0
+
+    def test_restore_timestamps(self):
+        result = {"segments": [
+            {"start": 1.0, "end": 10.0, "text": "a", "words": [{"word": "a", "start": 9.0, "end": 10.0}]},
+            {"start": 10.0, "end": 14.5, "text": "b"},
+        ]}
+
+        self.timeline.restore_timestamps(result)
+
+        assert [(s["start"], s["end"]) for s in result["segments"]] == [(6.0, 15.0), (60.0, 64.5)]
+        assert result["segments"][0]["words"][0] == {"word": "a", "start": 14.0, "end": 15.0}
+
+
+def speech_like(np, rng, seconds):
+    """Noise in bursts four times a second, loud syllables with short pauses between them."""
+    t = np.arange(seconds * SAMPLE_RATE) / SAMPLE_RATE
+    return rng.normal(0, 0.1, t.shape) * np.maximum(np.sin(2 * np.pi * 4 * t), 0)
+
+
+@pytest.mark.unit
+class TestDetectSpeech:
+    """Test finding the parts of the audio with speech, NumPy is only installed on transcription workers"""
+
+    def test_silence_is_skipped(self):
+        np = pytest.importorskip("numpy")
+        rng = np.random.default_rng(0)
+        audio = np.zeros(SAMPLE_RATE * 30, dtype=np.float32)
+        audio += rng.normal(0, 0.0005, audio.shape).astype(np.float32)
+        for start, end in ((2, 6), (7, 9), (20, 25)):
+            audio[start * SAMPLE_RATE:end * SAMPLE_RATE] += speech_like(np, rng, end - start)
+
+        intervals = detect_speech(audio)
+
+        # The one second pause is kept, the long silence is not
+        assert len(intervals) == 2
+        assert intervals[0][0] == pytest.approx(1.7, abs=0.05)
+        assert intervals[0][1] == pytest.approx(9.2, abs=0.1)
+        assert intervals[1][0] == pytest.approx(19.7, abs=0.05)
+        assert len(keep_speech(audio, intervals)) == pytest.approx(SAMPLE_RATE * 13.0, abs=SAMPLE_RATE * 0.2)
+
+    def test_loud_music_is_skipped(self):
+        np = pytest.importorskip("numpy")
+        rng = np.random.default_rng(0)
+        audio = rng.normal(0, 0.0005, SAMPLE_RATE * 40)
+        audio[2 * SAMPLE_RATE:8 * SAMPLE_RATE] += speech_like(np, rng, 6)
+        # A chord at about -22 dBFS, well above VAD_SPEECH_DB, swelling twice a second
+        t = np.arange(20 * SAMPLE_RATE) / SAMPLE_RATE
+        chord = sum(np.sin(2 * np.pi * f * t) for f in (220, 277, 330)) / 3
+        audio[10 * SAMPLE_RATE:30 * SAMPLE_RATE] += 0.2 * chord * (1 + 0.3 * np.sin(2 * np.pi * 2 * t))
+        audio[34 * SAMPLE_RATE:38 * SAMPLE_RATE] += speech_like(np, rng, 4)
+
+        intervals = detect_speech(audio.astype(np.float32))
+
+        assert intervals[0] == pytest.approx((1.7, 8.2), abs=0.1)
+        assert intervals[-1] == pytest.approx((33.7, 38.2), abs=0.1)
+        # At most the window where the music stops is kept
+        music_kept = sum(max(min(end, 30) - max(start, 10), 0) for start, end in intervals)
+        assert music_kept < VAD_WINDOW_SECONDS